@@ -1,11 +1,14 @@
 import json
+from contextlib import aclosing
 from datetime import datetime, timezone
 from pathlib import Path
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from app.models import (
     CompanyDetailsRequest,
     CompanyProfile,
     CompanyGroup,
+    CompanyGroupEvent,
     UpdateGroupsRequest,
     CompaniesListResponse,
     GroupedCLOSuggestionResponse,
@@ -14,9 +17,20 @@ from app.models import (
     PLOInfo,
     SuggestCompanyDetailsRequest,
     SuggestCompanyDetailsResponse,
-    CLOWithContext
+    CLOWithContext,
+    PLOTreeNode,
+    PLOTreeResponse,
+    PLOCoverage,
+    GroupPLOCoverage,
+    PLOCoverageResponse,
+    LLMCacheStats,
+    LLMUsageStats,
+    LLMRouterStats,
+    LLMAdmissionStatsResponse,
 )
 from app.services.llm_factory import get_llm_service
+from app.services.llm_cache import get_llm_cache
+from app.services.llm_scheduler import LLMOverloaded, retry_after_header
 from app.services.csv_loader import CSVLoaderService
 
 router = APIRouter()
@@ -27,11 +41,35 @@ def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
-def _load_valid_clo_ids() -> list[str]:
+def _load_valid_clo_ids() -> set[str]:
     """Load all valid CLO IDs from CSV file."""
     csv_loader = CSVLoaderService()
     clos = csv_loader.load_all_clos()
-    return [str(clo.get("id", "")).strip() for clo in clos if clo.get("id")]
+    return {str(clo.get("id", "")).strip() for clo in clos if clo.get("id")}
+
+
+def _plo_info(plo: dict) -> PLOInfo:
+    return PLOInfo(
+        id=plo['id'],
+        curriculum_id=plo['curriculum_id'],
+        name=plo['name'],
+        name_en=plo['name_en'] if plo['name_en'] else None,
+        detail=plo['detail'],
+        plo_level=plo['plo_level'],
+        parent_plo_id=plo['parent_plo_id'] if plo['parent_plo_id'] else None
+    )
+
+
+def _plo_coverage(entries: list[dict]) -> list[PLOCoverage]:
+    return [
+        PLOCoverage(
+            plo=_plo_info(e["plo"]),
+            clo_ids=e["clo_ids"],
+            sub_plo_ids=e["sub_plo_ids"],
+            mapping_count=e["mapping_count"],
+        )
+        for e in entries
+    ]
 
 
 def _union_preserve_order(lists: list[list[str]]) -> list[str]:
@@ -78,10 +116,11 @@ async def suggest_company_details(request: SuggestCompanyDetailsRequest):
     """Help users generate company details when they're stuck writing them."""
     try:
         llm_service = get_llm_service()
-        result = llm_service.suggest_company_details(
+        result = await llm_service.suggest_company_details(
             company_name=request.company_name,
             brief_description=request.brief_description,
             partial_requirements=request.partial_requirements,
+            bypass_cache=request.bypass_cache,
         )
 
         return SuggestCompanyDetailsResponse(
@@ -92,135 +131,194 @@ async def suggest_company_details(request: SuggestCompanyDetailsRequest):
             message=f"Successfully generated suggestions for {request.company_name}",
         )
 
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers=retry_after_header(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"{str(e)}. If this is an authentication error, make sure your .env contains the correct API key (OPENAI_API_KEY or GEMINI_API_KEY).",
         )
 
+def _company_group(g: dict) -> CompanyGroup:
+    suggested = g.get("suggested_clos", [])
+    return CompanyGroup(
+        group_id=g.get("group_id"),
+        group_name=g.get("group_name"),
+        summary=g.get("summary", ""),
+        evidence=g.get("evidence", []) or [],
+        suggested_clos=suggested,
+        selected_clos=suggested,
+        reasoning=g.get("reasoning", ""),
+    )
+
+
+def _map_clo_contexts(csv_loader: CSVLoaderService, clo_contexts: list[dict]):
+    """CLO context models, CLO-PLO mappings and mapped PLOs of ``clo_contexts``."""
+    if not clo_contexts:
+        return [], [], []
+
+    # The response lists every mapping of the picked CLOs whatever its
+    # curriculum/course, so they are resolved with wildcard contexts.
+    resolved = csv_loader.resolve_clo_contexts(
+        [{'clo_id': str(ctx['clo_id']), 'curriculum_id': None, 'course_id': None} for ctx in clo_contexts]
+    )
+    clo_plo_mappings = resolved["mappings"]
+    mapped_plos = [_plo_info(plo) for plo in resolved["plos"]]
+
+    clo_context_models = [
+        CLOWithContext(
+            clo_id=ctx['clo_id'],
+            curriculum_id=ctx['curriculum_id'],
+            course_id=ctx['course_id']
+        )
+        for ctx in clo_contexts
+    ]
+    return clo_context_models, clo_plo_mappings, mapped_plos
+
+
+def _grouped_analysis_response(
+    request: CompanyDetailsRequest,
+    groups_raw: list[dict],
+    prompt_stats: dict = None,
+) -> GroupedCLOSuggestionResponse:
+    """Store a grouped analysis in ``company_store`` and build its response."""
+    groups = [_company_group(g) for g in groups_raw]
+
+    all_suggested = _union_preserve_order([g.suggested_clos for g in groups])
+    all_selected = _union_preserve_order([g.selected_clos for g in groups])
+
+    # Collect CLO contexts from all groups (use groups_raw which are dicts)
+    all_clo_contexts = []
+    seen_clo_keys = set()
+    for g in groups_raw:
+        for ctx in g.get('suggested_clo_contexts', []):
+            clo_key = (ctx['clo_id'], ctx['curriculum_id'], ctx['course_id'])
+            if clo_key not in seen_clo_keys:
+                seen_clo_keys.add(clo_key)
+                all_clo_contexts.append(ctx)
+
+    # Map CLOs to PLOs using their curriculum_id and course_id
+    csv_loader = CSVLoaderService()
+    clo_context_models, clo_plo_mappings, mapped_plos = _map_clo_contexts(csv_loader, all_clo_contexts)
+
+    now = _now_iso()
+    existing = company_store.get(request.company_name)
+    created_at = existing["created_at"] if isinstance(existing, dict) and "created_at" in existing else now
+
+    company_store[request.company_name] = {
+        "company_name": request.company_name,
+        "requirements": request.requirements,
+        "culture": request.culture,
+        "desired_traits": request.desired_traits,
+        "ai_suggested_clos": all_suggested,
+        "selected_clos": all_selected,
+        "ai_reasoning": "Grouped analysis generated.",
+        "groups": [g.model_dump() for g in groups],
+        "clo_context": [c.model_dump() for c in clo_context_models] if clo_context_models else [],
+        "clo_plo_mappings": clo_plo_mappings,
+        "mapped_plos": [p.model_dump() for p in mapped_plos] if mapped_plos else [],
+        "created_at": created_at,
+        "updated_at": now,
+    }
+
+    return GroupedCLOSuggestionResponse(
+        company_name=request.company_name,
+        requirements=request.requirements,
+        culture=request.culture,
+        desired_traits=request.desired_traits,
+        groups=groups,
+        all_suggested_clos=all_suggested,
+        all_selected_clos=all_selected,
+        clo_context=clo_context_models,
+        clo_plo_mappings=clo_plo_mappings,
+        mapped_plos=mapped_plos,
+        prompt_stats=prompt_stats,
+        message=f"Successfully analyzed (grouped) company details for {request.company_name}. Found {len(all_clo_contexts)} CLOs from {len(set(ctx['curriculum_id'] for ctx in all_clo_contexts))} curricula. Mapped {len(mapped_plos)} PLOs via {len(clo_plo_mappings)} mappings.",
+    )
+
 @router.post("/analyze-company-grouped", response_model=GroupedCLOSuggestionResponse)
 async def analyze_company_grouped(request: CompanyDetailsRequest):
     try:
         llm_service = get_llm_service()
-        result = llm_service.suggest_grouped_clos_for_company(
+        result = await llm_service.suggest_grouped_clos_for_company(
             company_name=request.company_name,
             requirements=request.requirements,
             culture=request.culture,
             desired_traits=request.desired_traits,
+            bypass_cache=request.bypass_cache,
         )
 
-        groups_raw = result.get("groups", [])
-        groups: list[CompanyGroup] = []
-        for g in groups_raw:
-            suggested = g.get("suggested_clos", [])
-            group = CompanyGroup(
-                group_id=g.get("group_id"),
-                group_name=g.get("group_name"),
-                summary=g.get("summary", ""),
-                evidence=g.get("evidence", []) or [],
-                suggested_clos=suggested,
-                selected_clos=suggested,
-                reasoning=g.get("reasoning", ""),
-            )
-            groups.append(group)
-
-        all_suggested = _union_preserve_order([g.suggested_clos for g in groups])
-        all_selected = _union_preserve_order([g.selected_clos for g in groups])
-
-        # Collect CLO contexts from all groups (use groups_raw which are dicts)
-        all_clo_contexts = []
-        seen_clo_keys = set()
-        for g in groups_raw:
-            for ctx in g.get('suggested_clo_contexts', []):
-                clo_key = (ctx['clo_id'], ctx['curriculum_id'], ctx['course_id'])
-                if clo_key not in seen_clo_keys:
-                    seen_clo_keys.add(clo_key)
-                    all_clo_contexts.append(ctx)
-
-        # Map CLOs to PLOs using their curriculum_id and course_id
-        csv_loader = CSVLoaderService()
-        mapped_plos = []
-        clo_context_models = []
-        clo_plo_mappings = []
-        
-        if all_clo_contexts:
-            # Get CLO IDs for mapping lookup
-            clo_ids = [ctx['clo_id'] for ctx in all_clo_contexts]
-            
-            # Load CLO-PLO mappings
-            clo_plo_mappings = csv_loader.load_clo_plo_mappings(
-                clo_ids=[str(cid) for cid in clo_ids],
-                is_map_only=True
-            )
-            
-            # Get PLO IDs from mappings
-            plo_ids = list(set([m['plo_id'] for m in clo_plo_mappings if m.get('plo_id')]))
-            
-            # Load PLO details
-            if plo_ids:
-                plo_data = csv_loader.load_plos(plo_ids=plo_ids)
-                mapped_plos = [
-                    PLOInfo(
-                        id=plo['id'],
-                        curriculum_id=plo['curriculum_id'],
-                        name=plo['name'],
-                        name_en=plo['name_en'] if plo['name_en'] else None,
-                        detail=plo['detail'],
-                        plo_level=plo['plo_level'],
-                        parent_plo_id=plo['parent_plo_id'] if plo['parent_plo_id'] else None
-                    )
-                    for plo in plo_data
-                ]
-            
-            clo_context_models = [
-                CLOWithContext(
-                    clo_id=ctx['clo_id'],
-                    curriculum_id=ctx['curriculum_id'],
-                    course_id=ctx['course_id']
-                )
-                for ctx in all_clo_contexts
-            ]
-
-        now = _now_iso()
-        existing = company_store.get(request.company_name)
-        created_at = existing["created_at"] if isinstance(existing, dict) and "created_at" in existing else now
-
-        company_store[request.company_name] = {
-            "company_name": request.company_name,
-            "requirements": request.requirements,
-            "culture": request.culture,
-            "desired_traits": request.desired_traits,
-            "ai_suggested_clos": all_suggested,
-            "selected_clos": all_selected,
-            "ai_reasoning": "Grouped analysis generated.",
-            "groups": [g.model_dump() for g in groups],
-            "clo_context": [c.model_dump() for c in clo_context_models] if clo_context_models else [],
-            "clo_plo_mappings": clo_plo_mappings,
-            "mapped_plos": [p.model_dump() for p in mapped_plos] if mapped_plos else [],
-            "created_at": created_at,
-            "updated_at": now,
-        }
-
-        return GroupedCLOSuggestionResponse(
-            company_name=request.company_name,
-            requirements=request.requirements,
-            culture=request.culture,
-            desired_traits=request.desired_traits,
-            groups=groups,
-            all_suggested_clos=all_suggested,
-            all_selected_clos=all_selected,
-            clo_context=clo_context_models,
-            clo_plo_mappings=clo_plo_mappings,
-            mapped_plos=mapped_plos,
-            message=f"Successfully analyzed (grouped) company details for {request.company_name}. Found {len(all_clo_contexts)} CLOs from {len(set(ctx['curriculum_id'] for ctx in all_clo_contexts))} curricula. Mapped {len(mapped_plos)} PLOs via {len(clo_plo_mappings)} mappings.",
-        )
+        return _grouped_analysis_response(request, result.get("groups", []), result.get("prompt_stats"))
 
+    except LLMOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers=retry_after_header(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"{str(e)}. If this is an authentication error, make sure your .env contains the correct API key (OPENAI_API_KEY or GEMINI_API_KEY).",
         )
 
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+@router.post("/analyze-company-grouped/stream")
+async def analyze_company_grouped_stream(request: CompanyDetailsRequest):
+    """Grouped analysis as server-sent events, one ``group`` event per group.
+
+    Each ``group`` event carries a CompanyGroupEvent (the group with its CLO
+    contexts and PLO mapping) as soon as the model has finished writing it.
+    The final ``done`` event carries the same GroupedCLOSuggestionResponse as
+    ``/analyze-company-grouped`` (the company is stored at that point); a
+    failure after the stream has started is reported as an ``error`` event
+    (with ``"status": 503`` when the LLM provider is at capacity).
+    """
+    try:
+        llm_service = get_llm_service()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def events():
+        try:
+            csv_loader = CSVLoaderService()
+            groups_raw = []
+            # Closing the events (the client went away) closes the provider stream too.
+            async with aclosing(llm_service.stream_grouped_clos_for_company(
+                company_name=request.company_name,
+                requirements=request.requirements,
+                culture=request.culture,
+                desired_traits=request.desired_traits,
+                bypass_cache=request.bypass_cache,
+            )) as items:
+                async for item in items:
+                    if "group" not in item:
+                        response = _grouped_analysis_response(request, groups_raw, item.get("prompt_stats"))
+                        yield _sse("done", response.model_dump_json())
+                        return
+                    g = item["group"]
+                    groups_raw.append(g)
+                    clo_context_models, clo_plo_mappings, mapped_plos = _map_clo_contexts(
+                        csv_loader, g.get("suggested_clo_contexts", [])
+                    )
+                    event = CompanyGroupEvent(
+                        group=_company_group(g),
+                        clo_context=clo_context_models,
+                        clo_plo_mappings=clo_plo_mappings,
+                        mapped_plos=mapped_plos,
+                    )
+                    yield _sse("group", event.model_dump_json())
+        except LLMOverloaded as e:
+            yield _sse("error", json.dumps({"detail": str(e), "status": 503, "retry_after": e.retry_after}, ensure_ascii=False))
+        except Exception as e:
+            detail = f"{str(e)}. If this is an authentication error, make sure your .env contains the correct API key (OPENAI_API_KEY or GEMINI_API_KEY)."
+            yield _sse("error", json.dumps({"detail": detail}, ensure_ascii=False))
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Ask proxies (nginx and the like) not to buffer the events.
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/companies", response_model=CompaniesListResponse)
 async def list_companies():
     companies: list[CompanyProfile] = []
@@ -246,6 +344,69 @@ async def get_company(company_name: str):
     return CompanyProfile(**stored)
 
 
+@router.get("/companies/{company_name}/plo-coverage", response_model=PLOCoverageResponse)
+async def get_company_plo_coverage(company_name: str):
+    """CLO coverage of a company's CLO-PLO mappings rolled up to level-1 PLOs."""
+    if company_name not in company_store:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Company '{company_name}' not found",
+        )
+
+    stored = company_store[company_name]
+    if isinstance(stored, CompanyProfile):
+        stored = stored.model_dump()
+
+    hierarchy = CSVLoaderService().get_plo_hierarchy()
+    mappings = stored.get("clo_plo_mappings") or []
+    coverage = _plo_coverage(hierarchy.rollup(mappings))
+
+    groups: list[GroupPLOCoverage] = []
+    for g in stored.get("groups") or []:
+        group_clo_ids = {str(cid) for cid in g.get("selected_clos", [])}
+        group_mappings = [m for m in mappings if str(m.get("clo_id", "")) in group_clo_ids]
+        groups.append(
+            GroupPLOCoverage(
+                group_id=g.get("group_id", ""),
+                group_name=g.get("group_name", ""),
+                coverage=_plo_coverage(hierarchy.rollup(group_mappings)),
+            )
+        )
+
+    return PLOCoverageResponse(
+        company_name=company_name,
+        coverage=coverage,
+        groups=groups,
+        total=len(coverage),
+    )
+
+
+@router.get("/curricula/{curriculum_id}/plo-tree", response_model=PLOTreeResponse)
+async def get_curriculum_plo_tree(curriculum_id: str):
+    """PLO hierarchy of one curriculum, precomputed at catalog load."""
+    hierarchy = CSVLoaderService().get_plo_hierarchy()
+    tree = hierarchy.tree(curriculum_id)
+    if not tree:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No PLOs found for curriculum '{curriculum_id}'",
+        )
+
+    def to_node(node: dict) -> PLOTreeNode:
+        return PLOTreeNode(plo=_plo_info(node["plo"]), children=[to_node(c) for c in node["children"]])
+
+    nodes = [to_node(n) for n in tree]
+
+    def count(node: PLOTreeNode) -> int:
+        return 1 + sum(count(c) for c in node.children)
+
+    return PLOTreeResponse(
+        curriculum_id=curriculum_id,
+        tree=nodes,
+        total=sum(count(n) for n in nodes),
+    )
+
+
 @router.put("/companies/{company_name}/groups", response_model=CompanyProfile)
 async def update_company_groups(company_name: str, request: UpdateGroupsRequest):
     if company_name not in company_store:
@@ -338,3 +499,38 @@ async def delete_company(company_name: str):
     
     del company_store[company_name]
     return {"message": f"Company '{company_name}' deleted successfully"}
+
+@router.get("/llm-cache/stats", response_model=LLMCacheStats)
+async def llm_cache_stats():
+    """Hit/miss counts of this worker's LLM answer cache."""
+    cache = get_llm_cache()
+    if cache is None:
+        return LLMCacheStats(enabled=False)
+    return LLMCacheStats(**cache.stats())
+
+@router.get("/llm-usage/stats", response_model=LLMUsageStats)
+async def llm_usage_stats():
+    """Prompt, cached and output token counts reported by the current LLM provider."""
+    try:
+        llm_service = get_llm_service()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return LLMUsageStats(**llm_service.usage.stats())
+
+@router.get("/llm-router/stats", response_model=LLMRouterStats)
+async def llm_router_stats():
+    """Circuit breaker state, failures, hedges and latency per LLM provider."""
+    try:
+        llm_service = get_llm_service()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return LLMRouterStats(providers=llm_service.stats())
+
+@router.get("/llm-admission/stats", response_model=LLMAdmissionStatsResponse)
+async def llm_admission_stats():
+    """Running and queued LLM requests, rejections and rate-limit headroom per provider."""
+    try:
+        llm_service = get_llm_service()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return LLMAdmissionStatsResponse(providers=llm_service.admission_stats())
@@ -9,6 +9,92 @@ class Settings(BaseSettings):
     gemini_model: str = "gemini-2.0-flash"
     
     llm_provider: str = "openai"
+    # Seconds before an LLM request is abandoned (per attempt).
+    llm_timeout: float = 60.0
+    # Shared OpenAI connection pool: maximum open connections, and seconds an
+    # idle keep-alive connection is kept for reuse.
+    llm_max_connections: int = 20
+    llm_keepalive_expiry: float = 60.0
+    # Persistent cache of LLM answers (SQLite; defaults to data/llm_cache.sqlite3).
+    # Up to llm_cache_max_entries answers (0 disables), each kept for llm_cache_ttl seconds.
+    llm_cache_path: str = ""
+    llm_cache_max_entries: int = 1000
+    llm_cache_ttl: float = 7 * 24 * 3600
+    # Provider routing (app/services/llm_router.py). Calls fail over to
+    # llm_fallback_provider ("openai" or "gemini"; empty for none) and, retries
+    # included, give up after llm_latency_budget seconds.
+    llm_fallback_provider: str = ""
+    llm_latency_budget: float = 120.0
+    # Retries after a failed call, with full-jitter exponential backoff from
+    # llm_retry_backoff seconds (the SDKs already retry transient HTTP errors).
+    llm_retries: int = 1
+    llm_retry_backoff: float = 0.5
+    # A provider failing llm_breaker_failures calls in a row gets no calls for
+    # llm_breaker_cooldown seconds; 0 disables the breaker.
+    llm_breaker_failures: int = 5
+    llm_breaker_cooldown: float = 30.0
+    # Hedging (needs a fallback provider): when a call has taken longer than this
+    # quantile of the provider's recent latencies, e.g. 0.95, the other provider
+    # is called too and the first valid answer wins; 0 disables. llm_hedge_delay
+    # seconds is used until enough latencies have been observed.
+    llm_hedge_quantile: float = 0.0
+    llm_hedge_delay: float = 20.0
+    # Admission control per provider and worker (app/services/llm_scheduler.py):
+    # concurrent LLM requests, requests and tokens per minute (0 for no limit),
+    # and how many requests may wait for a slot, each for at most
+    # llm_queue_timeout seconds, before further ones are rejected with 503.
+    llm_max_concurrency: int = 10
+    llm_rpm: int = 0
+    llm_tpm: int = 0
+    llm_queue_size: int = 50
+    llm_queue_timeout: float = 30.0
+    
+    # "memory" (default) or "sqlite" for the SQLite-backed catalog.
+    catalog_backend: str = "memory"
+    # SQLite catalog file; defaults to data/obe_catalog.sqlite3.
+    catalog_sqlite_path: str = ""
+    # Seconds between checks of data/*.csv for changes; 0 disables hot reload.
+    catalog_reload_interval: float = 30.0
+    
+    # CLO candidate ranking before prompting: "overlap" (shared tokens), "bm25",
+    # or "dense" (TF-IDF + SVD vectors, see app/services/clo_vectors.py).
+    clo_ranking_mode: str = "overlap"
+    # How CLO descriptions are split into terms: "word" or "ngram" (Thai character trigrams).
+    clo_index_analyzer: str = "word"
+    # Dense mode: catalogs with at least this many CLOs use approximate (IVF)
+    # search instead of scoring every CLO; 0 disables.
+    clo_ann_min_rows: int = 200_000
+    # IVF lists probed per query: higher is closer to exact search but slower.
+    clo_ann_nprobe: int = 64
+    # Number of ranked CLOs considered for the prompt.
+    clo_top_k: int = 300
+    # Estimated input tokens for the grouped-analysis prompt; ranked CLOs are
+    # packed into what the instructions and company details leave over.
+    llm_prompt_token_budget: int = 20000
+    # CLO descriptions are cut to at most clo_desc_max_chars, and shortened down
+    # to clo_desc_min_chars when that lets more candidates fit the budget.
+    clo_desc_max_chars: int = 240
+    clo_desc_min_chars: int = 60
+    # How prompts name CLOs: "full" (CLO_ID, curriculum_id, course_id on every line
+    # and in answers) or "alias" (short per-request aliases such as c12).
+    clo_prompt_encoding: str = "full"
+    # CLOs whose descriptions are at least this similar (shingle Jaccard), e.g. 0.9,
+    # are shown to the LLM once; each pick then also lists up to
+    # clo_dedup_max_expand of its duplicates in suggested_clo_contexts. 0 disables.
+    clo_dedup_threshold: float = 0.0
+    clo_dedup_max_expand: int = 10
+    # Map-reduce prompting: "off", "curriculum" (whole curricula per shard) or
+    # "rank" (ranked candidates dealt round-robin). The candidates are split into
+    # llm_shards concurrent prompts whose groups a short final prompt merges.
+    llm_shard_mode: str = "off"
+    llm_shards: int = 3
+    # Grouped prompt layout: "ranked" (the company's ranked CLOs first) or "prefix"
+    # (instructions, then whole-curriculum CLO blocks in stable order, company
+    # details last) so providers can reuse the cached prompt prefix.
+    llm_prompt_layout: str = "ranked"
+    # Prefix layout: comma-separated curriculum ids whose CLOs form the prompt for
+    # every request (one shared prefix); empty picks curricula from the ranking.
+    llm_prompt_curricula: str = ""
     
     class Config:
         env_file = ".env"
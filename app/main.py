@@ -1,13 +1,37 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import RedirectResponse
 from app.api.endpoints import router
+from app.config import get_settings
+from app.services.catalog import get_catalog
+from app.services.catalog_reloader import CatalogReloader
+from app.services.llm_factory import close_llm_services
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings()
+    reloader = None
+    if settings.catalog_reload_interval > 0:
+        reloader = CatalogReloader(interval=settings.catalog_reload_interval)
+
+    # Build the shared OBE catalog before serving so no request pays CSV parsing.
+    get_catalog()
+    if reloader is not None:
+        reloader.start()
+    yield
+    if reloader is not None:
+        reloader.stop()
+    await close_llm_services()
+
 
 app = FastAPI(
     title="Company-CLO Matcher API",
     description="Match companies to relevant Course Learning Outcomes (CLOs)",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
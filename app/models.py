@@ -16,6 +16,7 @@ class CompanyDetailsRequest(BaseModel):
     requirements: str = Field(..., description="Job requirements and technical skills needed")
     culture: Optional[str] = Field(None, description="Company culture and work environment")
     desired_traits: Optional[str] = Field(None, description="Desired personality traits and soft skills")
+    bypass_cache: bool = Field(False, description="Call the LLM even if a cached answer exists (the fresh answer replaces it)")
 
 class CLOWithContext(BaseModel):
     clo_id: str = Field(..., description="CLO ID")
@@ -31,6 +32,32 @@ class PLOInfo(BaseModel):
     plo_level: str = Field(..., description="PLO level (1=top-level, 2=sub-PLO)")
     parent_plo_id: Optional[str] = Field(None, description="Parent PLO ID if this is a sub-PLO")
 
+class PLOTreeNode(BaseModel):
+    plo: PLOInfo
+    children: List["PLOTreeNode"] = Field(default_factory=list, description="Sub-PLOs of this PLO")
+
+class PLOTreeResponse(BaseModel):
+    curriculum_id: str
+    tree: List[PLOTreeNode] = Field(..., description="Top-level PLOs of the curriculum with their sub-PLOs")
+    total: int = Field(..., description="Number of PLOs in the tree")
+
+class PLOCoverage(BaseModel):
+    plo: PLOInfo = Field(..., description="Level-1 PLO the mappings roll up to")
+    clo_ids: List[str] = Field(default_factory=list, description="CLO IDs mapped to this PLO or any of its sub-PLOs")
+    sub_plo_ids: List[str] = Field(default_factory=list, description="Sub-PLO IDs reached by at least one mapping")
+    mapping_count: int = Field(..., description="Number of CLO-PLO mappings rolled up into this PLO")
+
+class GroupPLOCoverage(BaseModel):
+    group_id: str
+    group_name: str
+    coverage: List[PLOCoverage] = Field(default_factory=list)
+
+class PLOCoverageResponse(BaseModel):
+    company_name: str
+    coverage: List[PLOCoverage] = Field(..., description="Coverage of the selected CLOs rolled up to level-1 PLOs")
+    groups: List[GroupPLOCoverage] = Field(default_factory=list, description="The same rollup per group")
+    total: int
+
 class CompanyProfile(BaseModel):
     company_name: str
     requirements: str
@@ -51,6 +78,17 @@ class UpdateGroupsRequest(BaseModel):
     groups: List[CompanyGroup] = Field(..., description="Updated groups with edited names and selected_clos")
 
 
+class PromptStats(BaseModel):
+    budget_tokens: int = Field(..., description="Estimated tokens available for CLO lines")
+    used_tokens: int = Field(..., description="Estimated tokens used by the packed CLO lines")
+    prompt_tokens: int = Field(..., description="Estimated tokens of the whole prompt")
+    candidates: int = Field(..., description="Ranked CLOs offered to the packer")
+    packed: int = Field(..., description="CLOs that made it into the prompt")
+    truncated: int = Field(..., description="Packed CLOs whose description was shortened")
+    desc_max_chars: int = Field(..., description="Description length cap chosen to fit the budget")
+    curricula: Optional[int] = Field(None, description="Whole-curriculum CLO blocks in the prompt (prefix layout)")
+
+
 class GroupedCLOSuggestionResponse(BaseModel):
     company_name: str
     requirements: str
@@ -62,8 +100,15 @@ class GroupedCLOSuggestionResponse(BaseModel):
     clo_context: List[CLOWithContext] = Field(default_factory=list, description="CLO IDs with their curriculum_id and course_id")
     clo_plo_mappings: List[dict] = Field(default_factory=list, description="CLO to PLO mappings from CSV")
     mapped_plos: List[PLOInfo] = Field(default_factory=list, description="PLOs mapped from selected CLOs")
+    prompt_stats: Optional[PromptStats] = Field(default=None, description="How the CLO candidates were packed into the prompt")
     message: str
 
+class CompanyGroupEvent(BaseModel):
+    group: CompanyGroup
+    clo_context: List[CLOWithContext] = Field(default_factory=list, description="This group's CLO IDs with their curriculum_id and course_id")
+    clo_plo_mappings: List[dict] = Field(default_factory=list, description="CLO to PLO mappings of this group's CLOs")
+    mapped_plos: List[PLOInfo] = Field(default_factory=list, description="PLOs mapped from this group's CLOs")
+
 class CompaniesListResponse(BaseModel):
     companies: List[CompanyProfile]
     total: int
@@ -84,6 +129,7 @@ class SuggestCompanyDetailsRequest(BaseModel):
     company_name: str = Field(..., description="Name of the company")
     brief_description: Optional[str] = Field(None, description="Brief description or hints about the company (e.g., industry, size, focus area)")
     partial_requirements: Optional[str] = Field(None, description="Partial or incomplete requirements if user has started writing")
+    bypass_cache: bool = Field(False, description="Call the LLM even if a cached answer exists (the fresh answer replaces it)")
 
 class SuggestCompanyDetailsResponse(BaseModel):
     company_name: str
@@ -91,3 +137,52 @@ class SuggestCompanyDetailsResponse(BaseModel):
     suggested_culture: str = Field(..., description="AI-generated company culture description")
     suggested_desired_traits: str = Field(..., description="AI-generated desired personality traits and soft skills")
     message: str
+
+class LLMCacheStats(BaseModel):
+    enabled: bool
+    entries: int = Field(0, description="Answers currently stored")
+    max_entries: int = 0
+    ttl_seconds: float = 0
+    hits: int = Field(0, description="Lookups answered from the cache since this worker started")
+    misses: int = Field(0, description="Lookups that went to the LLM since this worker started")
+    hit_rate: float = 0.0
+    evictions: int = Field(0, description="Least recently used answers dropped to stay under max_entries")
+
+class LLMProviderHealth(BaseModel):
+    provider: str
+    breaker: str = Field(..., description="Circuit breaker state: closed, open or half_open")
+    consecutive_failures: int
+    calls: int = Field(0, description="Calls routed to this provider since this worker started")
+    failures: int = 0
+    hedges: int = Field(0, description="Calls started on this provider to hedge a slow call on the other")
+    hedge_wins: int = Field(0, description="Hedged calls this provider answered first")
+    latency_quantile: float
+    latency: dict = Field(default_factory=dict, description="Latency quantile in seconds per kind of call (null until enough samples)")
+
+class LLMRouterStats(BaseModel):
+    providers: List[LLMProviderHealth]
+
+class LLMAdmissionStats(BaseModel):
+    provider: str
+    active: int = Field(..., description="LLM requests running now")
+    max_concurrency: int
+    queued: int = Field(..., description="Requests waiting for a slot now")
+    max_queued: int = Field(0, description="Deepest queue since this worker started")
+    queue_size: int
+    admitted: int = 0
+    rejected_full: int = Field(0, description="Requests rejected because the queue was full")
+    rejected_deadline: int = Field(0, description="Requests rejected because no slot came within LLM_QUEUE_TIMEOUT")
+    avg_wait_seconds: float = 0.0
+    requests_available: Optional[int] = Field(None, description="Requests left in the per-minute bucket (null if LLM_RPM is 0)")
+    tokens_available: Optional[int] = Field(None, description="Tokens left in the per-minute bucket (null if LLM_TPM is 0)")
+
+class LLMAdmissionStatsResponse(BaseModel):
+    providers: List[LLMAdmissionStats]
+
+class LLMUsageStats(BaseModel):
+    provider: str
+    calls: int = Field(0, description="LLM responses since this worker started")
+    prompt_tokens: int = Field(0, description="Input tokens reported by the provider")
+    cached_tokens: int = Field(0, description="Input tokens served from the provider's prompt cache")
+    cached_ratio: float = Field(0.0, description="cached_tokens / prompt_tokens")
+    output_tokens: int = Field(0, description="Generated tokens reported by the provider")
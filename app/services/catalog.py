@@ -0,0 +1,417 @@
+import csv
+import hashlib
+import sys
+import threading
+from array import array
+from collections import defaultdict
+from pathlib import Path
+from typing import List, Dict, Optional
+
+from app.config import get_settings
+from app.services.columnar import ColumnTable, encode_column
+from app.services.clo_dedup import load_clo_duplicates
+from app.services.clo_index import load_clo_index
+from app.services.clo_vectors import load_clo_vectors
+from app.services.plo_hierarchy import PLOHierarchy
+
+
+DATA_DIR = Path(__file__).parent.parent.parent / "data"
+
+CLO_FILE = "tlic_obe_public_clo.csv"
+PLO_FILE = "tlic_obe_public_plo.csv"
+MAPPING_FILE = "tlic_obe_public_clo_has_plos.csv"
+
+# Columns kept from each CSV export (everything else is dropped at load time).
+CLO_COLUMNS = ("id", "course_id", "no", "description", "category", "deleted_at")
+PLO_COLUMNS = ("id", "curriculum_id", "name", "name_en", "detail", "plo_level", "parent_plo_id", "deleted_at")
+MAPPING_COLUMNS = ("id", "curriculum_id", "course_id", "clo_id", "plo_id", "is_map")
+
+
+def read_csv_rows(path: Path, columns: tuple) -> List[Dict]:
+    """Read a CSV export keeping only ``columns``, with every value stripped."""
+    rows = []
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            rows.append({col: (row.get(col) or '').strip() for col in columns})
+    return rows
+
+
+_BLANK = -1  # integer id columns store blank values as -1 (ids are positive serials)
+
+CLO_OUTPUT = ('id', 'course_id', 'no', 'description', 'category')
+PLO_OUTPUT = tuple(col for col in PLO_COLUMNS if col != 'deleted_at')
+
+
+def _index(keys) -> Dict:
+    """Map each key to the ascending positions where it occurs."""
+    index = defaultdict(list)
+    for pos, key in enumerate(keys):
+        index[key].append(pos)
+    return {key: array('I', positions) for key, positions in index.items()}
+
+
+class CatalogIndexes:
+    """Search structures derived from a catalog's ``load_all_clos()`` and ``load_plos()``.
+
+    Mixed into ``OBECatalog`` and ``SQLiteCatalog``: the PLO hierarchy, the
+    CLO index, near-duplicate clusters and (with ``CLO_RANKING_MODE=dense``)
+    the CLO vectors. Each is built once per catalog on first use, or up front
+    with ``build_indexes``, and reused from ``cache_dir`` when a current copy
+    is on disk.
+    """
+
+    def _init_indexes(self, cache_dir: Optional[Path]) -> None:
+        self.cache_dir = cache_dir
+        self._indexes: Dict[str, object] = {}
+        # Reentrant: the vectors are built from the CLO index.
+        self._indexes_lock = threading.RLock()
+
+    def _derived(self, name: str, build):
+        try:
+            return self._indexes[name]
+        except KeyError:
+            pass
+        with self._indexes_lock:
+            if name not in self._indexes:
+                self._indexes[name] = build()
+            return self._indexes[name]
+
+    def build_indexes(self, clos: Optional[List[Dict]] = None) -> None:
+        """Build every structure now, from ``clos`` if already loaded."""
+        clos = self.load_all_clos() if clos is None else clos
+        self._derived("clo_index", lambda: load_clo_index(clos, cache_dir=self.cache_dir))
+        self._derived("clo_duplicates", lambda: load_clo_duplicates(clos, cache_dir=self.cache_dir))
+        self.plo_hierarchy
+        self.clo_vectors
+
+    @property
+    def plo_hierarchy(self) -> PLOHierarchy:
+        return self._derived("plo_hierarchy", lambda: PLOHierarchy(self.load_plos()))
+
+    @property
+    def clo_index(self):
+        return self._derived("clo_index", lambda: load_clo_index(self.load_all_clos(), cache_dir=self.cache_dir))
+
+    @property
+    def clo_duplicates(self):
+        return self._derived(
+            "clo_duplicates", lambda: load_clo_duplicates(self.load_all_clos(), cache_dir=self.cache_dir)
+        )
+
+    @property
+    def clo_vectors(self):
+        if get_settings().clo_ranking_mode != "dense":
+            return None
+        return self._derived("clo_vectors", lambda: load_clo_vectors(self.clo_index, cache_dir=self.cache_dir))
+
+
+class OBECatalog(CatalogIndexes):
+    """Immutable in-memory view of the OBE CSV exports.
+
+    The CSVs are parsed exactly once into column-oriented ``ColumnTable``s
+    (see ``columnar``) and every loader query is answered from those plus a
+    few position indexes. Query methods mirror ``CSVLoaderService`` and always
+    return fresh dicts, so callers may mutate results without affecting the
+    shared catalog.
+
+    ``cache_dir`` (normally the directory the CSVs came from) holds the
+    on-disk copies of the search indexes; with ``None`` they are only built
+    in memory.
+    """
+
+    def __init__(self, clo: ColumnTable, plo: ColumnTable, mapping: ColumnTable, cache_dir: Optional[Path] = None):
+        self.clo_table = clo
+        self.plo_table = plo
+        self.mapping_table = mapping
+
+        # Mappings: integer ids for filtering plus secondary indexes over row
+        # positions (ascending = file order).
+        n_mappings = len(mapping)
+        all_mappings = range(n_mappings)
+        self._mapping_curriculum = mapping.int_values('curriculum_id')
+        self._mapping_course = mapping.int_values('course_id')
+        self._mapping_is_map = array('b', (v.lower() == 'true' for v in mapping.take('is_map', all_mappings)))
+        self._mappings_by_clo_id = _index(mapping.take('clo_id', all_mappings))
+        self._mappings_by_context = _index(zip(self._mapping_curriculum, self._mapping_course))
+        self._mappings_by_curriculum = _index(self._mapping_curriculum)
+
+        # course_id -> curriculum_id (last mapping row wins, as in the CSV scan)
+        course_to_curriculum = {}
+        for raw_course_id, raw_curriculum_id in zip(
+            mapping.take('course_id', all_mappings), mapping.take('curriculum_id', all_mappings)
+        ):
+            if raw_course_id and raw_curriculum_id:
+                course_to_curriculum[raw_course_id] = raw_curriculum_id
+
+        # CLOs: positions of live rows, and the deduplicated "all CLOs" view
+        # with its curriculum_id column.
+        all_clo_rows = range(len(clo))
+        deleted = clo.take('deleted_at', all_clo_rows)
+        self._clo_positions = array('I', (pos for pos in all_clo_rows if not deleted[pos]))
+        course_nums = clo.int_values('course_id')
+        self._clos_by_course = _index(course_nums[pos] for pos in self._clo_positions)
+
+        clo_ids = clo.take('id', self._clo_positions)
+        course_ids = clo.take('course_id', self._clo_positions)
+        all_positions = array('I')
+        all_curricula = []
+        seen_clos = set()
+        for pos, clo_id, course_id in zip(self._clo_positions, clo_ids, course_ids):
+            curriculum_id = course_to_curriculum.get(course_id, '')
+            clo_key = (curriculum_id, course_id, clo_id)
+            if clo_key in seen_clos:
+                continue
+            seen_clos.add(clo_key)
+            all_positions.append(pos)
+            all_curricula.append(curriculum_id)
+        self._all_clo_positions = all_positions
+        self._all_clo_curriculum = encode_column(all_curricula, {})
+
+        # PLOs: live rows, their curriculum ids and an id index.
+        deleted = plo.take('deleted_at', range(len(plo)))
+        self._plo_positions = array('I', (pos for pos in range(len(plo)) if not deleted[pos]))
+        plo_curricula = plo.int_values('curriculum_id')
+        self._plo_curriculum = array('q', (plo_curricula[pos] for pos in self._plo_positions))
+        self._plos_by_id = _index(plo.take('id', self._plo_positions))
+
+        # Built here rather than on first use: a reload builds the new catalog
+        # off the request path (see catalog_reloader).
+        all_clos = self.load_all_clos()
+        self.version = clo_catalog_version(all_clos)
+        self._init_indexes(cache_dir)
+        self.build_indexes(all_clos)
+
+    @classmethod
+    def from_rows(
+        cls,
+        clo_rows: List[Dict],
+        plo_rows: List[Dict],
+        mapping_rows: List[Dict],
+        cache_dir: Optional[Path] = None,
+    ) -> "OBECatalog":
+        """Build a catalog from CSV rows (dicts of stripped strings)."""
+        return cls(
+            clo=ColumnTable.from_rows(clo_rows, CLO_COLUMNS),
+            plo=ColumnTable.from_rows(plo_rows, PLO_COLUMNS),
+            mapping=ColumnTable.from_rows(mapping_rows, MAPPING_COLUMNS),
+            cache_dir=cache_dir,
+        )
+
+    @classmethod
+    def from_csv(cls, data_dir: Path = DATA_DIR) -> "OBECatalog":
+        """Parse the three CSV exports in ``data_dir`` into a catalog."""
+        return cls.from_rows(
+            clo_rows=read_csv_rows(data_dir / CLO_FILE, CLO_COLUMNS),
+            plo_rows=read_csv_rows(data_dir / PLO_FILE, PLO_COLUMNS),
+            mapping_rows=read_csv_rows(data_dir / MAPPING_FILE, MAPPING_COLUMNS),
+            cache_dir=data_dir,
+        )
+
+    @staticmethod
+    def _probe(index: Dict, keys) -> List[int]:
+        """Collect row positions stored under ``keys``, in file order."""
+        positions = []
+        for key in keys:
+            positions.extend(index.get(key, ()))
+        positions.sort()
+        return positions
+
+    def load_clos(self, course_id: Optional[int] = None) -> List[Dict]:
+        if course_id is None:
+            return self.clo_table.records(CLO_OUTPUT, self._clo_positions)
+        # Rows with a blank course_id are never filtered out.
+        live = self._probe(self._clos_by_course, (course_id, _BLANK))
+        return self.clo_table.records(CLO_OUTPUT, [self._clo_positions[i] for i in live])
+
+    def load_all_clos(self) -> List[Dict]:
+        positions = self._all_clo_positions
+        take = self.clo_table.take
+        columns = (
+            take('id', positions),
+            take('course_id', positions),
+            self._all_clo_curriculum.take(range(len(positions))),
+            take('no', positions),
+            take('description', positions),
+            take('category', positions),
+        )
+        names = ('id', 'course_id', 'curriculum_id', 'no', 'description', 'category')
+        return [dict(zip(names, row)) for row in zip(*columns)]
+
+    def load_clo_plo_mappings(
+        self,
+        curriculum_id: Optional[int] = None,
+        course_id: Optional[int] = None,
+        clo_ids: Optional[List[str]] = None,
+        is_map_only: bool = True
+    ) -> List[Dict]:
+        # Pick the most selective index for the candidate rows, then apply the
+        # remaining filters to those candidates only. Blank curriculum/course
+        # values always pass their filter, hence the ``_BLANK`` index keys.
+        if clo_ids is not None:
+            candidates = self._probe(self._mappings_by_clo_id, set(clo_ids))
+        elif curriculum_id is not None and course_id is not None:
+            candidates = self._probe(
+                self._mappings_by_context,
+                {(cur, crs) for cur in (curriculum_id, _BLANK) for crs in (course_id, _BLANK)},
+            )
+        elif curriculum_id is not None:
+            candidates = self._probe(self._mappings_by_curriculum, (curriculum_id, _BLANK))
+        else:
+            candidates = range(len(self.mapping_table))
+
+        is_map = self._mapping_is_map
+        curricula = self._mapping_curriculum
+        courses = self._mapping_course
+        positions = []
+        for pos in candidates:
+            if is_map_only and not is_map[pos]:
+                continue
+            if curriculum_id is not None and curricula[pos] != _BLANK and curricula[pos] != curriculum_id:
+                continue
+            if course_id is not None and courses[pos] != _BLANK and courses[pos] != course_id:
+                continue
+            positions.append(pos)
+        return self.mapping_table.records(MAPPING_COLUMNS, positions)
+
+    def load_plos(
+        self,
+        curriculum_id: Optional[int] = None,
+        plo_ids: Optional[List[str]] = None
+    ) -> List[Dict]:
+        if plo_ids is not None:
+            candidates = self._probe(self._plos_by_id, set(plo_ids))
+        else:
+            candidates = range(len(self._plo_positions))
+
+        if curriculum_id is not None:
+            curricula = self._plo_curriculum
+            candidates = [
+                i for i in candidates
+                if curricula[i] == _BLANK or curricula[i] == curriculum_id
+            ]
+        return self.plo_table.records(PLO_OUTPUT, [self._plo_positions[i] for i in candidates])
+
+    def close(self) -> None:
+        """Nothing to release; the tables are plain Python objects."""
+
+    def nbytes(self) -> int:
+        """Approximate bytes held by the catalog's tables and indexes."""
+        total = self.clo_table.nbytes() + self.plo_table.nbytes() + self.mapping_table.nbytes()
+        for value in vars(self).values():
+            if isinstance(value, array):
+                total += sys.getsizeof(value)
+            elif isinstance(value, dict):
+                total += sys.getsizeof(value) + sum(sys.getsizeof(v) for v in value.values())
+        return total + self._all_clo_curriculum.nbytes()
+
+
+SOURCE_FILES = (CLO_FILE, PLO_FILE, MAPPING_FILE)
+
+
+def source_signature(data_dir: Path = DATA_DIR) -> tuple:
+    """Cheap (size, mtime_ns) fingerprint of the three CSV exports."""
+    signature = []
+    for filename in SOURCE_FILES:
+        st = (data_dir / filename).stat()
+        signature.append((filename, st.st_size, st.st_mtime_ns))
+    return tuple(signature)
+
+
+def clo_catalog_version(clos: List[Dict]) -> str:
+    """Hash of every CLO's id, curriculum, course and description.
+
+    Changes whenever anything a CLO suggestion depends on changes; used to
+    key cached LLM answers to the catalog they were produced from.
+    """
+    h = hashlib.sha256()
+    for clo in clos:
+        h.update("\x1f".join(
+            str(clo.get(field, '')) for field in ("id", "curriculum_id", "course_id", "description")
+        ).encode('utf-8'))
+        h.update(b"\x1e")
+    return h.hexdigest()
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_info(data_dir: Path = DATA_DIR) -> Dict[str, Dict]:
+    """Size, mtime and sha256 of each CSV export, keyed by file name.
+
+    Recorded by derived artifacts (snapshot, SQLite import) so they can tell
+    whether they still match the CSVs; see ``sources_match``.
+    """
+    info = {}
+    for filename in SOURCE_FILES:
+        path = data_dir / filename
+        st = path.stat()
+        info[filename] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": _sha256(path)}
+    return info
+
+
+def sources_match(recorded: Dict[str, Dict], data_dir: Path = DATA_DIR) -> bool:
+    """True when the CSV exports still match ``recorded`` (from ``source_info``).
+
+    Size and mtime are checked first; on a mismatch (e.g. a fresh git checkout
+    touching mtimes) the content hash decides.
+    """
+    for filename in SOURCE_FILES:
+        info = (recorded or {}).get(filename)
+        path = data_dir / filename
+        if not info or not path.exists():
+            return False
+        st = path.stat()
+        if st.st_size != info.get("size"):
+            return False
+        if st.st_mtime_ns != info.get("mtime_ns") and _sha256(path) != info.get("sha256"):
+            return False
+    return True
+
+
+def load_catalog(data_dir: Path = DATA_DIR) -> OBECatalog:
+    """Build a catalog from ``data_dir`` using the configured backend.
+
+    With ``catalog_backend="sqlite"`` queries go to a SQLite import of the CSVs
+    (see ``sqlite_catalog``). Otherwise the catalog is held in memory, loaded
+    from a fresh compiled snapshot (see ``catalog_snapshot``) when available
+    and from the CSVs when the snapshot is missing or stale.
+    """
+    from app.services.catalog_snapshot import load_snapshot
+    from app.services.sqlite_catalog import SQLiteCatalog
+
+    settings = get_settings()
+    if settings.catalog_backend == "sqlite":
+        return SQLiteCatalog.open(data_dir, path=settings.catalog_sqlite_path or None)
+    return load_snapshot(data_dir=data_dir) or OBECatalog.from_csv(data_dir)
+
+
+_catalog: Optional[OBECatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> OBECatalog:
+    """Return the current process-wide catalog, building it on first use.
+
+    Callers should hold on to the returned object for the duration of a
+    request: a reload swaps in a new catalog without touching the old one.
+    """
+    catalog = _catalog
+    if catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                set_catalog(load_catalog(DATA_DIR))
+            catalog = _catalog
+    return catalog
+
+
+def set_catalog(catalog: OBECatalog) -> Optional[OBECatalog]:
+    """Atomically replace the process-wide catalog; returns the one it replaced."""
+    global _catalog
+    previous, _catalog = _catalog, catalog
+    return previous
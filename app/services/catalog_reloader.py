@@ -0,0 +1,98 @@
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from app.services.catalog import DATA_DIR, OBECatalog, load_catalog, set_catalog, source_signature
+
+logger = logging.getLogger(__name__)
+
+# Seconds a replaced catalog stays open: a request holds its catalog for its
+# whole duration, LLM calls included.
+RETIRE_AFTER = 600.0
+
+
+class CatalogReloader:
+    """Background mtime poller that rebuilds and swaps the OBE catalog.
+
+    Every ``interval`` seconds the CSV exports are stat'ed. When their
+    size/mtime changes and stays unchanged for ``settle`` seconds (so a
+    half-written export is not picked up), a new catalog is built on this
+    thread and swapped in with ``set_catalog``. Requests that already hold the
+    previous catalog keep using it; none of them wait on the rebuild, and the
+    replaced catalog is closed ``RETIRE_AFTER`` seconds later (or on
+    ``stop``). A failed rebuild is logged and the current catalog stays in
+    place.
+    """
+
+    def __init__(self, interval: float = 30.0, settle: float = 2.0, data_dir: Path = DATA_DIR):
+        self.interval = interval
+        self.settle = settle
+        self.data_dir = data_dir
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._signature = self._current_signature()
+        self._retired: List[Tuple[float, OBECatalog]] = []
+
+    def _current_signature(self) -> Optional[tuple]:
+        try:
+            return source_signature(self.data_dir)
+        except OSError:
+            # A file may briefly disappear while an export is being replaced.
+            return None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="catalog-reloader", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + self.settle)
+            self._thread = None
+        self.close_retired(force=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.check()
+            self.close_retired()
+
+    def close_retired(self, force: bool = False) -> None:
+        """Close replaced catalogs whose grace period is over (all with ``force``)."""
+        now = time.monotonic()
+        keep = []
+        for closes_at, catalog in self._retired:
+            if force or now >= closes_at:
+                try:
+                    catalog.close()
+                except Exception:
+                    logger.exception("Closing a replaced catalog failed")
+            else:
+                keep.append((closes_at, catalog))
+        self._retired = keep
+
+    def check(self) -> bool:
+        """Reload if the CSVs changed since the last load. Returns True on swap."""
+        signature = self._current_signature()
+        if signature is None or signature == self._signature:
+            return False
+
+        if self._stop.wait(self.settle) or self._current_signature() != signature:
+            # Still being written (or shutting down); look again next poll.
+            return False
+
+        try:
+            catalog = load_catalog(self.data_dir)
+        except Exception:
+            logger.exception("Catalog reload failed; keeping the current catalog")
+            return False
+
+        previous = set_catalog(catalog)
+        if previous is not None:
+            self._retired.append((time.monotonic() + RETIRE_AFTER, previous))
+        self._signature = signature
+        logger.info("Reloaded OBE catalog from %s", self.data_dir)
+        return True
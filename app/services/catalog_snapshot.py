@@ -0,0 +1,217 @@
+"""Compiled binary snapshot of the OBE CSV exports.
+
+Parsing ~29k CSV rows dominates cold start, so the three exports can be
+compiled ahead of time (e.g. in the Render build step) into a single file:
+
+    python -m app.services.catalog_snapshot            # build
+    python -m app.services.catalog_snapshot --check    # report freshness
+
+Layout::
+
+    MAGIC (8 bytes) | header length (uint32 LE) | header JSON | blobs
+
+The header records the schema version, byte order, the size/mtime/sha256
+of every source CSV and, per column, its ``columnar`` encoding and the
+``[offset, length]`` of its blobs. Columns are stored already encoded, so
+loading is a copy out of the memory map rather than a re-parse:
+
+* ``int`` -- the raw ``array('q')`` bytes
+* ``cat`` -- the raw code array plus a NUL-joined blob of distinct values
+* ``str`` -- the values as one UTF-8 blob joined by ``\\x00``
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.services.catalog import (
+    CLO_COLUMNS,
+    CLO_FILE,
+    DATA_DIR,
+    MAPPING_COLUMNS,
+    MAPPING_FILE,
+    PLO_COLUMNS,
+    PLO_FILE,
+    OBECatalog,
+    read_csv_rows,
+    source_info,
+    sources_match,
+)
+from app.services.columnar import CategoricalColumn, ColumnTable, IntColumn, StringColumn
+
+
+MAGIC = b"OBECAT\x00\x00"
+SCHEMA_VERSION = 2
+SNAPSHOT_FILE = "obe_catalog.snapshot"
+
+SEPARATOR = "\x00"
+_HEADER_LEN = struct.Struct("<I")
+
+# table name -> (source CSV, columns kept)
+TABLES = {
+    "clo": (CLO_FILE, CLO_COLUMNS),
+    "plo": (PLO_FILE, PLO_COLUMNS),
+    "mapping": (MAPPING_FILE, MAPPING_COLUMNS),
+}
+
+
+def default_snapshot_path(data_dir: Path = DATA_DIR) -> Path:
+    return data_dir / SNAPSHOT_FILE
+
+
+def _join(values: List[str], where: str) -> bytes:
+    if any(SEPARATOR in v for v in values):
+        raise ValueError(f"{where} contains a NUL character")
+    return SEPARATOR.join(values).encode('utf-8')
+
+
+def _split(blob: bytes, n_values: int) -> Optional[List[str]]:
+    values = blob.decode('utf-8').split(SEPARATOR) if n_values else []
+    return values if len(values) == n_values else None
+
+
+def build_snapshot(data_dir: Path = DATA_DIR, output: Optional[Path] = None) -> Path:
+    """Compile the CSV exports in ``data_dir`` into a snapshot file."""
+    output = output or default_snapshot_path(data_dir)
+
+    # Fingerprint before reading so a concurrent export shows up as stale later.
+    header = {
+        "schema_version": SCHEMA_VERSION,
+        "byteorder": sys.byteorder,
+        "sources": source_info(data_dir),
+        "tables": {},
+    }
+    blobs: List[bytes] = []
+    offset = 0
+
+    def add_blob(blob: bytes) -> List[int]:
+        nonlocal offset
+        blobs.append(blob)
+        section = [offset, len(blob)]
+        offset += len(blob)
+        return section
+
+    for table, (filename, columns) in TABLES.items():
+        column_table = ColumnTable.from_rows(read_csv_rows(data_dir / filename, columns), columns)
+        table_header = {"rows": len(column_table), "columns": {}}
+        for col in columns:
+            column = column_table.columns[col]
+            where = f"{filename}: column '{col}'"
+            if isinstance(column, IntColumn):
+                entry = {"kind": "int", "data": add_blob(column.data.tobytes())}
+            elif isinstance(column, CategoricalColumn):
+                entry = {
+                    "kind": "cat",
+                    "typecode": column.codes.typecode,
+                    "n_values": len(column.values),
+                    "codes": add_blob(column.codes.tobytes()),
+                    "values": add_blob(_join(column.values, where)),
+                }
+            else:
+                entry = {"kind": "str", "data": add_blob(_join(column.data, where))}
+            table_header["columns"][col] = entry
+        header["tables"][table] = table_header
+
+    header_bytes = json.dumps(header, separators=(",", ":")).encode('utf-8')
+
+    # Write to a temp file and rename so readers never see a partial snapshot.
+    tmp = output.with_name(output.name + ".tmp")
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_HEADER_LEN.pack(len(header_bytes)))
+        f.write(header_bytes)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp, output)
+    return output
+
+
+def _read_header(mm: mmap.mmap) -> tuple[Dict, int]:
+    if mm[:len(MAGIC)] != MAGIC:
+        raise ValueError("not an OBE catalog snapshot")
+    start = len(MAGIC) + _HEADER_LEN.size
+    (header_len,) = _HEADER_LEN.unpack(mm[len(MAGIC):start])
+    header = json.loads(mm[start:start + header_len].decode('utf-8'))
+    return header, start + header_len
+
+
+def _is_fresh(header: Dict, data_dir: Path) -> bool:
+    """True when the snapshot matches this schema and the current CSVs."""
+    if header.get("schema_version") != SCHEMA_VERSION or header.get("byteorder") != sys.byteorder:
+        return False
+    if any(table not in header.get("tables", {}) for table in TABLES):
+        return False
+    return sources_match(header.get("sources"), data_dir)
+
+
+def load_snapshot(path: Optional[Path] = None, data_dir: Path = DATA_DIR) -> Optional[OBECatalog]:
+    """Load a catalog from a snapshot, or return ``None`` if missing or stale."""
+    path = path or default_snapshot_path(data_dir)
+    if not path.exists():
+        return None
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        try:
+            header, base = _read_header(mm)
+        except ValueError:
+            return None
+        if not _is_fresh(header, data_dir):
+            return None
+
+        def section(bounds: List[int]) -> bytes:
+            start = base + bounds[0]
+            return mm[start:start + bounds[1]]
+
+        pool: dict = {}
+        tables = {}
+        for table, (_, columns) in TABLES.items():
+            table_header = header["tables"][table]
+            n_rows = table_header["rows"]
+            column_values = {}
+            for col in columns:
+                entry = table_header["columns"][col]
+                if entry["kind"] == "int":
+                    data = array('q')
+                    data.frombytes(section(entry["data"]))
+                    column = IntColumn(data)
+                elif entry["kind"] == "cat":
+                    codes = array(entry["typecode"])
+                    codes.frombytes(section(entry["codes"]))
+                    values = _split(section(entry["values"]), entry["n_values"])
+                    column = CategoricalColumn(codes, values) if values is not None else None
+                else:
+                    values = _split(section(entry["data"]), n_rows)
+                    column = StringColumn([pool.setdefault(v, v) for v in values]) if values is not None else None
+                if column is None or len(column) != n_rows:
+                    return None
+                column_values[col] = column
+            tables[table] = ColumnTable(column_values, n_rows)
+
+    return OBECatalog(clo=tables["clo"], plo=tables["plo"], mapping=tables["mapping"], cache_dir=data_dir)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compile the OBE CSV exports into a binary snapshot.")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--output", type=Path, default=None, help="snapshot path (default: <data-dir>/obe_catalog.snapshot)")
+    parser.add_argument("--check", action="store_true", help="only report whether the snapshot is fresh")
+    args = parser.parse_args(argv)
+
+    output = args.output or default_snapshot_path(args.data_dir)
+    if args.check:
+        fresh = load_snapshot(output, args.data_dir) is not None
+        print(f"{output}: {'fresh' if fresh else 'missing or stale'}")
+        return 0 if fresh else 1
+
+    path = build_snapshot(args.data_dir, output)
+    print(f"Wrote {path} ({path.stat().st_size} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""Short per-request aliases for CLO candidates in prompts.
+
+With ``CLO_PROMPT_ENCODING=alias``, each prompt line is ``- c12: <description>``
+instead of ``- CLO_ID=... (curriculum_id=..., course_id=...): <description>``.
+The model answers with the aliases only (``"suggested_clos": ["c12", "c3"]``),
+and the server restores the CLO id and its curriculum/course context from
+the candidates it sent.
+"""
+import re
+from typing import Dict, List, Optional
+
+from app.services.clo_dedup import context_key
+
+PROMPT_ENCODINGS = ("full", "alias")
+ALIAS_PREFIX = "c"
+
+_ALIAS_RE = re.compile(rf"^{ALIAS_PREFIX}(\d+)$", re.IGNORECASE)
+
+# Prompt wording per encoding: how suggested CLOs are referenced and returned.
+PROMPT_TEXT = {
+    "full": {
+        "task": "3) For each CLO you suggest, you MUST also include its curriculum_id and course_id.",
+        "rule": '- suggested_clos must be an array of objects with format: {"clo_id": "22", "curriculum_id": 9, "course_id": 9}',
+        "example": """[
+        {"clo_id": "22", "curriculum_id": 9, "course_id": 9},
+        {"clo_id": "23", "curriculum_id": 9, "course_id": 9}
+      ]""",
+    },
+    "alias": {
+        "task": f"3) Refer to each CLO only by its alias exactly as listed (e.g. {ALIAS_PREFIX}12).",
+        "rule": f'- suggested_clos must be an array of CLO aliases, e.g. ["{ALIAS_PREFIX}12", "{ALIAS_PREFIX}3"].',
+        "example": f'["{ALIAS_PREFIX}1", "{ALIAS_PREFIX}2"]',
+    },
+}
+
+
+def check_encoding(encoding: str) -> str:
+    if encoding not in PROMPT_ENCODINGS:
+        raise Exception(f"Unknown CLO prompt encoding '{encoding}', expected one of {PROMPT_ENCODINGS}")
+    return encoding
+
+
+def alias_line(clo: Dict, description: str) -> str:
+    """Prompt line of an aliased CLO."""
+    return f"- {clo['alias']}: {description}"
+
+
+class CLOAliases:
+    """Aliases ``c1``, ``c2``, ... for the CLO candidates of one request, in order.
+
+    ``clos`` are copies of the candidates with an ``alias`` key added.
+    """
+
+    def __init__(self, clos: List[Dict]):
+        self.clos = [dict(clo, alias=f"{ALIAS_PREFIX}{i}") for i, clo in enumerate(clos, 1)]
+
+    def resolve(self, item) -> Optional[Dict]:
+        """Context of a returned alias, or ``None`` if it names no candidate.
+
+        Accepts ``"c12"`` or an object whose ``alias`` or ``clo_id`` is the alias.
+        """
+        if isinstance(item, dict):
+            item = item.get("alias") or item.get("clo_id")
+        m = _ALIAS_RE.match(str(item or "").strip())
+        if not m:
+            return None
+        pos = int(m.group(1)) - 1
+        if not 0 <= pos < len(self.clos):
+            return None
+        clo = self.clos[pos]
+        clo_id, curriculum_id, course_id = context_key(clo['id'], clo.get('curriculum_id'), clo.get('course_id'))
+        return {"clo_id": clo_id, "curriculum_id": curriculum_id, "course_id": course_id}
@@ -0,0 +1,159 @@
+"""Approximate nearest-neighbour search over dense CLO vectors (IVF).
+
+An inverted-file index partitions the unit-length vectors with spherical
+k-means. Each vector is stored in the list of its nearest centroid. A query
+scores only the vectors in its ``nprobe`` most similar lists, so the cost is
+roughly ``nprobe / n_lists`` of an exact scan. ``nprobe`` trades recall for
+latency: more lists probed means closer to exact search, and slower.
+"""
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+DEFAULT_NPROBE = 64
+_KMEANS_ITERATIONS = 10
+# Centroids are trained on at most this many sampled vectors per list.
+_TRAIN_PER_LIST = 64
+# Rows per block when assigning vectors to centroids, bounding memory.
+_ASSIGN_BLOCK = 1 << 15
+_SEED = 0
+
+
+def default_n_lists(n_rows: int) -> int:
+    """About sqrt(n) lists, the usual balance between probe and scan cost."""
+    return max(1, int(round(np.sqrt(n_rows))))
+
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the most similar centroid for every vector, blockwise."""
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _ASSIGN_BLOCK):
+        block = np.asarray(vectors[start:start + _ASSIGN_BLOCK])
+        out[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def _normalize(m: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(m, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (m / norms).astype(np.float32)
+
+
+def _top_k_by_position(scores: np.ndarray, positions: np.ndarray, k: int) -> np.ndarray:
+    """``positions`` of the ``k`` highest ``scores``, descending, ties by position."""
+    if k < len(scores):
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)
+        ties = ties[np.argsort(positions[ties], kind='stable')[:k - len(above)]]
+        keep = np.concatenate([above, ties])
+        scores, positions = scores[keep], positions[keep]
+    return positions[np.lexsort((positions, -scores))]
+
+
+class IVFIndex:
+    """Inverted lists of vector positions, one per k-means centroid.
+
+    ``order`` holds vector positions grouped by list and ascending within a
+    list. List ``i`` is ``order[offsets[i]:offsets[i + 1]]``, and
+    ``list_vectors`` holds the vectors in the same order, so scanning a list
+    reads one contiguous block.
+    """
+
+    def __init__(self, list_vectors: np.ndarray, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray):
+        self.list_vectors = list_vectors
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, n_lists: Optional[int] = None) -> "IVFIndex":
+        n_rows = len(vectors)
+        n_lists = min(n_lists or default_n_lists(n_rows), max(n_rows, 1))
+        rng = np.random.default_rng(_SEED)
+
+        # Spherical k-means on a sample: assign by cosine, re-centre, renormalise.
+        sample_size = min(n_rows, n_lists * _TRAIN_PER_LIST)
+        sample = np.asarray(vectors[np.sort(rng.choice(n_rows, sample_size, replace=False))])
+        centroids = sample[rng.choice(sample_size, n_lists, replace=False)].copy()
+        for _ in range(_KMEANS_ITERATIONS):
+            assignment = _nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = np.bincount(assignment, minlength=n_lists) == 0
+            # Re-seed empty lists from random sample points.
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            centroids = _normalize(sums)
+
+        assignment = _nearest(vectors, centroids)
+        order = np.argsort(assignment, kind='stable').astype(np.int64)
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignment, minlength=n_lists), out=offsets[1:])
+        list_vectors = np.empty(vectors.shape, dtype=np.float32)
+        for start in range(0, n_rows, _ASSIGN_BLOCK):
+            list_vectors[start:start + _ASSIGN_BLOCK] = vectors[order[start:start + _ASSIGN_BLOCK]]
+        return cls(list_vectors, centroids, order, offsets)
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = DEFAULT_NPROBE) -> List[int]:
+        """Positions of the (approximately) ``k`` most similar vectors.
+
+        Ordered by similarity descending, ties in position order. If the
+        probed lists hold fewer than ``k`` vectors, more lists are probed.
+        """
+        if k <= 0 or len(self.order) == 0:
+            return []
+        if not query.any():
+            # Nothing to compare against: same as exact search (catalog order).
+            return list(range(min(k, len(self.order))))
+        lists = np.argsort(-(self.centroids @ query), kind='stable')
+        sizes = self.offsets[lists + 1] - self.offsets[lists]
+        # Probe at least ``nprobe`` lists and enough of them to cover k vectors.
+        enough = int(np.searchsorted(np.cumsum(sizes), k)) + 1
+        probe = lists[:max(nprobe, enough)]
+
+        blocks = [slice(self.offsets[i], self.offsets[i + 1]) for i in probe]
+        scores = np.concatenate([self.list_vectors[b] @ query for b in blocks])
+        positions = np.concatenate([self.order[b] for b in blocks])
+        return _top_k_by_position(scores, positions, k).tolist()
+
+    def save(self, path: Path, fingerprint: str) -> None:
+        """Write the index to ``path`` (lists) and ``<path>.vectors.npy``, tagged with ``fingerprint``."""
+        pid = os.getpid()
+        vectors_path = _vectors_path(path)
+        tmp = vectors_path.with_name(f"{vectors_path.name}.{pid}.tmp")
+        with open(tmp, 'wb') as f:
+            np.save(f, self.list_vectors)
+        os.replace(tmp, vectors_path)
+        # The lists file is written last; its fingerprint vouches for both.
+        tmp = path.with_name(f"{path.name}.{pid}.tmp")
+        with open(tmp, 'wb') as f:
+            np.savez(f, fingerprint=np.array(fingerprint), centroids=self.centroids, order=self.order, offsets=self.offsets)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path, fingerprint: str, vectors: np.ndarray) -> Optional["IVFIndex"]:
+        """Read an index saved by ``save`` for ``vectors``, or ``None`` if missing or stale.
+
+        The list-ordered vectors are memory-mapped.
+        """
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if str(data["fingerprint"]) != fingerprint:
+                    return None
+                centroids, order, offsets = data["centroids"], data["order"], data["offsets"]
+            list_vectors = np.load(_vectors_path(path), mmap_mode='r')
+        except (OSError, KeyError, ValueError):
+            return None
+        if list_vectors.shape != vectors.shape or len(order) != len(vectors) or offsets[-1] != len(vectors):
+            return None
+        return cls(list_vectors, centroids, order, offsets)
+
+
+def _vectors_path(path: Path) -> Path:
+    return path.with_name(path.name + ".vectors.npy")
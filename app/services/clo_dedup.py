@@ -0,0 +1,265 @@
+"""Near-duplicate CLO collapsing for prompt construction.
+
+Many CLOs are copies of each other (the same outcome repeated across
+courses). Before CLOs go into a prompt, each cluster of near-identical
+descriptions is shown as one representative line. After the LLM answers,
+every picked representative is expanded back to up to
+``CLO_DEDUP_MAX_EXPAND`` equivalent (clo_id, curriculum_id, course_id)
+contexts. Placeholders such as "888" and "Add description..." are never
+clustered: they say nothing about the outcome.
+
+Similarity is the Jaccard index of character shingles, estimated with
+MinHash signatures. Candidate pairs come from LSH banding of the
+signatures and are confirmed on the signature agreement.
+"""
+import hashlib
+import os
+import re
+import zlib
+from itertools import chain
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import get_settings
+
+SHINGLE_SIZE = 4
+NUM_PERM = 64
+BANDS = 8  # rows per band = NUM_PERM // BANDS
+DEFAULT_THRESHOLD = 0.9
+# Normalised descriptions that are placeholders, not outcomes (besides empty
+# and letter-free ones such as "888" or "-").
+PLACEHOLDER_DESCRIPTIONS = frozenset({"add description"})
+# Ranked candidates per prompt slot, so collapsing still fills top_k.
+RANK_WINDOW = 4
+
+DUPLICATES_CACHE_VERSION = 2
+
+# Shingles hashed per block, bounding the (NUM_PERM x block) temporary.
+_BLOCK = 1 << 15
+_SPACE_RE = re.compile(r"\s+")
+
+# Multiply-shift hash family: h -> (a * h + b mod 2^64) >> 32, with a odd.
+_rng = np.random.default_rng(0)
+_PERM_A = _rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_PERM_B = _rng.integers(0, 1 << 63, NUM_PERM, dtype=np.uint64)
+_SHIFT = np.uint64(32)
+
+
+def _shingles(text: str) -> set:
+    """Distinct character shingles of lower-cased, space-normalised ``text``."""
+    text = _SPACE_RE.sub(" ", (text or "").lower()).strip()
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def is_placeholder(text: str) -> bool:
+    text = _SPACE_RE.sub(" ", (text or "").lower()).strip().rstrip(". ")
+    return not any(ch.isalpha() for ch in text) or text in PLACEHOLDER_DESCRIPTIONS
+
+
+def minhash_signatures(texts: List[str]) -> np.ndarray:
+    """``len(texts) x NUM_PERM`` MinHash signatures of the texts' shingles."""
+    shingle_sets = [_shingles(t) for t in texts]
+    counts = np.fromiter(map(len, shingle_sets), dtype=np.int64, count=len(texts))
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode('utf-8')) for s in chain.from_iterable(shingle_sets)),
+        dtype=np.uint64,
+        count=int(counts.sum()),
+    )
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    signatures = np.empty((len(texts), NUM_PERM), dtype=np.uint32)
+    doc = 0
+    while doc < len(texts):
+        # Whole documents per block, so each reduceat segment is complete.
+        end = int(np.searchsorted(starts, starts[doc] + _BLOCK, side='right'))
+        end = max(end, doc + 1)
+        lo = starts[doc]
+        hi = starts[end] if end < len(texts) else len(hashes)
+        permuted = (_PERM_A[:, None] * hashes[None, lo:hi] + _PERM_B[:, None]) >> _SHIFT
+        signatures[doc:end] = np.minimum.reduceat(permuted, starts[doc:end] - lo, axis=1).T
+        doc = end
+    return signatures
+
+
+def context_key(clo_id, curriculum_id, course_id) -> Tuple[str, int, int]:
+    """(clo_id, curriculum_id, course_id) with blank ids as 0, as parsed from LLM output."""
+    def as_int(value) -> int:
+        try:
+            return int(value) if value not in (None, '') else 0
+        except (TypeError, ValueError):
+            return 0
+
+    return str(clo_id).strip(), as_int(curriculum_id), as_int(course_id)
+
+
+class CLODuplicates:
+    """Near-duplicate clusters over a CLO list, built once per catalog.
+
+    ``labels[pos]`` is the position of the first CLO in the cluster of the
+    CLO at ``pos`` (positions in ``load_all_clos()`` order). ``threshold``
+    is the one the clusters were built with; 0 means collapsing is off.
+    """
+
+    def __init__(self, clos: List[Dict], labels: np.ndarray, threshold: float = DEFAULT_THRESHOLD):
+        self.labels = labels
+        self.threshold = threshold
+        self._keys = [context_key(clo['id'], clo.get('curriculum_id'), clo.get('course_id')) for clo in clos]
+        self._position: Dict[Tuple[str, int, int], int] = {}
+        self._id_position: Dict[str, int] = {}
+        self._members: Dict[int, List[int]] = {}
+        for pos, key in enumerate(self._keys):
+            self._position.setdefault(key, pos)
+            self._id_position.setdefault(key[0], pos)
+            self._members.setdefault(int(labels[pos]), []).append(pos)
+
+    @classmethod
+    def build(cls, clos: List[Dict], threshold: float = DEFAULT_THRESHOLD) -> "CLODuplicates":
+        """Cluster ``clos`` whose estimated shingle Jaccard is at least ``threshold`` (0 disables)."""
+        n = len(clos)
+        parent = list(range(n))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        if n > 1 and threshold > 0:
+            descriptions = [clo.get("description", "") for clo in clos]
+            signatures = minhash_signatures(descriptions)
+            placeholder = [is_placeholder(text) for text in descriptions]
+            rows = NUM_PERM // BANDS
+            for band in range(BANDS):
+                buckets: Dict[bytes, int] = {}
+                for i, key in enumerate(map(bytes, signatures[:, band * rows:(band + 1) * rows])):
+                    if placeholder[i]:
+                        continue
+                    first = buckets.setdefault(key, i)
+                    if first == i:
+                        continue
+                    a, b = find(first), find(i)
+                    if a != b and np.mean(signatures[first] == signatures[i]) >= threshold:
+                        parent[max(a, b)] = min(a, b)
+
+        return cls(clos, np.fromiter((find(i) for i in range(n)), dtype=np.int64, count=n), threshold)
+
+    def save(self, path: Path, fingerprint: str) -> None:
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, 'wb') as f:
+            np.savez(f, fingerprint=np.array(fingerprint), labels=self.labels)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path, fingerprint: str, clos: List[Dict], threshold: float) -> Optional["CLODuplicates"]:
+        """Clusters saved by ``save`` for ``clos``, or ``None`` if missing or stale."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if str(data["fingerprint"]) != fingerprint:
+                    return None
+                labels = data["labels"]
+        except (OSError, KeyError, ValueError):
+            return None
+        if len(labels) != len(clos):
+            return None
+        return cls(clos, labels, threshold)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @property
+    def n_clusters(self) -> int:
+        return len(self._members)
+
+    def collapse(self, positions: Iterable[int], limit: int = None) -> List[int]:
+        """The first position of each cluster among ``positions``, in order, at most ``limit``."""
+        out: List[int] = []
+        seen = set()
+        for pos in positions:
+            label = int(self.labels[pos])
+            if label not in seen:
+                seen.add(label)
+                out.append(pos)
+                if limit is not None and len(out) >= limit:
+                    break
+        return out
+
+    def expand_contexts(self, contexts: List[Dict], limit: Optional[int] = None) -> List[Dict]:
+        """Expand picked CLO contexts to the other CLOs in the same cluster.
+
+        Each picked context is kept as given, followed by at most ``limit``
+        (default ``settings.clo_dedup_max_expand``) other CLOs of its cluster
+        in catalog order; never the picked CLO again, whatever context the
+        model gave it. Contexts are matched by (clo_id, curriculum_id,
+        course_id), falling back to clo_id alone. Duplicates are dropped and
+        first-seen order is kept. With collapsing off (``threshold`` 0) the
+        picks are returned unchanged.
+        """
+        limit = get_settings().clo_dedup_max_expand if limit is None else limit
+        if self.threshold <= 0 or limit <= 0:
+            return list(contexts)
+        out: List[Dict] = []
+        seen = set()
+
+        def add(key: Tuple[str, int, int]) -> bool:
+            if key in seen:
+                return False
+            seen.add(key)
+            out.append({"clo_id": key[0], "curriculum_id": key[1], "course_id": key[2]})
+            return True
+
+        for ctx in contexts:
+            key = context_key(ctx["clo_id"], ctx.get("curriculum_id"), ctx.get("course_id"))
+            add(key)
+            pos = self._position.get(key, self._id_position.get(key[0]))
+            if pos is None:
+                continue
+            added = 0
+            for member in self._members[int(self.labels[pos])]:
+                if added >= limit:
+                    break
+                if self._keys[member][0] != key[0]:
+                    added += add(self._keys[member])
+        return out
+
+
+def duplicates_fingerprint(clos: List[Dict], threshold: float) -> str:
+    """Hash of the descriptions and clustering parameters the labels depend on."""
+    h = hashlib.sha256(
+        f"{DUPLICATES_CACHE_VERSION}|{SHINGLE_SIZE}|{NUM_PERM}|{BANDS}|{threshold}|{len(clos)}".encode('utf-8')
+    )
+    for clo in clos:
+        h.update(clo.get("description", "").encode('utf-8'))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def duplicates_cache_path(cache_dir: Path) -> Path:
+    return Path(cache_dir) / "obe_clo_duplicates.npz"
+
+
+def load_clo_duplicates(
+    clos: List[Dict], threshold: Optional[float] = None, cache_dir: Optional[Path] = None
+) -> CLODuplicates:
+    """Near-duplicate clusters of ``clos``, reusing the on-disk labels when current.
+
+    ``threshold`` defaults to ``settings.clo_dedup_threshold``; 0 leaves
+    every CLO in its own cluster.
+    """
+    threshold = get_settings().clo_dedup_threshold if threshold is None else threshold
+    if cache_dir is None or threshold <= 0:
+        return CLODuplicates.build(clos, threshold)
+
+    path = duplicates_cache_path(cache_dir)
+    fingerprint = duplicates_fingerprint(clos, threshold)
+    duplicates = CLODuplicates.load(path, fingerprint, clos, threshold) if path.exists() else None
+    if duplicates is None:
+        duplicates = CLODuplicates.build(clos, threshold)
+        try:
+            duplicates.save(path, fingerprint)
+        except OSError:
+            pass  # read-only data dir: keep the in-memory clusters
+    return duplicates
@@ -0,0 +1,260 @@
+"""Inverted index and ranking of CLO descriptions.
+
+Descriptions are split into terms by one of two analyzers:
+
+* ``word`` -- maximal runs of Latin letters, digits and Thai characters.
+  Thai is written without spaces, so a whole Thai clause becomes one term.
+* ``ngram`` -- Latin/digit words plus overlapping character trigrams of each
+  Thai run, so Thai text matches on shared sub-words.
+
+The index is cached on disk (``data/obe_clo_index.<analyzer>.npz``) and
+rebuilt only when the CLO descriptions change.
+"""
+import hashlib
+import os
+import re
+from itertools import chain
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.config import get_settings
+
+# Maximal runs of at least two word characters (Latin, digits, Thai).
+_TOKEN_RE = re.compile(r"[a-zA-Z0-9ก-๙]{2,}")
+# Latin/digit words of at least two characters, or runs of Thai characters.
+_SCRIPT_RUN_RE = re.compile(r"[a-z0-9]{2,}|[ก-๙]+")
+
+THAI_NGRAM = 3
+
+# Modes scored by CLOIndex itself; "dense" is served by clo_vectors.CLOVectors.
+SPARSE_MODES = ("overlap", "bm25")
+RANKING_MODES = SPARSE_MODES + ("dense",)
+
+# BM25 parameters: term-frequency saturation and length normalisation.
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+INDEX_CACHE_VERSION = 2
+_TERM_SEPARATOR = "\x00"
+
+
+def tokens(text: str) -> List[str]:
+    """Lower-cased word tokens of at least two characters, in order."""
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def tokenize(text: str) -> set[str]:
+    """Distinct tokens of ``text``."""
+    return set(tokens(text))
+
+
+def ngram_tokens(text: str, n: int = THAI_NGRAM) -> List[str]:
+    """Latin/digit words plus character n-grams of every Thai run, in order."""
+    out: List[str] = []
+    for run in _SCRIPT_RUN_RE.findall((text or "").lower()):
+        if run[0] >= "ก" and len(run) > n:
+            out.extend(run[i:i + n] for i in range(len(run) - n + 1))
+        elif len(run) >= 2:
+            out.append(run)
+    return out
+
+
+def top_k_positions(scores: np.ndarray, k: int) -> List[int]:
+    """Positions of the ``k`` highest scores, descending, ties in position order."""
+    n = len(scores)
+    if k <= 0:
+        return []
+    if k >= n:
+        return np.argsort(-scores, kind='stable').tolist()
+    # Partial selection: everything above the k-th largest score, then the
+    # earliest rows tied with it, then a stable sort of just those k.
+    kth = np.partition(scores, n - k)[n - k]
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[:k - len(above)]
+    candidates = np.sort(np.concatenate([above, ties]))
+    return candidates[np.argsort(-scores[candidates], kind='stable')].tolist()
+
+
+ANALYZERS: Dict[str, Callable[[str], List[str]]] = {
+    "word": tokens,
+    "ngram": ngram_tokens,
+}
+
+
+class CLOIndex:
+    """Inverted index over CLO descriptions, built once per catalog.
+
+    Stores a term-major sparse matrix (CSR with one row per term) over the
+    CLOs in ``load_all_clos()`` order, so ranking a query only touches the
+    posting lists of its own terms instead of re-tokenizing every CLO.
+
+    Two ranking modes are supported:
+
+    * ``overlap`` -- number of distinct query terms in the description
+    * ``bm25`` -- Okapi BM25; the per-(term, CLO) weights (IDF times the
+      length-normalised term frequency) are precomputed at build time, so a
+      query is a NumPy gather-and-sum over its terms' rows.
+    """
+
+    def __init__(
+        self,
+        term_ids: Dict[str, int],
+        indptr: np.ndarray,
+        doc_ids: np.ndarray,
+        weights: np.ndarray,
+        idf: np.ndarray,
+        n_rows: int,
+        analyzer: str = "word",
+        fingerprint: Optional[str] = None,
+    ):
+        if analyzer not in ANALYZERS:
+            raise ValueError(f"Unknown analyzer '{analyzer}', expected one of {tuple(ANALYZERS)}")
+        self.term_ids = term_ids
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.idf = idf
+        self.n_rows = n_rows
+        self.analyzer = analyzer
+        # Identifies the indexed content; set when loaded through load_clo_index.
+        self.fingerprint = fingerprint
+        self._analyze = ANALYZERS[analyzer]
+
+    @classmethod
+    def build(cls, clos: List[Dict], analyzer: str = "word", k1: float = BM25_K1, b: float = BM25_B) -> "CLOIndex":
+        if analyzer not in ANALYZERS:
+            raise ValueError(f"Unknown analyzer '{analyzer}', expected one of {tuple(ANALYZERS)}")
+        analyze = ANALYZERS[analyzer]
+        n = len(clos)
+        doc_terms = [analyze(clo.get("description", "")) for clo in clos]
+        term_ids = {t: j for j, t in enumerate(dict.fromkeys(chain.from_iterable(doc_terms)))}
+
+        # One entry per term occurrence, then collapse to (term, doc) pairs
+        # sorted term-major; the counts are the term frequencies.
+        doc_len = np.fromiter(map(len, doc_terms), dtype=np.int64, count=n)
+        occurrences = int(doc_len.sum())
+        term_of = np.fromiter(map(term_ids.__getitem__, chain.from_iterable(doc_terms)), dtype=np.int64, count=occurrences)
+        doc_of = np.repeat(np.arange(n, dtype=np.int64), doc_len)
+        pairs, tf = np.unique(term_of * max(n, 1) + doc_of, return_counts=True)
+
+        df = np.bincount(pairs // max(n, 1), minlength=len(term_ids))
+        indptr = np.zeros(len(df) + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+        doc_ids = (pairs % max(n, 1)).astype(np.int32)
+
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        avg_len = doc_len.mean() if n else 0.0
+        norm = k1 * (1 - b + b * doc_len / avg_len) if avg_len else np.full(n, k1)
+        weights = (np.repeat(idf, df) * tf * (k1 + 1) / (tf + norm[doc_ids])).astype(np.float32)
+        return cls(term_ids, indptr, doc_ids, weights, idf.astype(np.float32), n, analyzer)
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def query_terms(self, query_text: str) -> List[int]:
+        """Ids of the distinct indexed terms of ``query_text``."""
+        return [j for j in map(self.term_ids.get, set(self._analyze(query_text))) if j is not None]
+
+    def scores(self, query_text: str, mode: str = "overlap") -> np.ndarray:
+        """Score of every CLO for the distinct terms of ``query_text``.
+
+        ``overlap`` counts the query terms present in each description;
+        ``bm25`` sums their precomputed BM25 weights.
+        """
+        if mode not in SPARSE_MODES:
+            raise ValueError(f"Unknown ranking mode '{mode}', expected one of {SPARSE_MODES}")
+        rows = [slice(self.indptr[j], self.indptr[j + 1]) for j in self.query_terms(query_text)]
+        if not rows:
+            return np.zeros(self.n_rows)
+        docs = np.concatenate([self.doc_ids[r] for r in rows])
+        weights = np.concatenate([self.weights[r] for r in rows]) if mode == "bm25" else None
+        return np.bincount(docs, weights=weights, minlength=self.n_rows)
+
+    def top_k(self, query_text: str, k: int, mode: str = "overlap") -> List[int]:
+        """Positions of the ``k`` best-matching CLOs.
+
+        Ordered by score descending with ties in catalog order, so CLOs that
+        do not match fill the tail in catalog order (the same result as a
+        stable sort of every CLO).
+        """
+        return top_k_positions(self.scores(query_text, mode), k)
+
+    def save(self, path: Path, fingerprint: str) -> None:
+        """Write the index to ``path`` (atomically) tagged with ``fingerprint``."""
+        terms = _TERM_SEPARATOR.join(self.term_ids).encode('utf-8')
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, 'wb') as f:
+            np.savez(
+                f,
+                fingerprint=np.array(fingerprint),
+                n_rows=np.array(self.n_rows),
+                terms=np.frombuffer(terms, dtype=np.uint8),
+                indptr=self.indptr,
+                doc_ids=self.doc_ids,
+                weights=self.weights,
+                idf=self.idf,
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path, fingerprint: str, analyzer: str) -> Optional["CLOIndex"]:
+        """Read an index saved by ``save``, or ``None`` if missing or stale."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if str(data["fingerprint"]) != fingerprint:
+                    return None
+                terms = data["terms"].tobytes().decode('utf-8')
+                term_list = terms.split(_TERM_SEPARATOR) if terms else []
+                index = cls(
+                    {t: j for j, t in enumerate(term_list)},
+                    data["indptr"],
+                    data["doc_ids"],
+                    data["weights"],
+                    data["idf"],
+                    int(data["n_rows"]),
+                    analyzer,
+                    fingerprint,
+                )
+        except (OSError, KeyError, ValueError):
+            return None
+        if len(index.indptr) != len(index.term_ids) + 1 or len(index.idf) != len(index.term_ids):
+            return None
+        return index
+
+
+def index_fingerprint(clos: List[Dict], analyzer: str) -> str:
+    """Hash of everything an index depends on: the descriptions, analyzer and parameters."""
+    h = hashlib.sha256(f"{INDEX_CACHE_VERSION}|{analyzer}|{THAI_NGRAM}|{BM25_K1}|{BM25_B}|{len(clos)}".encode('utf-8'))
+    for clo in clos:
+        h.update(clo.get("description", "").encode('utf-8'))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def index_cache_path(cache_dir: Path, analyzer: str) -> Path:
+    return cache_dir / f"obe_clo_index.{analyzer}.npz"
+
+
+def load_clo_index(clos: List[Dict], analyzer: Optional[str] = None, cache_dir: Optional[Path] = None) -> CLOIndex:
+    """CLOIndex over ``clos``, reusing the on-disk copy when it is current.
+
+    ``analyzer`` defaults to ``settings.clo_index_analyzer``; with no
+    ``cache_dir`` the index is always built in memory.
+    """
+    analyzer = analyzer or get_settings().clo_index_analyzer
+    if cache_dir is None:
+        return CLOIndex.build(clos, analyzer)
+
+    path = index_cache_path(Path(cache_dir), analyzer)
+    fingerprint = index_fingerprint(clos, analyzer)
+    index = CLOIndex.load(path, fingerprint, analyzer) if path.exists() else None
+    if index is None:
+        index = CLOIndex.build(clos, analyzer)
+        index.fingerprint = fingerprint
+        try:
+            index.save(path, fingerprint)
+        except OSError:
+            pass  # read-only data dir: keep the in-memory index
+    return index
@@ -0,0 +1,258 @@
+"""Dense vector index over CLO descriptions (latent semantic analysis).
+
+The sparse term matrix of a ``CLOIndex`` is weighted TF-IDF style (its BM25
+weights, one row per CLO normalised to unit length) and reduced with a
+randomized truncated SVD computed locally in NumPy. Every CLO becomes a
+unit-length float32 vector, and a query is embedded by projecting its terms'
+IDF weights onto the same basis, so ranking is one matrix-vector product.
+
+The vectors are stored next to the CSVs and memory-mapped on load::
+
+    data/obe_clo_vectors.<analyzer>.json       # fingerprint and shape
+    data/obe_clo_vectors.<analyzer>.docs.npy   # n_clos x dims
+    data/obe_clo_vectors.<analyzer>.terms.npy  # n_terms x dims
+    data/obe_clo_vectors.<analyzer>.ivf.npz*   # ANN lists, large catalogs only
+
+Build ahead of time with::
+
+    python -m app.services.clo_vectors [--analyzer ngram]
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from app.config import get_settings
+from app.services.clo_ann import DEFAULT_NPROBE, IVFIndex
+from app.services.clo_index import CLOIndex, top_k_positions
+
+DIMENSIONS = 128
+_OVERSAMPLE = 16
+_POWER_ITERATIONS = 3
+_SEED = 0
+# Non-zeros per block in sparse x dense products, bounding temporary memory.
+_BLOCK_NNZ = 1 << 16
+
+VECTORS_VERSION = 1
+
+
+def _spmm(indptr: np.ndarray, cols: np.ndarray, vals: np.ndarray, dense: np.ndarray) -> np.ndarray:
+    """CSR matrix (``indptr``/``cols``/``vals``) times a dense matrix."""
+    n_rows = len(indptr) - 1
+    out = np.zeros((n_rows, dense.shape[1]), dtype=np.float32)
+    start = 0
+    while start < n_rows:
+        end = int(np.searchsorted(indptr, indptr[start] + _BLOCK_NNZ, side='right')) - 1
+        end = min(max(end, start + 1), n_rows)
+        lo, hi = indptr[start], indptr[end]
+        if hi > lo:
+            products = vals[lo:hi, None] * dense[cols[lo:hi]]
+            offsets = indptr[start:end] - lo
+            nonempty = offsets < indptr[start + 1:end + 1] - lo
+            out[start:end][nonempty] = np.add.reduceat(products, offsets[nonempty])
+        start = end
+    return out
+
+
+class CLOVectors:
+    """Unit-length CLO vectors plus the term basis used to embed queries.
+
+    With an ``ann`` index attached, ``top_k`` probes ``nprobe`` IVF lists
+    instead of scoring every CLO.
+    """
+
+    def __init__(
+        self,
+        index: CLOIndex,
+        docs: np.ndarray,
+        terms: np.ndarray,
+        ann: Optional[IVFIndex] = None,
+        nprobe: int = DEFAULT_NPROBE,
+    ):
+        self.index = index
+        self.docs = docs
+        self.terms = terms
+        self.ann = ann
+        self.nprobe = nprobe
+
+    @property
+    def dimensions(self) -> int:
+        return self.docs.shape[1]
+
+    @classmethod
+    def build(cls, index: CLOIndex, dimensions: int = DIMENSIONS) -> "CLOVectors":
+        n_terms = len(index.term_ids)
+        n_docs = index.n_rows
+        rank = max(1, min(dimensions, n_terms, n_docs))
+
+        # Term-major CSR (A^T) straight from the index, plus a doc-major copy (A),
+        # with each CLO row scaled to unit length.
+        term_of = np.repeat(np.arange(n_terms), np.diff(index.indptr))
+        row_norm = np.sqrt(np.bincount(index.doc_ids, weights=index.weights.astype(np.float64) ** 2, minlength=n_docs))
+        row_norm[row_norm == 0] = 1.0
+        vals = (index.weights / row_norm[index.doc_ids]).astype(np.float32)
+
+        by_doc = np.argsort(index.doc_ids, kind='stable')
+        doc_indptr = np.zeros(n_docs + 1, dtype=np.int64)
+        np.cumsum(np.bincount(index.doc_ids, minlength=n_docs), out=doc_indptr[1:])
+
+        def a(m):
+            return _spmm(doc_indptr, term_of[by_doc], vals[by_doc], m)
+
+        def a_t(m):
+            return _spmm(index.indptr, index.doc_ids, vals, m)
+
+        # Randomized range finder (Halko et al.) with power iterations.
+        rng = np.random.default_rng(_SEED)
+        width = min(rank + _OVERSAMPLE, n_terms, n_docs)
+        q, _ = np.linalg.qr(a(rng.standard_normal((n_terms, width), dtype=np.float32)))
+        for _ in range(_POWER_ITERATIONS):
+            z, _ = np.linalg.qr(a_t(q))
+            q, _ = np.linalg.qr(a(z))
+        # B = Q^T A is small (width x n_terms); its right singular vectors span the terms.
+        _, _, vt = np.linalg.svd(a_t(q).T, full_matrices=False)
+        basis = np.ascontiguousarray(vt[:rank].T, dtype=np.float32)
+
+        docs = a(basis)
+        norms = np.linalg.norm(docs, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return cls(index, (docs / norms).astype(np.float32), basis)
+
+    def embed(self, query_text: str) -> np.ndarray:
+        """Unit-length vector of ``query_text`` (zeros when no term is indexed)."""
+        terms = self.index.query_terms(query_text)
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        if terms:
+            vector = self.index.idf[terms] @ self.terms[terms]
+            norm = np.linalg.norm(vector)
+            if norm > 0:
+                vector = vector / norm
+        return vector.astype(np.float32)
+
+    def scores(self, query_text: str) -> np.ndarray:
+        """Cosine similarity of every CLO to ``query_text``."""
+        return self.docs @ self.embed(query_text)
+
+    def top_k(self, query_text: str, k: int) -> List[int]:
+        """Positions of the ``k`` most similar CLOs, ties in catalog order.
+
+        Exact unless an ANN index is attached.
+        """
+        if self.ann is not None:
+            return self.ann.search(self.embed(query_text), k, nprobe=self.nprobe)
+        return top_k_positions(self.scores(query_text), k)
+
+    def save(self, cache_dir: Path) -> None:
+        base = vectors_cache_path(cache_dir, self.index.analyzer)
+        pid = os.getpid()
+        for suffix, array in ((".docs.npy", self.docs), (".terms.npy", self.terms)):
+            tmp = base.with_name(f"{base.name}{suffix}.{pid}.tmp")
+            with open(tmp, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp, base.with_name(base.name + suffix))
+        # The metadata file is written last and names what the arrays were built from.
+        meta = {
+            "version": VECTORS_VERSION,
+            "index_fingerprint": self.index.fingerprint,
+            "shape": list(self.docs.shape),
+            "n_terms": len(self.terms),
+        }
+        tmp = base.with_name(f"{base.name}.json.{pid}.tmp")
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, base.with_name(base.name + ".json"))
+
+    @classmethod
+    def load(cls, index: CLOIndex, cache_dir: Path, dimensions: int = DIMENSIONS) -> Optional["CLOVectors"]:
+        """Memory-map saved vectors for ``index``, or ``None`` if missing or stale."""
+        base = vectors_cache_path(cache_dir, index.analyzer)
+        try:
+            meta = json.loads(base.with_name(base.name + ".json").read_text())
+            if (
+                meta.get("version") != VECTORS_VERSION
+                or index.fingerprint is None
+                or meta.get("index_fingerprint") != index.fingerprint
+            ):
+                return None
+            docs = np.load(base.with_name(base.name + ".docs.npy"), mmap_mode='r')
+            terms = np.load(base.with_name(base.name + ".terms.npy"), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        rank = max(1, min(dimensions, len(index.term_ids), index.n_rows))
+        if (
+            docs.dtype != np.float32
+            or docs.shape != (index.n_rows, rank)
+            or terms.shape != (len(index.term_ids), rank)
+        ):
+            return None
+        return cls(index, docs, terms)
+
+
+def vectors_cache_path(cache_dir: Path, analyzer: str) -> Path:
+    """Common prefix of the vector files; suffixes are added per file."""
+    return Path(cache_dir) / f"obe_clo_vectors.{analyzer}"
+
+
+def load_clo_vectors(
+    index: CLOIndex,
+    cache_dir: Optional[Path] = None,
+    ann_min_rows: Optional[int] = None,
+    nprobe: Optional[int] = None,
+) -> CLOVectors:
+    """CLO vectors for ``index``, memory-mapped from ``cache_dir`` when current.
+
+    Catalogs with at least ``ann_min_rows`` CLOs (default
+    ``settings.clo_ann_min_rows``; 0 disables) also get an IVF index searched
+    with ``nprobe`` lists (default ``settings.clo_ann_nprobe``).
+    """
+    settings = get_settings()
+    ann_min_rows = settings.clo_ann_min_rows if ann_min_rows is None else ann_min_rows
+    nprobe = settings.clo_ann_nprobe if nprobe is None else nprobe
+    cacheable = cache_dir is not None and index.fingerprint is not None
+
+    vectors = CLOVectors.load(index, cache_dir) if cache_dir is not None else None
+    if vectors is None:
+        vectors = CLOVectors.build(index)
+        if cacheable:
+            try:
+                vectors.save(cache_dir)
+            except OSError:
+                pass  # read-only data dir: keep the in-memory vectors
+
+    if ann_min_rows and index.n_rows >= ann_min_rows:
+        base = vectors_cache_path(cache_dir, index.analyzer) if cacheable else None
+        path = base.with_name(base.name + ".ivf.npz") if base is not None else None
+        ann = IVFIndex.load(path, index.fingerprint, vectors.docs) if path is not None and path.exists() else None
+        if ann is None:
+            ann = IVFIndex.build(vectors.docs)
+            if path is not None:
+                try:
+                    ann.save(path, index.fingerprint)
+                except OSError:
+                    pass
+        vectors.ann = ann
+        vectors.nprobe = nprobe
+    return vectors
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from app.services.catalog import DATA_DIR, OBECatalog
+    from app.services.clo_index import load_clo_index
+
+    parser = argparse.ArgumentParser(description="Build the dense CLO vector index.")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--analyzer", default=None, help="word or ngram (default: CLO_INDEX_ANALYZER)")
+    args = parser.parse_args(argv)
+
+    clos = OBECatalog.from_csv(args.data_dir).load_all_clos()
+    index = load_clo_index(clos, args.analyzer, cache_dir=args.data_dir)
+    vectors = load_clo_vectors(index, cache_dir=args.data_dir)
+    print(f"{vectors_cache_path(args.data_dir, index.analyzer)}.*: {vectors.docs.shape[0]} CLOs x {vectors.dimensions} dims")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""Compact column-oriented storage for the OBE catalog tables.
+
+Each CSV column is stored in the cheapest encoding that reproduces its
+original string values exactly:
+
+* ``IntColumn`` -- integer ids in an ``array('q')`` (blank = -1)
+* ``CategoricalColumn`` -- few distinct values, stored as small integer codes
+* ``StringColumn`` -- everything else, as a list of interned strings
+
+so a row costs a handful of bytes per column instead of a dict of six
+string objects. ``ColumnTable.take`` materialises values for a set of row
+positions.
+"""
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence
+
+
+class IntColumn:
+    """Integers that round-trip to their CSV text; blank is stored as -1."""
+
+    __slots__ = ("data", "has_blank")
+
+    def __init__(self, data: array):
+        self.data = data
+        self.has_blank = -1 in data
+
+    @classmethod
+    def encode(cls, values: Sequence[str]) -> Optional["IntColumn"]:
+        try:
+            if '' in values:
+                data = array('q', [int(v) if v else -1 for v in values])
+            else:
+                data = array('q', map(int, values))
+        except (ValueError, OverflowError):
+            return None
+        column = cls(data)
+        # Only keep the encoding when it reproduces the text exactly
+        # (no leading zeros, signs, non-ASCII digits, or a literal "-1").
+        if column.take(range(len(data))) != list(values):
+            return None
+        return column
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, pos: int) -> str:
+        v = self.data[pos]
+        return '' if v < 0 else str(v)
+
+    def take(self, positions: Iterable[int]) -> List[str]:
+        values = map(self.data.__getitem__, positions)
+        if not self.has_blank:
+            return list(map(str, values))
+        return ['' if v < 0 else str(v) for v in values]
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.data)
+
+
+class CategoricalColumn:
+    """Low-cardinality strings stored as codes into a table of distinct values."""
+
+    __slots__ = ("codes", "values")
+
+    MAX_VALUES = 1 << 16
+
+    def __init__(self, codes: array, values: List[str]):
+        self.codes = codes
+        self.values = values
+
+    @classmethod
+    def encode(cls, values: Sequence[str], max_values: int = MAX_VALUES) -> Optional["CategoricalColumn"]:
+        distinct = list(dict.fromkeys(values))
+        # Only worth it when values repeat a lot.
+        if len(distinct) > max_values or len(distinct) * 4 > len(values):
+            return None
+        lookup = {v: code for code, v in enumerate(distinct)}
+        codes = array('B' if len(distinct) <= 256 else 'H', map(lookup.__getitem__, values))
+        return cls(codes, distinct)
+
+    def int_values(self) -> array:
+        parsed = [int(v) if v else -1 for v in self.values]
+        return array('q', map(parsed.__getitem__, self.codes))
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, pos: int) -> str:
+        return self.values[self.codes[pos]]
+
+    def take(self, positions: Iterable[int]) -> List[str]:
+        return list(map(self.values.__getitem__, map(self.codes.__getitem__, positions)))
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self.codes) + sys.getsizeof(self.values) + sum(sys.getsizeof(v) for v in self.values)
+
+
+class StringColumn:
+    """Free-text values; identical strings share one object."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: List[str]):
+        self.data = data
+
+    @classmethod
+    def encode(cls, values: Sequence[str], pool: Dict[str, str]) -> "StringColumn":
+        return cls([pool.setdefault(v, v) for v in values])
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, pos: int) -> str:
+        return self.data[pos]
+
+    def take(self, positions: Iterable[int]) -> List[str]:
+        return list(map(self.data.__getitem__, positions))
+
+    def nbytes(self) -> int:
+        unique = {id(v): v for v in self.data}
+        return sys.getsizeof(self.data) + sum(sys.getsizeof(v) for v in unique.values())
+
+
+def encode_column(values: Sequence[str], pool: Dict[str, str]):
+    """Pick the most compact encoding that preserves ``values`` exactly.
+
+    One-byte category codes beat 8-byte integers, so columns with at most 256
+    distinct values (including all-blank ones) are categorical.
+    """
+    return (
+        CategoricalColumn.encode(values, max_values=256)
+        or IntColumn.encode(values)
+        or CategoricalColumn.encode(values)
+        or StringColumn.encode(values, pool)
+    )
+
+
+class ColumnTable:
+    """A table stored column by column, in source row order."""
+
+    def __init__(self, columns: Dict[str, object], n_rows: int):
+        self.columns = columns
+        self.n_rows = n_rows
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, List[str]]) -> "ColumnTable":
+        pool: Dict[str, str] = {}
+        n_rows = len(next(iter(columns.values()), []))
+        return cls({name: encode_column(values, pool) for name, values in columns.items()}, n_rows)
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, str]], names: Sequence[str]) -> "ColumnTable":
+        return cls.from_columns({name: [r[name] for r in rows] for name in names})
+
+    def __len__(self) -> int:
+        return self.n_rows
+
+    def take(self, name: str, positions: Iterable[int]) -> List[str]:
+        return self.columns[name].take(positions)
+
+    def int_values(self, name: str) -> array:
+        """Column parsed as integers (blank = -1), for id filtering."""
+        column = self.columns[name]
+        if isinstance(column, IntColumn):
+            return column.data
+        if isinstance(column, CategoricalColumn):
+            return column.int_values()
+        return array('q', (int(v) if v else -1 for v in column.take(range(self.n_rows))))
+
+    def records(self, names: Sequence[str], positions: Sequence[int]) -> List[Dict[str, str]]:
+        """Fresh dicts for the given rows, with keys in ``names`` order."""
+        return [dict(zip(names, row)) for row in zip(*(self.take(name, positions) for name in names))]
+
+    def nbytes(self) -> int:
+        """Approximate bytes held by the table (column storage plus strings)."""
+        return sys.getsizeof(self.columns) + sum(c.nbytes() for c in self.columns.values())
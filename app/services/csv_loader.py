@@ -1,14 +1,21 @@
-import csv
-from pathlib import Path
+from collections import defaultdict
 from typing import List, Dict, Optional
+from app.services.catalog import OBECatalog, get_catalog
+from app.services.clo_dedup import CLODuplicates
+from app.services.clo_index import CLOIndex
+from app.services.clo_vectors import CLOVectors
+from app.services.plo_hierarchy import PLOHierarchy
 
 
 class CSVLoaderService:
-    """Service to load and filter CLO/PLO data from CSV files."""
+    """Service to load and filter CLO/PLO data from CSV files.
+
+    Queries are answered from the shared, process-wide ``OBECatalog`` so the
+    CSVs are parsed once rather than on every call.
+    """
     
-    def __init__(self):
-        self.project_root = Path(__file__).parent.parent.parent
-        self.data_dir = self.project_root / "data"
+    def __init__(self, catalog: Optional[OBECatalog] = None):
+        self.catalog = catalog if catalog is not None else get_catalog()
     
     def load_clos(
         self, 
@@ -16,81 +23,11 @@ class CSVLoaderService:
         course_id: Optional[int] = None
     ) -> List[Dict]:
         """Load CLOs from tlic_obe_public_clo.csv with optional filtering."""
-        clo_file = self.data_dir / "tlic_obe_public_clo.csv"
-        
-        clos = []
-        with open(clo_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Filter by course_id if provided
-                if course_id is not None:
-                    row_course_id = row.get('course_id', '').strip()
-                    if row_course_id and int(row_course_id) != course_id:
-                        continue
-                
-                # Skip deleted entries
-                if row.get('deleted_at', '').strip():
-                    continue
-                
-                clos.append({
-                    'id': row.get('id', '').strip(),
-                    'course_id': row.get('course_id', '').strip(),
-                    'no': row.get('no', '').strip(),
-                    'description': row.get('description', '').strip(),
-                    'category': row.get('category', '').strip(),
-                })
-        
-        return clos
+        return self.catalog.load_clos(course_id=course_id)
     
     def load_all_clos(self) -> List[Dict]:
         """Load ALL CLOs from tlic_obe_public_clo.csv without any filtering."""
-        clo_file = self.data_dir / "tlic_obe_public_clo.csv"
-        mapping_file = self.data_dir / "tlic_obe_public_clo_has_plos.csv"
-        
-        # Build a map of course_id -> curriculum_id from the mapping file
-        course_to_curriculum = {}
-        with open(mapping_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                course_id = row.get('course_id', '').strip()
-                curriculum_id = row.get('curriculum_id', '').strip()
-                if course_id and curriculum_id:
-                    course_to_curriculum[course_id] = curriculum_id
-        
-        clos = []
-        seen_clos = set()  # Track unique (curriculum_id, course_id, clo_id) combinations
-        
-        with open(clo_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Skip deleted entries
-                if row.get('deleted_at', '').strip():
-                    continue
-                
-                clo_id = row.get('id', '').strip()
-                course_id = row.get('course_id', '').strip()
-                # Get curriculum_id from the mapping
-                curriculum_id = course_to_curriculum.get(course_id, '')
-                
-                # Create unique key for deduplication
-                clo_key = (curriculum_id, course_id, clo_id)
-                
-                # Skip if we've already seen this combination
-                if clo_key in seen_clos:
-                    continue
-                
-                seen_clos.add(clo_key)
-                
-                clos.append({
-                    'id': clo_id,
-                    'course_id': course_id,
-                    'curriculum_id': curriculum_id,
-                    'no': row.get('no', '').strip(),
-                    'description': row.get('description', '').strip(),
-                    'category': row.get('category', '').strip(),
-                })
-        
-        return clos
+        return self.catalog.load_all_clos()
     
     def load_clo_plo_mappings(
         self,
@@ -100,46 +37,12 @@ class CSVLoaderService:
         is_map_only: bool = True
     ) -> List[Dict]:
         """Load CLO-PLO mappings from tlic_obe_public_clo_has_plos.csv."""
-        mapping_file = self.data_dir / "tlic_obe_public_clo_has_plos.csv"
-        
-        mappings = []
-        with open(mapping_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Filter by is_map
-                if is_map_only:
-                    is_map = row.get('is_map', '').strip().lower()
-                    if is_map != 'true':
-                        continue
-                
-                # Filter by curriculum_id if provided
-                if curriculum_id is not None:
-                    row_curriculum_id = row.get('curriculum_id', '').strip()
-                    if row_curriculum_id and int(row_curriculum_id) != curriculum_id:
-                        continue
-                
-                # Filter by course_id if provided
-                if course_id is not None:
-                    row_course_id = row.get('course_id', '').strip()
-                    if row_course_id and int(row_course_id) != course_id:
-                        continue
-                
-                # Filter by clo_ids if provided
-                if clo_ids is not None:
-                    row_clo_id = row.get('clo_id', '').strip()
-                    if row_clo_id not in clo_ids:
-                        continue
-                
-                mappings.append({
-                    'id': row.get('id', '').strip(),
-                    'curriculum_id': row.get('curriculum_id', '').strip(),
-                    'course_id': row.get('course_id', '').strip(),
-                    'clo_id': row.get('clo_id', '').strip(),
-                    'plo_id': row.get('plo_id', '').strip(),
-                    'is_map': row.get('is_map', '').strip(),
-                })
-        
-        return mappings
+        return self.catalog.load_clo_plo_mappings(
+            curriculum_id=curriculum_id,
+            course_id=course_id,
+            clo_ids=clo_ids,
+            is_map_only=is_map_only,
+        )
     
     def load_plos(
         self,
@@ -147,39 +50,27 @@ class CSVLoaderService:
         plo_ids: Optional[List[str]] = None
     ) -> List[Dict]:
         """Load PLOs from tlic_obe_public_plo.csv."""
-        plo_file = self.data_dir / "tlic_obe_public_plo.csv"
-        
-        plos = []
-        with open(plo_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Filter by curriculum_id if provided
-                if curriculum_id is not None:
-                    row_curriculum_id = row.get('curriculum_id', '').strip()
-                    if row_curriculum_id and int(row_curriculum_id) != curriculum_id:
-                        continue
-                
-                # Filter by plo_ids if provided
-                if plo_ids is not None:
-                    row_id = row.get('id', '').strip()
-                    if row_id not in plo_ids:
-                        continue
-                
-                # Skip deleted entries
-                if row.get('deleted_at', '').strip():
-                    continue
-                
-                plos.append({
-                    'id': row.get('id', '').strip(),
-                    'curriculum_id': row.get('curriculum_id', '').strip(),
-                    'name': row.get('name', '').strip(),
-                    'name_en': row.get('name_en', '').strip(),
-                    'detail': row.get('detail', '').strip(),
-                    'plo_level': row.get('plo_level', '').strip(),
-                    'parent_plo_id': row.get('parent_plo_id', '').strip(),
-                })
-        
-        return plos
+        return self.catalog.load_plos(curriculum_id=curriculum_id, plo_ids=plo_ids)
+    
+    def get_plo_hierarchy(self) -> PLOHierarchy:
+        """PLO trees, ancestor closure and level-1 rollups, precomputed at catalog load."""
+        return self.catalog.plo_hierarchy
+    
+    def get_clo_index(self) -> CLOIndex:
+        """Inverted index over ``load_all_clos()`` descriptions, built at catalog load."""
+        return self.catalog.clo_index
+    
+    def get_clo_vectors(self) -> Optional[CLOVectors]:
+        """Dense CLO vectors, loaded with the catalog when CLO_RANKING_MODE is "dense"."""
+        return self.catalog.clo_vectors
+    
+    def get_clo_duplicates(self) -> CLODuplicates:
+        """Near-duplicate clusters over ``load_all_clos()``, built at catalog load."""
+        return self.catalog.clo_duplicates
+    
+    def get_catalog_version(self) -> str:
+        """Hash of the CLO catalog contents; changes when any CLO changes."""
+        return self.catalog.version
     
     def get_plos_for_clos(
         self,
@@ -207,41 +98,95 @@ class CSVLoaderService:
         
         return plos
     
-    def get_plos_for_clo_contexts(
+    def resolve_clo_contexts(
         self,
         clo_contexts: List[Dict]
-    ) -> List[Dict]:
-        """Get all PLOs mapped to CLOs with their curriculum_id and course_id context.
+    ) -> Dict[str, List[Dict]]:
+        """Resolve CLOs in their curriculum_id/course_id context to PLOs in one batch.
+        
+        Equivalent to calling ``get_plos_for_clos`` per (curriculum_id, course_id)
+        group, but issues a single mapping lookup and a single PLO lookup for all
+        contexts and matches them up in memory.
         
         Args:
-            clo_contexts: List of dicts with 'clo_id', 'curriculum_id', 'course_id'
+            clo_contexts: List of dicts with 'clo_id', 'curriculum_id', 'course_id';
+                a ``None`` curriculum_id or course_id matches any (no filter)
         
         Returns:
-            List of PLO dictionaries
+            Dict with 'plos' (unique on (id, curriculum_id), in context-group order)
+            and 'mappings' (the CLO-PLO mapping rows used, in file order)
         """
-        all_plos = []
-        seen_plo_ids = set()
-        
-        # Group by curriculum_id and course_id for efficient querying
-        from collections import defaultdict
-        grouped = defaultdict(list)
+        # (curriculum_id, course_id) -> CLO IDs, in first-seen group order
+        grouped = defaultdict(set)
+        groups_by_clo_id = defaultdict(list)
         for ctx in clo_contexts:
             key = (ctx['curriculum_id'], ctx['course_id'])
-            grouped[key].append(ctx['clo_id'])
+            if ctx['clo_id'] not in grouped[key]:
+                grouped[key].add(ctx['clo_id'])
+                groups_by_clo_id[ctx['clo_id']].append(key)
         
-        # Query PLOs for each group
-        for (curriculum_id, course_id), clo_ids in grouped.items():
-            plos = self.get_plos_for_clos(
-                clo_ids=clo_ids,
-                curriculum_id=curriculum_id,
-                course_id=course_id
+        if not groups_by_clo_id:
+            return {"plos": [], "mappings": []}
+        
+        # One probe for every mapping edge of every requested CLO, then keep
+        # the edges whose curriculum/course match one of the CLO's contexts
+        # (blank ids match any context, as in load_clo_plo_mappings).
+        candidates = self.load_clo_plo_mappings(clo_ids=list(groups_by_clo_id), is_map_only=True)
+        mappings = []
+        plo_ids_by_group = defaultdict(set)
+        for m in candidates:
+            row_curriculum_id = int(m['curriculum_id']) if m['curriculum_id'] else None
+            row_course_id = int(m['course_id']) if m['course_id'] else None
+            matched = False
+            for curriculum_id, course_id in groups_by_clo_id[m['clo_id']]:
+                if None not in (curriculum_id, row_curriculum_id) and row_curriculum_id != curriculum_id:
+                    continue
+                if None not in (course_id, row_course_id) and row_course_id != course_id:
+                    continue
+                matched = True
+                if m['plo_id']:
+                    plo_ids_by_group[(curriculum_id, course_id)].add(m['plo_id'])
+            if matched:
+                mappings.append(m)
+        
+        all_plo_ids = set().union(*plo_ids_by_group.values())
+        if not all_plo_ids:
+            return {"plos": [], "mappings": mappings}
+        
+        # One probe for the PLO details, then emit each group's PLOs (file
+        # order within a group) deduplicated on (plo_id, curriculum_id).
+        plo_rows_by_id = defaultdict(list)
+        for pos, plo in enumerate(self.load_plos(plo_ids=list(all_plo_ids))):
+            plo_rows_by_id[plo['id']].append((pos, plo))
+        
+        all_plos = []
+        seen_plo_ids = set()
+        for curriculum_id, course_id in grouped:
+            group_plo_ids = plo_ids_by_group.get((curriculum_id, course_id), ())
+            group_rows = sorted(
+                (row for plo_id in group_plo_ids for row in plo_rows_by_id.get(plo_id, ())),
+                key=lambda row: row[0],
             )
-            
-            # Add unique PLOs
-            for plo in plos:
+            for _, plo in group_rows:
+                if curriculum_id is not None and plo['curriculum_id'] and int(plo['curriculum_id']) != curriculum_id:
+                    continue
                 plo_key = (plo['id'], plo['curriculum_id'])
                 if plo_key not in seen_plo_ids:
                     seen_plo_ids.add(plo_key)
                     all_plos.append(plo)
         
-        return all_plos
+        return {"plos": all_plos, "mappings": mappings}
+    
+    def get_plos_for_clo_contexts(
+        self,
+        clo_contexts: List[Dict]
+    ) -> List[Dict]:
+        """Get all PLOs mapped to CLOs with their curriculum_id and course_id context.
+        
+        Args:
+            clo_contexts: List of dicts with 'clo_id', 'curriculum_id', 'course_id'
+        
+        Returns:
+            List of PLO dictionaries
+        """
+        return self.resolve_clo_contexts(clo_contexts)["plos"]
@@ -0,0 +1,93 @@
+"""Incremental parsing of the ``groups`` array of a streamed LLM answer.
+
+The grouped analysis answer is ``{"groups": [{...}, {...}]}`` (Gemini sometimes
+returns the bare array). ``GroupsStream.feed`` takes the answer text as it
+arrives and returns each group object as soon as its closing brace has been
+received, so it can be sanitized and sent on before the rest is generated.
+"""
+import json
+import logging
+import re
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+_GROUPS_KEY_RE = re.compile(r'"groups"\s*:\s*$')
+# Stack marker of the array whose elements are groups.
+_GROUPS = "G"
+
+
+class GroupsStream:
+    """Feed answer text chunk by chunk; complete group objects come out.
+
+    Code fences and text around the JSON are skipped. Groups are decoded with
+    ``strict=False``, so raw newlines inside strings (a common Gemini slip) do
+    not lose a group. ``done`` is set once the top-level JSON value closes;
+    ``text`` is everything fed so far, for a full parse if streaming failed.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_str = False
+        self._escape = False
+        self._group_start = -1
+        self.started = False
+        self.done = False
+        self.groups = 0
+
+    def feed(self, chunk: str) -> List[Dict]:
+        if not chunk or self.done:
+            return []
+        self.text += chunk
+        s = self.text
+        out: List[Dict] = []
+        stack = self._stack
+        i = self._pos
+        while i < len(s):
+            ch = s[i]
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_str = False
+            elif not self.started:
+                # Skip code fences and any preamble up to the JSON value.
+                if ch in "{[":
+                    self.started = True
+                    stack.append(_GROUPS if ch == "[" else "{")
+            elif ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                if stack and stack[-1] == _GROUPS:
+                    self._group_start = i
+                stack.append("{")
+            elif ch == "[":
+                top_level = stack == ["{"]
+                stack.append(_GROUPS if top_level and _GROUPS_KEY_RE.search(s, max(0, i - 64), i) else "[")
+            elif ch in "}]":
+                if stack:
+                    stack.pop()
+                if ch == "}" and stack and stack[-1] == _GROUPS and self._group_start >= 0:
+                    group = self._decode(s[self._group_start : i + 1])
+                    self._group_start = -1
+                    if group is not None:
+                        self.groups += 1
+                        out.append(group)
+                if not stack:
+                    self.done = True
+                    i += 1
+                    break
+            i += 1
+        self._pos = i
+        return out
+
+    def _decode(self, raw: str):
+        try:
+            return json.loads(raw, strict=False)
+        except json.JSONDecodeError:
+            logger.debug("Skipping unparseable streamed group: %s", raw[:200])
+            return None
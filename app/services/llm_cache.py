@@ -0,0 +1,155 @@
+"""Persistent cache of LLM answers, keyed by the normalized prompt.
+
+Re-analysing the same company (reopening a profile, retrying after a UI
+error) would otherwise pay for the same LLM call again. Answers are stored
+in a SQLite file shared by all workers::
+
+    data/llm_cache.sqlite3
+
+The key is a sha256 of the provider, model, catalog version, the kind of
+call and the prompt with whitespace collapsed. Any change to the catalog or
+to what the prompt contains therefore misses. Entries expire after
+``LLM_CACHE_TTL`` seconds. Above ``LLM_CACHE_MAX_ENTRIES``, the least
+recently read entries are evicted.
+"""
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.config import get_settings
+from app.services.catalog import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+_SPACE_RE = re.compile(r"\s+")
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at);
+"""
+
+
+def normalize_prompt(prompt: str) -> str:
+    return _SPACE_RE.sub(" ", prompt or "").strip()
+
+
+def cache_key(*, provider: str, model: str, catalog_version: str, kind: str, prompt: str) -> str:
+    payload = json.dumps(
+        [provider, model, catalog_version, kind, normalize_prompt(prompt)], ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed LRU + TTL cache of JSON-serializable answers.
+
+    Safe to share between threads; the file can be shared between worker
+    processes (WAL mode). Hit, miss and eviction counts are per process.
+    """
+
+    def __init__(self, path: Path, max_entries: int, ttl: float):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """The cached answer for ``key``, or ``None`` if absent, expired or unreadable."""
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and self.ttl > 0 and now - row[1] > self.ttl:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+                    row = None
+                if row is not None:
+                    self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                    self._conn.commit()
+            except sqlite3.Error:
+                logger.warning("LLM cache read failed", exc_info=True)
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict) -> None:
+        now = time.time()
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, data, now, now),
+                )
+                excess = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    self._conn.execute(
+                        "DELETE FROM llm_cache WHERE key IN "
+                        "(SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+                        (excess,),
+                    )
+                    self.evictions += excess
+                self._conn.commit()
+            except sqlite3.Error:
+                # A full or read-only disk costs the cache, not the answer.
+                logger.warning("LLM cache write failed", exc_info=True)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "enabled": True,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """The process-wide cache, or ``None`` when ``LLM_CACHE_MAX_ENTRIES`` is 0."""
+    global _cache
+    settings = get_settings()
+    if settings.llm_cache_max_entries <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                path = Path(settings.llm_cache_path) if settings.llm_cache_path else DATA_DIR / "llm_cache.sqlite3"
+                try:
+                    _cache = LLMCache(path, settings.llm_cache_max_entries, settings.llm_cache_ttl)
+                except (OSError, sqlite3.Error):
+                    logger.warning("LLM cache unavailable at %s; answers will not be cached", path, exc_info=True)
+                    return None
+    return _cache
@@ -1,7 +1,75 @@
+import threading
+from typing import Dict
+
 from app.config import get_settings
+from app.services.llm_router import LLMRouter
 from app.services.openai_service import OpenAIService
 
-def get_llm_service():
-    """Factory function to return the configured LLM service."""
-    _ = get_settings()
+LLM_PROVIDERS = ("openai", "gemini")
+
+# One long-lived service per provider, so its client and connection pool are
+# reused across requests instead of rebuilt (with new TLS handshakes) each time.
+_services: Dict[str, object] = {}
+_routers: Dict[tuple, LLMRouter] = {}
+_services_lock = threading.Lock()
+
+
+def _create_service(provider: str):
+    if provider == "gemini":
+        # Imported lazily: the Gemini SDK is only loaded when it is selected.
+        from app.services.gemini_service import GeminiService
+
+        return GeminiService()
     return OpenAIService()
+
+
+def _check_provider(provider: str) -> str:
+    provider = provider.strip().lower()
+    if provider not in LLM_PROVIDERS:
+        raise Exception(f"Unknown LLM provider '{provider}', expected one of {LLM_PROVIDERS}")
+    return provider
+
+
+def _get_service(provider: str):
+    service = _services.get(provider)
+    if service is None:
+        with _services_lock:
+            service = _services.get(provider)
+            if service is None:
+                service = _services[provider] = _create_service(provider)
+    return service
+
+
+def get_llm_service() -> LLMRouter:
+    """Return the shared router for ``settings.llm_provider`` (and its fallback).
+
+    The router (see llm_router) applies the latency budget, retries, circuit
+    breakers and hedging in front of the shared provider services.
+    """
+    settings = get_settings()
+    names = [_check_provider(settings.llm_provider)]
+    if settings.llm_fallback_provider.strip():
+        fallback = _check_provider(settings.llm_fallback_provider)
+        if fallback not in names:
+            names.append(fallback)
+    key = tuple(names)
+    router = _routers.get(key)
+    if router is None:
+        services = [(name, _get_service(name)) for name in names]
+        with _services_lock:
+            router = _routers.get(key)
+            if router is None:
+                router = _routers[key] = LLMRouter(services)
+    return router
+
+
+async def close_llm_services() -> None:
+    """Close the shared services' connection pools (on application shutdown)."""
+    with _services_lock:
+        services = list(_services.values())
+        _services.clear()
+        _routers.clear()
+    for service in services:
+        close = getattr(service, "aclose", None)
+        if close is not None:
+            await close()
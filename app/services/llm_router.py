@@ -0,0 +1,336 @@
+"""Routing of LLM calls across providers: latency budget, retries, circuit
+breakers and hedging.
+
+``get_llm_service`` returns an ``LLMRouter`` in front of the shared provider
+services. It offers the same methods, and for each call it:
+
+* keeps the whole call, retries included, within ``LLM_LATENCY_BUDGET`` seconds;
+* on failure (an error, or company details with no content) retries up to
+  ``LLM_RETRIES`` times after a jittered exponential backoff
+  (``LLM_RETRY_BACKOFF``). With ``LLM_FALLBACK_PROVIDER`` set, each retry goes
+  to the next provider;
+* skips a provider whose circuit breaker is open: after
+  ``LLM_BREAKER_FAILURES`` consecutive failures it gets no calls for
+  ``LLM_BREAKER_COOLDOWN`` seconds, then one trial call decides;
+* with ``LLM_HEDGE_QUANTILE`` (e.g. 0.95) and a fallback provider, starts the
+  same call on the other provider once the first has taken longer than that
+  quantile of its recent latencies, and returns whichever valid answer
+  arrives first.
+
+An answer served from the answer cache (marked ``"cached": True``, see
+llm_service) says nothing about the provider: it leaves the breaker and the
+latencies alone.
+
+A provider that rejects the call for lack of capacity (``LLMOverloaded``, see
+llm_scheduler) is not failing: its breaker is left alone, and the call goes
+straight to the next provider without a backoff, or fails fast if none has
+room.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from contextlib import aclosing
+from typing import Dict, List
+
+from app.config import get_settings
+from app.services.llm_scheduler import LLMOverloaded
+
+logger = logging.getLogger(__name__)
+
+# Latencies kept per provider and kind of call, and how many are needed before
+# their quantile replaces LLM_HEDGE_DELAY.
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+
+class CircuitBreaker:
+    def __init__(self, failures: int, cooldown: float):
+        self.max_failures = failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        # LLM_BREAKER_FAILURES=0 disables the breaker.
+        if self.max_failures <= 0 or self.failures < self.max_failures:
+            return "closed"
+        return "open" if time.monotonic() < self.open_until else "half_open"
+
+    def allow(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._trial)
+
+    def begin(self) -> bool:
+        """Whether a call may start now; claims the one trial call when half-open."""
+        if not self.allow():
+            return False
+        if self.state == "half_open":
+            # Its outcome closes or re-opens the breaker.
+            self._trial = True
+        return True
+
+    def cancelled(self) -> None:
+        self._trial = False
+
+    def success(self) -> None:
+        self.failures = 0
+        self._trial = False
+
+    def failure(self) -> None:
+        self.failures += 1
+        self._trial = False
+        if self.max_failures > 0 and self.failures >= self.max_failures:
+            self.open_until = time.monotonic() + self.cooldown
+
+
+class _Provider:
+    def __init__(self, name: str, service, settings):
+        self.name = name
+        self.service = service
+        self.breaker = CircuitBreaker(settings.llm_breaker_failures, settings.llm_breaker_cooldown)
+        self.latencies: Dict[str, deque] = {}
+        self.calls = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def observe(self, kind: str, seconds: float) -> None:
+        self.latencies.setdefault(kind, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def quantile(self, kind: str, q: float):
+        samples = sorted(self.latencies.get(kind, ()))
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def _valid(kind: str, result) -> bool:
+    if not isinstance(result, dict):
+        return False
+    if kind == "grouped":
+        # No groups is an answer too (nothing in the catalog fits the company).
+        return isinstance(result.get("groups"), list)
+    return any(str(result.get(k) or "").strip() for k in ("requirements", "culture", "desired_traits"))
+
+
+class LLMRouter:
+    """Provider services behind one interface; see the module docstring."""
+
+    def __init__(self, services: List[tuple]):
+        self.settings = get_settings()
+        self.providers = [_Provider(name, service, self.settings) for name, service in services]
+
+    @property
+    def usage(self):
+        return _CombinedUsage([p.service.usage for p in self.providers])
+
+    def stats(self) -> List[Dict]:
+        out = []
+        for p in self.providers:
+            q = self.settings.llm_hedge_quantile or 0.95
+            out.append({
+                "provider": p.name,
+                "breaker": p.breaker.state,
+                "consecutive_failures": p.breaker.failures,
+                "calls": p.calls,
+                "failures": p.failures,
+                "hedges": p.hedges,
+                "hedge_wins": p.hedge_wins,
+                "latency_quantile": q,
+                "latency": {kind: p.quantile(kind, q) for kind in p.latencies},
+            })
+        return out
+
+    def admission_stats(self) -> List[Dict]:
+        return [p.service.scheduler.stats() for p in self.providers]
+
+    def _available(self) -> List[_Provider]:
+        return [p for p in self.providers if p.breaker.allow()]
+
+    def _hedge_delay(self, provider: _Provider, kind: str) -> float:
+        observed = provider.quantile(kind, self.settings.llm_hedge_quantile)
+        return observed if observed is not None else self.settings.llm_hedge_delay
+
+    async def _call_one(self, provider: _Provider, kind: str, method: str, kwargs: dict):
+        """One provider call; updates its breaker and latency statistics."""
+        if not provider.breaker.begin():
+            raise Exception(f"{provider.name} circuit breaker is open")
+        provider.calls += 1
+        start = time.monotonic()
+        try:
+            result = await getattr(provider.service, method)(**kwargs)
+            if isinstance(result, dict) and result.get("cached"):
+                provider.breaker.cancelled()
+                return result
+            if not _valid(kind, result):
+                raise Exception(f"{provider.name} returned an empty answer")
+        except (asyncio.CancelledError, LLMOverloaded):
+            provider.breaker.cancelled()
+            raise
+        except Exception:
+            provider.failures += 1
+            provider.breaker.failure()
+            raise
+        provider.breaker.success()
+        provider.observe(kind, time.monotonic() - start)
+        return result
+
+    async def _attempt(self, provider: _Provider, others: List[_Provider], kind: str, method: str, kwargs: dict):
+        """A call to ``provider``, hedged to the next of ``others`` if it is slow."""
+        tasks = [asyncio.ensure_future(self._call_one(provider, kind, method, kwargs))]
+        first = tasks[0]
+        try:
+            if not (self.settings.llm_hedge_quantile > 0 and others):
+                return await first
+
+            done, _ = await asyncio.wait({first}, timeout=self._hedge_delay(provider, kind))
+            if done:
+                return first.result()
+            backup = others[0]
+            if not backup.breaker.allow():
+                return await first
+            logger.info("Hedging slow %s %s call with %s", provider.name, kind, backup.name)
+            backup.hedges += 1
+            second = asyncio.ensure_future(self._call_one(backup, kind, method, kwargs))
+            tasks.append(second)
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            backup.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The loser, or everything if the latency budget ran out.
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _route(self, kind: str, method: str, **kwargs):
+        settings = self.settings
+        deadline = time.monotonic() + settings.llm_latency_budget
+        last_error = None
+        overloaded = set()
+        for attempt in range(settings.llm_retries + 1):
+            available = self._available()
+            if not available:
+                raise Exception(
+                    "All LLM providers are unavailable (circuit breaker open after repeated failures)"
+                    + (f". Last error: {last_error}" if last_error else "")
+                )
+            # Retries move on to the next provider (failover).
+            i = attempt % len(available)
+            provider, others = available[i], available[i + 1:] + available[:i]
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                return await asyncio.wait_for(self._attempt(provider, others, kind, method, kwargs), remaining)
+            except asyncio.TimeoutError:
+                # A provider that hangs should trip its breaker like one that errors.
+                provider.failures += 1
+                provider.breaker.failure()
+                last_error = Exception(f"LLM latency budget of {settings.llm_latency_budget:g}s exceeded")
+                break
+            except LLMOverloaded as e:
+                overloaded.add(provider.name)
+                if all(p.name in overloaded for p in available):
+                    raise
+                last_error = e
+                continue
+            except Exception as e:
+                last_error = e
+                logger.warning("LLM %s call to %s failed (attempt %d): %s", kind, provider.name, attempt + 1, e)
+            if attempt < settings.llm_retries:
+                # Full jitter: spread retries of concurrent requests apart.
+                backoff = random.uniform(0, settings.llm_retry_backoff * 2 ** attempt)
+                if time.monotonic() + backoff >= deadline:
+                    break
+                await asyncio.sleep(backoff)
+        raise last_error or Exception(f"LLM latency budget of {settings.llm_latency_budget:g}s exceeded")
+
+    async def suggest_grouped_clos_for_company(self, **kwargs) -> dict:
+        return await self._route("grouped", "suggest_grouped_clos_for_company", **kwargs)
+
+    async def suggest_company_details(self, **kwargs) -> dict:
+        return await self._route("company_details", "suggest_company_details", **kwargs)
+
+    async def stream_grouped_clos_for_company(self, **kwargs):
+        """Stream from the first available provider, failing over until the first event."""
+        last_error = None
+        for provider in self._available():
+            if not provider.breaker.begin():
+                continue
+            started = False
+            finished = False
+            provider.calls += 1
+            start = time.monotonic()
+            try:
+                async with aclosing(provider.service.stream_grouped_clos_for_company(**kwargs)) as items:
+                    async for item in items:
+                        started = True
+                        if "group" not in item:
+                            # The last event. Its consumer may close the stream
+                            # right after it, so the outcome is recorded first.
+                            finished = True
+                            if item.get("cached"):
+                                provider.breaker.cancelled()
+                            else:
+                                provider.breaker.success()
+                                provider.observe("grouped", time.monotonic() - start)
+                        yield item
+            except LLMOverloaded as e:
+                provider.breaker.cancelled()
+                if started:
+                    raise
+                last_error = e
+                continue
+            except Exception as e:
+                if finished:
+                    raise
+                provider.failures += 1
+                provider.breaker.failure()
+                if started:
+                    raise
+                last_error = e
+                logger.warning("LLM grouped stream from %s failed before its first event: %s", provider.name, e)
+                continue
+            except BaseException:
+                # Client went away (cancelled or closed stream): no verdict on the provider.
+                if not finished:
+                    provider.breaker.cancelled()
+                raise
+            if not finished:
+                provider.breaker.success()
+            return
+        raise last_error or Exception(
+            "All LLM providers are unavailable (circuit breaker open after repeated failures)"
+        )
+
+
+class _CombinedUsage:
+    """``LLMUsage.stats()`` summed over the routed providers."""
+
+    def __init__(self, usages):
+        self.usages = usages
+
+    def stats(self) -> Dict:
+        parts = [u.stats() for u in self.usages]
+        prompt_tokens = sum(p["prompt_tokens"] for p in parts)
+        cached_tokens = sum(p["cached_tokens"] for p in parts)
+        return {
+            "provider": "+".join(p["provider"] for p in parts),
+            "calls": sum(p["calls"] for p in parts),
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "cached_ratio": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+            "output_tokens": sum(p["output_tokens"] for p in parts),
+        }
@@ -0,0 +1,209 @@
+"""Admission control for LLM calls: concurrency cap, rate limits and a bounded queue.
+
+Every provider request (``OpenAIService._create_chat_completion``,
+``GeminiService._generate_content``) first takes a slot from its provider's
+scheduler:
+
+* at most ``LLM_MAX_CONCURRENCY`` requests run at once;
+* ``LLM_RPM`` requests and ``LLM_TPM`` tokens per minute (0 for no limit) are
+  drawn from token buckets, so a burst is spread out instead of answered with
+  429s by the provider. A request is charged its estimated prompt tokens plus
+  its ``max_output_tokens``, as the providers count it against the limit;
+* requests that cannot start wait in a first-come first-served queue of at
+  most ``LLM_QUEUE_SIZE``, each for at most ``LLM_QUEUE_TIMEOUT`` seconds.
+
+A request that finds the queue full, or that cannot start before its
+deadline, fails at once with ``LLMOverloaded``, which the API answers with
+503 and a ``Retry-After`` header. The limits are per worker process.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LLMOverloaded(Exception):
+    """No capacity for an LLM call within its queue deadline."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """``per_minute`` units per minute, with bursts of up to a minute's worth."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` (at most the capacity) is available."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+    def available(self) -> int:
+        self._refill()
+        return int(self.level)
+
+
+class LLMScheduler:
+    """Slots for one provider's requests; see the module docstring."""
+
+    def __init__(self, provider: str, settings):
+        self.provider = provider
+        self.max_concurrency = max(1, settings.llm_max_concurrency)
+        self.queue_size = max(0, settings.llm_queue_size)
+        self.queue_timeout = settings.llm_queue_timeout
+        self.requests = TokenBucket(settings.llm_rpm) if settings.llm_rpm > 0 else None
+        self.tokens = TokenBucket(settings.llm_tpm) if settings.llm_tpm > 0 else None
+        self.active = 0
+        self._queue: deque = deque()
+        self._changed = asyncio.Event()
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_deadline = 0
+        self.max_queued = 0
+        self.wait_seconds = 0.0
+
+    def _delay(self, tokens: int) -> Optional[float]:
+        """0 if a request can start now, seconds until the rate limits allow it,
+        or None while all slots are busy."""
+        if self.active >= self.max_concurrency:
+            return None
+        delay = 0.0
+        if self.requests is not None:
+            delay = max(delay, self.requests.wait_time(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.wait_time(tokens))
+        return delay
+
+    def _admit(self, tokens: int) -> None:
+        self.active += 1
+        self.admitted += 1
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+
+    def _notify(self) -> None:
+        # Wake every waiter; only the head of the queue can start.
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _retry_after(self, delay: Optional[float]) -> float:
+        if delay:
+            return delay
+        return self.queue_timeout if self._queue else 1.0
+
+    async def acquire(self, tokens: int) -> None:
+        """Wait for a slot for a request of about ``tokens`` tokens, or raise ``LLMOverloaded``."""
+        if not self._queue and self._delay(tokens) == 0:
+            self._admit(tokens)
+            return
+        if len(self._queue) >= self.queue_size:
+            self.rejected_full += 1
+            raise LLMOverloaded(
+                f"{self.provider} is at capacity ({self.active} running, {len(self._queue)} queued); try again shortly",
+                self._retry_after(self._delay(tokens)),
+            )
+
+        ticket = object()
+        self._queue.append(ticket)
+        self.max_queued = max(self.max_queued, len(self._queue))
+        start = time.monotonic()
+        deadline = start + self.queue_timeout
+        try:
+            while True:
+                delay = self._delay(tokens) if self._queue[0] is ticket else None
+                if delay == 0:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (delay is not None and delay > remaining):
+                    # Reject now rather than at the deadline when the rate limit already rules it out.
+                    self.rejected_deadline += 1
+                    raise LLMOverloaded(
+                        f"{self.provider} had no capacity within {self.queue_timeout:g}s; try again shortly",
+                        self._retry_after(delay),
+                    )
+                changed = self._changed
+                try:
+                    await asyncio.wait_for(changed.wait(), remaining if delay is None else delay)
+                except asyncio.TimeoutError:
+                    pass
+            self._admit(tokens)
+        finally:
+            self._queue.remove(ticket)
+            self.wait_seconds += time.monotonic() - start
+            self._notify()
+
+    def release(self) -> None:
+        self.active -= 1
+        self._notify()
+
+    @asynccontextmanager
+    async def slot(self, tokens: int):
+        await self.acquire(tokens)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def hold_stream(self, stream):
+        """Iterate ``stream`` (taken with ``acquire``), releasing the slot when it ends.
+
+        However it ends, the provider's response is then closed with its
+        ``aclose``, so a client that went away does not leave the connection
+        receiving tokens.
+        """
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            self.release()
+            close = getattr(stream, "aclose", None)
+            if close is None:
+                logger.warning("The %s stream has no aclose(); it is left to finish upstream", self.provider)
+            else:
+                try:
+                    await close()
+                except Exception:
+                    logger.warning("Closing the %s stream failed", self.provider, exc_info=True)
+
+    def stats(self) -> Dict:
+        waited = self.admitted + self.rejected_deadline
+        return {
+            "provider": self.provider,
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "queued": len(self._queue),
+            "max_queued": self.max_queued,
+            "queue_size": self.queue_size,
+            "admitted": self.admitted,
+            "rejected_full": self.rejected_full,
+            "rejected_deadline": self.rejected_deadline,
+            "avg_wait_seconds": self.wait_seconds / waited if waited else 0.0,
+            "requests_available": self.requests.available() if self.requests is not None else None,
+            "tokens_available": self.tokens.available() if self.tokens is not None else None,
+        }
+
+
+def retry_after_header(e: LLMOverloaded) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(e.retry_after)))}
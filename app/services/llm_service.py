@@ -0,0 +1,575 @@
+"""Provider-independent part of the LLM services.
+
+``OpenAIService`` and ``GeminiService`` share how a grouped analysis is
+prompted, cached, coalesced, streamed, sharded and sanitized. A provider
+supplies only its calls:
+
+* ``_prompt_clos``: the CLOs (and aliases) shown in the grouped prompt;
+* ``_complete_grouped``, ``_complete_reduce`` and ``_complete_company_details``:
+  one blocking answer each, with the provider's own retries and JSON repair;
+* ``_stream_text``: the text of a streamed grouped answer, chunk by chunk.
+"""
+import asyncio
+import logging
+from contextlib import aclosing
+
+from app.config import get_settings
+from app.services.clo_aliases import PROMPT_TEXT, CLOAliases, alias_line, check_encoding
+from app.services.clo_dedup import CLODuplicates
+from app.services.csv_loader import CSVLoaderService
+from app.services.json_stream import GroupsStream
+from app.services.llm_cache import cache_key, get_llm_cache
+from app.services.llm_scheduler import LLMOverloaded, LLMScheduler
+from app.services.llm_usage import LLMUsage
+from app.services.prompt_prefix import check_layout
+from app.services.prompt_shards import SHARD_GROUP_RANGE, check_shard_mode, merge_groups, reduce_prompt, shard_candidates
+from app.services.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+def is_answer(result: dict) -> bool:
+    """Whether ``result`` has groups or company details, i.e. is worth caching."""
+    if result.get("groups"):
+        return True
+    return any(str(result.get(k) or "").strip() for k in ("requirements", "culture", "desired_traits"))
+
+
+class LLMService:
+    """Shared service logic; see the module docstring.
+
+    Subclasses set ``provider`` and ``display_name`` and, in ``__init__``,
+    ``model_name`` (part of every cache key).
+    """
+
+    provider = ""
+    display_name = ""
+
+    def __init__(self):
+        self.settings = get_settings()
+        self.model_name = ""
+        self._inflight = SingleFlight()
+        self.usage = LLMUsage(self.provider)
+        self.scheduler = LLMScheduler(self.provider, self.settings)
+
+    def _clo_line(self, clo: dict, description: str) -> str:
+        return f"- CLO_ID={clo['id']} (curriculum_id={clo['curriculum_id']}, course_id={clo['course_id']}): {description}"
+
+    def _cache_key(self, kind: str, prompt: str, catalog_version: str) -> str:
+        return cache_key(
+            provider=self.provider,
+            model=self.model_name,
+            catalog_version=catalog_version,
+            kind=kind,
+            prompt=prompt,
+        )
+
+    async def _cached_answer(self, cache, key: str) -> dict:
+        """The stored answer for ``key``, or ``None``.
+
+        It is marked ``"cached": True`` so that the router does not count it
+        as a call to the provider (breaker, latencies).
+        """
+        if cache is None:
+            return None
+        result = await asyncio.to_thread(cache.get, key)
+        if result is None or not is_answer(result):
+            # Empty answers stored by earlier versions count as misses.
+            return None
+        result["cached"] = True
+        return result
+
+    async def _store_answer(self, cache, key: str, result: dict) -> None:
+        # An empty answer is returned but not stored: the next request asks again.
+        if cache is not None and is_answer(result):
+            await asyncio.to_thread(cache.put, key, result)
+
+    def _clo_list_position(self, layout: str) -> str:
+        """Where the grouped prompt's task says the CLO list is."""
+        return f" listed {'below' if layout == 'prefix' else 'above'}"
+
+    def _grouped_rules(self, group_range: str) -> str:
+        """The provider's last rules of the grouped prompt."""
+        return "- reasoning must be in Thai and explain why the suggested CLOs fit."
+
+    def _company_rules(self) -> str:
+        """Rules the provider adds to the company details prompt, each after a newline."""
+        return ""
+
+    def _grouped_prompt(
+        self,
+        clo_context: str,
+        company_details: str,
+        encoding: str = "full",
+        group_range: str = "3-7",
+        layout: str = "ranked",
+    ) -> str:
+        text = PROMPT_TEXT[encoding]
+        header = "You are an HR expert analyzing company requirements."
+        clos = f"""Given the following CLOs (Course Learning Outcomes) from various curricula and courses:
+
+{clo_context}"""
+        company = f"""Analyze this company's details:
+
+{company_details}"""
+        instructions = f"""Task:
+1) Create {group_range} dynamic groups (themes) summarizing what the company is asking for.
+2) For each group, match it to one or more CLO IDs from the available CLOs{self._clo_list_position(layout)}.
+{text['task']}
+4) Write group_name, summary, and reasoning in Thai.
+
+Rules:
+- Return ONLY valid JSON (no markdown).
+- group_id must be a short stable identifier like "grp_1", "grp_2", etc.
+- evidence must be a list of 1-3 short quotes/snippets taken from the company details (keep original language).
+{text['rule']}
+- Each group object MUST include: group_id, group_name, summary, evidence, suggested_clos, reasoning.
+- group_name must be a short editable Thai title.
+- summary must be 1-2 lines in Thai.
+{self._grouped_rules(group_range)}
+
+Format:
+{{
+  "groups": [
+    {{
+      "group_id": "grp_1",
+      "group_name": "<short editable title>",
+      "summary": "<1-2 lines>",
+      "evidence": ["<snippet>", "<snippet>"],
+      "suggested_clos": {text['example']},
+      "reasoning": "<why these CLOs match this group>"
+    }}
+  ]
+}}"""
+        if layout == "prefix":
+            # Most stable first: a byte-identical prefix for provider prompt caching.
+            return "\n\n".join([header, instructions, clos, company])
+        return "\n\n".join([header, clos, company, instructions])
+
+    def _prompt_clos(
+        self,
+        csv_loader: CSVLoaderService,
+        clo_definitions_all: list[dict],
+        clo_duplicates: CLODuplicates,
+        company_details: str,
+        encoding: str,
+        layout: str,
+    ) -> tuple:
+        """``(clo_definitions, aliases, prompt_stats)`` of the grouped prompt.
+
+        ``aliases`` is the ``CLOAliases`` of the lines in alias encoding (else
+        ``None``), and ``prompt_stats`` how the CLOs were fitted into the prompt
+        (``None`` if they were not budgeted).
+        """
+        raise NotImplementedError
+
+    def _prepare_grouped(
+        self,
+        company_name: str,
+        requirements: str,
+        culture: str = None,
+        desired_traits: str = None,
+    ) -> dict:
+        """Prompt of a grouped analysis and what is needed to read its answer."""
+        # The service is shared; take the current catalog once for this request.
+        csv_loader = CSVLoaderService()
+        clo_definitions_all = csv_loader.load_all_clos()
+        clo_duplicates = csv_loader.get_clo_duplicates()
+
+        if not clo_definitions_all:
+            raise Exception("No CLOs found in the system")
+
+        company_details = f"""Company Name: {company_name}
+
+Requirements: {requirements}"""
+
+        if culture:
+            company_details += f"\n\nCulture: {culture}"
+
+        if desired_traits:
+            company_details += f"\n\nDesired Traits: {desired_traits}"
+
+        # Alias mode: lines and answers name CLOs by per-request aliases (c1, c2, ...).
+        encoding = check_encoding(self.settings.clo_prompt_encoding)
+        layout = check_layout(self.settings.llm_prompt_layout)
+        clo_definitions, aliases, prompt_stats = self._prompt_clos(
+            csv_loader, clo_definitions_all, clo_duplicates, company_details, encoding, layout
+        )
+        render = alias_line if aliases is not None else self._clo_line
+
+        # Build context with curriculum_id and course_id
+        clo_context = "\n".join(render(clo, clo['description']) for clo in clo_definitions)
+
+        prompt = self._grouped_prompt(clo_context, company_details, encoding, layout=layout)
+
+        # Map-reduce mode: one smaller prompt per shard of the prompt's CLOs.
+        shard_mode = check_shard_mode(self.settings.llm_shard_mode)
+        shards = []
+        if shard_mode != "off":
+            for shard in shard_candidates(clo_definitions, self.settings.llm_shards, shard_mode):
+                shard_context = "\n".join(render(clo, clo['description']) for clo in shard)
+                shard_prompt = self._grouped_prompt(
+                    shard_context, company_details, encoding, SHARD_GROUP_RANGE, layout=layout
+                )
+                shards.append((shard_prompt, shard))
+        kind = f"grouped_{shard_mode}_{len(shards)}" if shards else "grouped"
+
+        return {
+            "prompt": prompt,
+            "company_details": company_details,
+            "clo_definitions": clo_definitions,
+            "aliases": aliases,
+            "clo_duplicates": clo_duplicates,
+            "prompt_stats": prompt_stats,
+            "shards": shards,
+            "key": self._cache_key(kind, prompt, csv_loader.get_catalog_version()),
+        }
+
+    def _grouped_runner(self, req: dict, cache):
+        """The LLM call of a prepared grouped analysis, storing its answer in ``cache``."""
+
+        async def run() -> dict:
+            if req["shards"]:
+                result = await self._complete_sharded(req)
+            else:
+                result = await self._complete_grouped(
+                    req["prompt"], req["clo_definitions"], req["aliases"], req["clo_duplicates"]
+                )
+            result["prompt_stats"] = req["prompt_stats"]
+            await self._store_answer(cache, req["key"], result)
+            return result
+
+        return run
+
+    async def suggest_grouped_clos_for_company(
+        self,
+        company_name: str,
+        requirements: str,
+        culture: str = None,
+        desired_traits: str = None,
+        bypass_cache: bool = False,
+    ) -> dict:
+        # Ranking and packing the CLOs, like the SQLite cache, would block the
+        # event loop for every other request: both run in a worker thread.
+        req = await asyncio.to_thread(self._prepare_grouped, company_name, requirements, culture, desired_traits)
+        key = req["key"]
+
+        # Same prompt against the same catalog and model: reuse the stored answer.
+        cache = get_llm_cache()
+        if not bypass_cache:
+            cached = await self._cached_answer(cache, key)
+            if cached is not None:
+                return cached
+
+        # Identical concurrent analyses share one LLM call.
+        return await self._inflight.do(key, self._grouped_runner(req, cache))
+
+    async def stream_grouped_clos_for_company(
+        self,
+        company_name: str,
+        requirements: str,
+        culture: str = None,
+        desired_traits: str = None,
+        bypass_cache: bool = False,
+    ):
+        """Grouped analysis as an async stream of sanitized groups.
+
+        Yields ``{"group": ...}`` for each group as soon as the model has
+        finished writing it, then ``{"prompt_stats": ...}`` once the answer is
+        complete (with ``"cached": True`` for a stored answer). A cached answer, or an identical analysis already in flight,
+        is replayed through the same events; identical analyses started while
+        this one streams wait for it and are replayed its answer.
+        """
+        req = await asyncio.to_thread(self._prepare_grouped, company_name, requirements, culture, desired_traits)
+        key = req["key"]
+
+        cache = get_llm_cache()
+        result = None
+        if not bypass_cache:
+            result = await self._cached_answer(cache, key)
+        if result is None:
+            result = await self._inflight.join(key)
+        flight = None
+        if result is None and not req["shards"]:
+            flight = self._inflight.lead(key)
+        if result is None and flight is None:
+            # Shard groups are only final after the reduce step, so there is
+            # nothing to stream before; or an identical call has just started.
+            result = await self._inflight.do(key, self._grouped_runner(req, cache))
+        if result is not None:
+            for group in result.get("groups", []):
+                yield {"group": group}
+            yield {"prompt_stats": result.get("prompt_stats"), "cached": result.get("cached", False)}
+            return
+
+        answer = None
+        try:
+            groups = []
+            parser = GroupsStream()
+            async with aclosing(self._stream_grouped(
+                req["prompt"], req["clo_definitions"], req["aliases"], req["clo_duplicates"], parser
+            )) as stream:
+                async for group in stream:
+                    groups.append(group)
+                    yield {"group": group}
+
+            # A stream cut off mid-answer still delivered its groups, but is
+            # neither cached nor replayed to the analyses waiting for it.
+            if parser.done or not parser.groups:
+                answer = {"groups": groups, "prompt_stats": req["prompt_stats"]}
+                await self._store_answer(cache, key, answer)
+        except Exception as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            if not flight.done():
+                # None (the client went away, or the answer is incomplete) lets
+                # the waiting analyses make their own call.
+                flight.set_result(answer)
+        yield {"prompt_stats": req["prompt_stats"]}
+
+    def _sanitize_group(
+        self,
+        g,
+        position: int,
+        clo_lookup: dict,
+        aliases: CLOAliases,
+        clo_duplicates: CLODuplicates,
+    ) -> dict:
+        """Validated group of the answer with its CLO picks resolved, or ``None``.
+
+        ``position`` (1-based) names the group if the model gave it no group_id.
+        """
+        if not isinstance(g, dict):
+            return None
+
+        suggested = g.get("suggested_clos", [])
+        if not isinstance(suggested, list):
+            suggested = []
+
+        # Parse suggested_clos which can be array of objects or array of strings
+        suggested_clo_contexts = []
+        for item in suggested:
+            if aliases is not None:
+                ctx = aliases.resolve(item)
+                if ctx is not None:
+                    suggested_clo_contexts.append(ctx)
+                continue
+            if isinstance(item, dict):
+                # New format: {"clo_id": "22", "curriculum_id": 9, "course_id": 9}
+                clo_id = str(item.get("clo_id", "")).strip()
+                if clo_id in clo_lookup:
+                    # Safely convert to int, handling None and empty strings
+                    curriculum_id_raw = item.get("curriculum_id")
+                    course_id_raw = item.get("course_id")
+                    curriculum_id = int(curriculum_id_raw) if curriculum_id_raw not in (None, '', 0) else 0
+                    course_id = int(course_id_raw) if course_id_raw not in (None, '', 0) else 0
+
+                    suggested_clo_contexts.append({
+                        "clo_id": clo_id,
+                        "curriculum_id": curriculum_id,
+                        "course_id": course_id
+                    })
+            elif isinstance(item, str):
+                # Old format: just CLO ID string
+                clo_id = item.strip()
+                if clo_id in clo_lookup:
+                    clo_info = clo_lookup[clo_id]
+                    # Safely convert to int, handling None and empty strings
+                    curriculum_id_str = clo_info.get("curriculum_id", '')
+                    course_id_str = clo_info.get("course_id", '')
+                    curriculum_id = int(curriculum_id_str) if curriculum_id_str else 0
+                    course_id = int(course_id_str) if course_id_str else 0
+
+                    suggested_clo_contexts.append({
+                        "clo_id": clo_id,
+                        "curriculum_id": curriculum_id,
+                        "course_id": course_id
+                    })
+
+        # Each picked CLO stands for its near-duplicates, which were not shown.
+        suggested_clo_contexts = clo_duplicates.expand_contexts(suggested_clo_contexts)
+
+        evidence = g.get("evidence", [])
+        if not isinstance(evidence, list):
+            evidence = []
+        evidence = [str(e).strip() for e in evidence if str(e).strip()][:6]
+
+        group_id = str(g.get("group_id", "")).strip() or f"grp_{position}"
+        group_name = str(g.get("group_name", "")).strip() or group_id
+        summary = str(g.get("summary", "")).strip() or ""
+        reasoning = str(g.get("reasoning", "")).strip() or ""
+
+        return {
+            "group_id": group_id,
+            "group_name": group_name,
+            "summary": summary,
+            "evidence": evidence,
+            "suggested_clos": [ctx["clo_id"] for ctx in suggested_clo_contexts],
+            "suggested_clo_contexts": suggested_clo_contexts,
+            "reasoning": reasoning,
+        }
+
+    def _sanitize_groups(
+        self,
+        groups,
+        clo_definitions: list[dict],
+        aliases: CLOAliases,
+        clo_duplicates: CLODuplicates,
+    ) -> list[dict]:
+        """The valid groups of a parsed answer's ``groups``, sanitized."""
+        if not isinstance(groups, list):
+            return []
+
+        # Build a lookup map for CLO validation (the CLOs of the prompt)
+        clo_lookup = {clo['id']: clo for clo in clo_definitions}
+
+        sanitized_groups = []
+        for g in groups:
+            group = self._sanitize_group(g, len(sanitized_groups) + 1, clo_lookup, aliases, clo_duplicates)
+            if group is not None:
+                sanitized_groups.append(group)
+        return sanitized_groups
+
+    async def _complete_grouped(
+        self,
+        prompt: str,
+        clo_definitions: list[dict],
+        aliases: CLOAliases,
+        clo_duplicates: CLODuplicates,
+    ) -> dict:
+        """``{"groups": [...]}`` of the blocking answer to a grouped prompt."""
+        raise NotImplementedError
+
+    async def _complete_reduce(self, prompt: str) -> dict:
+        """Parsed answer to the reduce prompt of a sharded analysis."""
+        raise NotImplementedError
+
+    async def _complete_sharded(self, req: dict) -> dict:
+        """Map the shard prompts concurrently, then reduce their groups into the final ones."""
+        results = await asyncio.gather(
+            *(
+                self._complete_grouped(prompt, shard, req["aliases"], req["clo_duplicates"])
+                for prompt, shard in req["shards"]
+            ),
+            return_exceptions=True,
+        )
+        errors = [r for r in results if isinstance(r, Exception)]
+        answered = [r["groups"] for r in results if not isinstance(r, BaseException) and r["groups"]]
+        map_groups = [g for groups in answered for g in groups]
+        if not map_groups:
+            raise errors[0] if errors else Exception(f"{self.display_name} returned no groups for any shard")
+        if errors:
+            # The other shards' groups still cover most candidates.
+            logger.warning("%d of %d prompt shards failed: %s", len(errors), len(results), errors[0])
+        if len(answered) == 1:
+            # A single answering shard already produced final groups.
+            return {"groups": merge_groups(map_groups)}
+
+        answer = None
+        try:
+            answer = await self._complete_reduce(reduce_prompt(req["company_details"], map_groups))
+        except Exception:
+            # Keep the shard groups (merged by name) rather than fail the analysis.
+            logger.warning("Reduce step failed; merging shard groups by name", exc_info=True)
+        return {"groups": merge_groups(map_groups, answer)}
+
+    async def _stream_text(self, prompt: str):
+        """Text of the streamed answer to a grouped prompt, as it arrives."""
+        raise NotImplementedError
+
+    async def _stream_grouped(
+        self,
+        prompt: str,
+        clo_definitions: list[dict],
+        aliases: CLOAliases,
+        clo_duplicates: CLODuplicates,
+        parser: GroupsStream,
+    ):
+        """Sanitized groups of a streamed answer, each as soon as ``parser`` completes it.
+
+        If the stream yields no group at all and never completes, the blocking
+        call is made instead and its groups are yielded.
+        """
+        clo_lookup = {clo['id']: clo for clo in clo_definitions}
+        emitted = 0
+        try:
+            # Closed as soon as this generator is, which closes the provider's response.
+            async with aclosing(self._stream_text(prompt)) as chunks:
+                async for text in chunks:
+                    for g in parser.feed(text):
+                        group = self._sanitize_group(g, emitted + 1, clo_lookup, aliases, clo_duplicates)
+                        if group is not None:
+                            emitted += 1
+                            yield group
+        except LLMOverloaded:
+            raise
+        except Exception as e:
+            raise Exception(f"Error analyzing company details with {self.display_name}: {str(e)}")
+
+        if not parser.done and not parser.groups:
+            # Empty or unreadable stream: fall back to the blocking call and its retries.
+            logger.warning("Streamed grouped answer was incomplete (%d chars); retrying without streaming", len(parser.text))
+            result = await self._complete_grouped(prompt, clo_definitions, aliases, clo_duplicates)
+            for group in result["groups"]:
+                yield group
+
+    async def suggest_company_details(
+        self,
+        company_name: str,
+        brief_description: str = None,
+        partial_requirements: str = None,
+        bypass_cache: bool = False,
+    ) -> dict:
+        """Generate company details suggestions based on company name and brief hints."""
+
+        context = f"Company Name: {company_name}"
+        if brief_description:
+            context += f"\n\nBrief Description: {brief_description}"
+        if partial_requirements:
+            context += f"\n\nPartial Requirements (user started writing): {partial_requirements}"
+
+        prompt = f"""You are an HR expert helping someone write a job posting.
+
+Given this information about a company:
+
+{context}
+
+Task:
+Generate realistic and detailed job requirements for this company. Include:
+1) **requirements**: Technical skills, qualifications, and experience needed (3-5 bullet points)
+2) **culture**: Company culture and work environment description (2-3 sentences)
+3) **desired_traits**: Personality traits and soft skills desired (3-4 traits)
+
+Rules:
+- Write in Thai language
+- Be specific and realistic based on the company name and description
+- If partial_requirements were provided, expand and improve them
+- Make it sound professional and appealing
+- Return ONLY valid JSON (no markdown){self._company_rules()}
+
+Format:
+{{
+  "requirements": "<detailed requirements in Thai>",
+  "culture": "<culture description in Thai>",
+  "desired_traits": "<desired traits in Thai>"
+}}"""
+
+        # Same prompt against the same catalog and model: reuse the stored answer.
+        cache = get_llm_cache()
+        key = self._cache_key("company_details", prompt, "")
+        if not bypass_cache:
+            cached = await self._cached_answer(cache, key)
+            if cached is not None:
+                return cached
+
+        async def run() -> dict:
+            result = await self._complete_company_details(prompt)
+            await self._store_answer(cache, key, result)
+            return result
+
+        return await self._inflight.do(key, run)
+
+    async def _complete_company_details(self, prompt: str) -> dict:
+        """``requirements``, ``culture`` and ``desired_traits`` of the blocking answer."""
+        raise NotImplementedError
@@ -0,0 +1,48 @@
+"""Token usage reported by the LLM providers, including prompt-cache hits.
+
+Each service records the ``usage`` of every response: prompt tokens, the part
+of them served from the provider's prompt cache, and output tokens. Counts
+are per worker and provider since start-up. They show how much of the input
+the prompt layout actually gets from the provider cache
+(``LLM_PROMPT_LAYOUT=prefix``).
+"""
+import logging
+import threading
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUsage:
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, prompt_tokens: int, cached_tokens: int, output_tokens: int) -> None:
+        prompt_tokens = prompt_tokens or 0
+        cached_tokens = cached_tokens or 0
+        output_tokens = output_tokens or 0
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens
+            self.output_tokens += output_tokens
+        logger.info(
+            "%s usage: prompt_tokens=%d cached_tokens=%d output_tokens=%d",
+            self.provider, prompt_tokens, cached_tokens, output_tokens,
+        )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "provider": self.provider,
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cached_ratio": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+                "output_tokens": self.output_tokens,
+            }
@@ -1,28 +1,50 @@
 import json
-import re
-from pathlib import Path
-from openai import OpenAI
-from app.config import get_settings
-from app.services.csv_loader import CSVLoaderService
+import logging
+from contextlib import aclosing
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from app.services.clo_aliases import CLOAliases, alias_line
+from app.services.clo_dedup import RANK_WINDOW, CLODuplicates
+from app.services.clo_index import RANKING_MODES, CLOIndex, tokenize
+from app.services.clo_vectors import CLOVectors
+from app.services.llm_scheduler import LLMOverloaded
+from app.services.llm_service import LLMService
+from app.services.prompt_budget import count_tokens, pack_lines, truncate
+from app.services.prompt_prefix import curriculum_blocks
+
+logger = logging.getLogger(__name__)
+
+class OpenAIService(LLMService):
+    provider = "openai"
+    display_name = "OpenAI"
 
-class OpenAIService:
     def __init__(self):
-        self.settings = get_settings()
-        self.client = OpenAI(api_key=self.settings.openai_api_key)
-        self.csv_loader = CSVLoaderService()
+        super().__init__()
+        self.model_name = self.settings.openai_model
+        # One keep-alive connection pool for the life of the process (see llm_factory).
+        self.client = AsyncOpenAI(
+            api_key=self.settings.openai_api_key,
+            timeout=self.settings.llm_timeout,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=self.settings.llm_max_connections,
+                    max_keepalive_connections=self.settings.llm_max_connections,
+                    keepalive_expiry=self.settings.llm_keepalive_expiry,
+                ),
+            ),
+        )
+
+    async def aclose(self) -> None:
+        await self.client.close()
 
     def _normalize_text(self, text: str) -> str:
         return (text or "").lower()
 
     def _tokenize(self, text: str) -> set[str]:
-        text = self._normalize_text(text)
-        return set(t for t in re.findall(r"[a-zA-Z0-9ก-๙]+", text) if len(t) >= 2)
+        return tokenize(text)
 
     def _truncate(self, s: str, max_chars: int) -> str:
-        s = (s or "").strip()
-        if len(s) <= max_chars:
-            return s
-        return s[:max_chars].rstrip() + "…"
+        return truncate(s, max_chars)
 
     def _select_top_clos(
         self,
@@ -31,22 +53,47 @@ class OpenAIService:
         *,
         top_k: int = 300,
         desc_max_chars: int = 240,
+        index: CLOIndex = None,
+        mode: str = "overlap",
+        vectors: CLOVectors = None,
+        duplicates: CLODuplicates = None,
     ) -> list[dict]:
+        if mode not in RANKING_MODES:
+            raise Exception(f"Unknown CLO ranking mode '{mode}', expected one of {RANKING_MODES}")
         q_tokens = self._tokenize(query_text)
         if not clos:
             return []
 
+        if mode == "dense" and (vectors is None or len(vectors.index) != len(clos)):
+            # No vectors for this list (building them takes seconds): use BM25.
+            mode = "bm25"
+        if index is None or len(index) != len(clos):
+            # BM25 needs corpus statistics; build them for a list we have no index for.
+            index = CLOIndex.build(clos, self.settings.clo_index_analyzer) if mode == "bm25" else None
+        if duplicates is not None and len(duplicates) != len(clos):
+            duplicates = None
+        # Rank a wider window when near-duplicates will be collapsed, so the
+        # top_k slots go to distinct CLOs.
+        window = min(len(clos), top_k * RANK_WINDOW) if duplicates is not None else top_k
+
         if not q_tokens:
-            picked = clos[:top_k]
+            positions = range(min(window, len(clos)))
+        elif mode == "dense":
+            positions = vectors.top_k(query_text, window)
+        elif index is not None:
+            # ``index`` was built over this list: rank via posting lists.
+            positions = index.top_k(query_text, window, mode=mode)
         else:
-            scored: list[tuple[int, dict]] = []
-            for clo in clos:
+            scored: list[tuple[int, int]] = []
+            for pos, clo in enumerate(clos):
                 desc = clo.get("description", "")
                 d_tokens = self._tokenize(desc)
                 score = len(q_tokens & d_tokens)
-                scored.append((score, clo))
+                scored.append((score, pos))
             scored.sort(key=lambda x: x[0], reverse=True)
-            picked = [c for _, c in scored[:top_k]]
+            positions = [pos for _, pos in scored[:window]]
+        positions = duplicates.collapse(positions, top_k) if duplicates is not None else list(positions)[:top_k]
+        picked = [clos[pos] for pos in positions]
 
         out: list[dict] = []
         for clo in picked:
@@ -55,13 +102,43 @@ class OpenAIService:
             out.append(clo2)
         return out
 
-    def _create_chat_completion(
+    def _record_usage(self, usage) -> None:
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.usage.record(
+            usage.prompt_tokens,
+            getattr(details, "cached_tokens", 0) if details is not None else 0,
+            usage.completion_tokens,
+        )
+
+    async def _create_chat_completion(self, *, messages: list, max_output_tokens: int, stream: bool = False, **kwargs):
+        """A chat completion once the scheduler admits it (see llm_scheduler).
+
+        A stream keeps its slot until it has been read to the end.
+        """
+        estimate = sum(count_tokens(m["content"] or "") for m in messages) + max_output_tokens
+        await self.scheduler.acquire(estimate)
+        try:
+            response = await self._send_chat_completion(
+                messages=messages, max_output_tokens=max_output_tokens, stream=stream, **kwargs
+            )
+        except BaseException:
+            self.scheduler.release()
+            raise
+        if stream:
+            return self.scheduler.hold_stream(response)
+        self.scheduler.release()
+        return response
+
+    async def _send_chat_completion(
         self,
         *,
         messages: list,
         max_output_tokens: int,
         response_format: dict = None,
         temperature: float = None,
+        stream: bool = False,
     ):
         try:
             kwargs = {
@@ -73,8 +150,12 @@ class OpenAIService:
                 kwargs["response_format"] = response_format
             if temperature is not None:
                 kwargs["temperature"] = temperature
+            if stream:
+                kwargs["stream"] = True
+                # The last chunk then carries the usage (recorded by _stream_text).
+                kwargs["stream_options"] = {"include_usage": True}
 
-            return self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 **kwargs,
             )
         except Exception as e:
@@ -89,103 +170,93 @@ class OpenAIService:
                     kwargs["response_format"] = response_format
                 if temperature is not None:
                     kwargs["temperature"] = temperature
-                return self.client.chat.completions.create(**kwargs)
-            raise
-    
-
-
-    def suggest_grouped_clos_for_company(
+                if stream:
+                    kwargs["stream"] = True
+                    kwargs["stream_options"] = {"include_usage": True}
+                response = await self.client.chat.completions.create(**kwargs)
+            else:
+                raise
+        if not stream:
+            self._record_usage(getattr(response, "usage", None))
+        return response
+
+    def _prompt_clos(
         self,
-        company_name: str,
-        requirements: str,
-        culture: str = None,
-        desired_traits: str = None,
-    ) -> dict:
-        clo_definitions_all = self.csv_loader.load_all_clos()
-        
-        if not clo_definitions_all:
-            raise Exception("No CLOs found in the system")
-
-        company_details = f"""Company Name: {company_name}
-
-Requirements: {requirements}"""
-
-        if culture:
-            company_details += f"\n\nCulture: {culture}"
-
-        if desired_traits:
-            company_details += f"\n\nDesired Traits: {desired_traits}"
-
-        # Reduce prompt size: select only the most relevant CLOs and truncate descriptions.
-        clo_definitions = self._select_top_clos(
+        csv_loader,
+        clo_definitions_all: list[dict],
+        clo_duplicates: CLODuplicates,
+        company_details: str,
+        encoding: str,
+        layout: str,
+    ) -> tuple:
+        clo_index = csv_loader.get_clo_index()
+        clo_vectors = csv_loader.get_clo_vectors()
+
+        # Reduce prompt size: rank the CLOs, then pack the best into the token budget.
+        candidates = self._select_top_clos(
             clo_definitions_all,
             query_text=company_details,
-            top_k=300,
-            desc_max_chars=240,
+            top_k=self.settings.clo_top_k,
+            desc_max_chars=self.settings.clo_desc_max_chars,
+            index=clo_index,
+            mode=self.settings.clo_ranking_mode,
+            vectors=clo_vectors,
+            duplicates=clo_duplicates,
         )
-        if not clo_definitions:
+        if not candidates:
             raise Exception("No CLOs available after filtering")
 
-        # Build context with curriculum_id and course_id
-        clo_context = "\n".join([
-            f"- CLO_ID={clo['id']} (curriculum_id={clo['curriculum_id']}, course_id={clo['course_id']}): {clo['description']}"
-            for clo in clo_definitions
-        ])
-
-        valid_clo_ids = [clo['id'] for clo in clo_definitions]
-
-        valid_clo_ids_context = ", ".join(valid_clo_ids[:50]) + ("..." if len(valid_clo_ids) > 50 else "")
-
-        prompt = f"""You are an HR expert analyzing company requirements.
-
-Given the following CLOs (Course Learning Outcomes) from various curricula and courses:
-
-{clo_context}
-
-Analyze this company's details:
-
-{company_details}
-
-Task:
-1) Create 3-7 dynamic groups (themes) summarizing what the company is asking for.
-2) For each group, match it to one or more CLO IDs from the available CLOs listed above.
-3) For each CLO you suggest, you MUST also include its curriculum_id and course_id.
-4) Write group_name, summary, and reasoning in Thai.
-
-Rules:
-- Return ONLY valid JSON (no markdown).
-- group_id must be a short stable identifier like "grp_1", "grp_2", etc.
-- evidence must be a list of 1-3 short quotes/snippets taken from the company details (keep original language).
-- suggested_clos must be an array of objects with format: {{"clo_id": "22", "curriculum_id": 9, "course_id": 9}}
-- Each group object MUST include: group_id, group_name, summary, evidence, suggested_clos, reasoning.
-- group_name must be a short editable Thai title.
-- summary must be 1-2 lines in Thai.
-- reasoning must be in Thai and explain why the suggested CLOs fit.
-
-Format:
-{{
-  "groups": [
-    {{
-      "group_id": "grp_1",
-      "group_name": "<short editable title>",
-      "summary": "<1-2 lines>",
-      "evidence": ["<snippet>", "<snippet>"],
-      "suggested_clos": [
-        {{"clo_id": "22", "curriculum_id": 9, "course_id": 9}},
-        {{"clo_id": "23", "curriculum_id": 9, "course_id": 9}}
-      ],
-      "reasoning": "<why these CLOs match this group>"
-    }}
-  ]
-}}"""
+        template_tokens = count_tokens(self._grouped_prompt("", company_details, encoding, layout=layout))
+        if layout == "prefix":
+            # Whole-curriculum blocks in stable order (see prompt_prefix). Aliases
+            # are numbered after ordering, so they are stable as well.
+            clo_definitions, prompt_stats = curriculum_blocks(
+                clo_definitions_all,
+                candidates,
+                self.settings.llm_prompt_token_budget - template_tokens,
+                render=self._clo_line,
+                duplicates=clo_duplicates,
+                max_chars=self.settings.clo_desc_max_chars,
+                curricula=[c.strip() for c in self.settings.llm_prompt_curricula.split(",") if c.strip()],
+            )
+            aliases = CLOAliases(clo_definitions) if encoding == "alias" else None
+            if aliases is not None:
+                clo_definitions = aliases.clos
+        else:
+            aliases = CLOAliases(candidates) if encoding == "alias" else None
+            if aliases is not None:
+                candidates = aliases.clos
+            render = alias_line if aliases is not None else self._clo_line
+
+            clo_definitions, prompt_stats = pack_lines(
+                candidates,
+                self.settings.llm_prompt_token_budget - template_tokens,
+                render=render,
+                max_chars=self.settings.clo_desc_max_chars,
+                min_chars=self.settings.clo_desc_min_chars,
+            )
+        prompt_stats["prompt_tokens"] = template_tokens + prompt_stats["used_tokens"]
+        logger.info("Grouped CLO prompt: %s", prompt_stats)
+        if not clo_definitions:
+            raise Exception(
+                f"No CLOs fit in the prompt token budget (LLM_PROMPT_TOKEN_BUDGET={self.settings.llm_prompt_token_budget})"
+            )
+        return clo_definitions, aliases, prompt_stats
 
+    async def _complete_grouped(
+        self,
+        prompt: str,
+        clo_definitions: list[dict],
+        aliases: CLOAliases,
+        clo_duplicates: CLODuplicates,
+    ) -> dict:
         try:
             messages = [
                 {"role": "system", "content": "You are an expert HR professional."},
                 {"role": "user", "content": prompt},
             ]
 
-            response = self._create_chat_completion(
+            response = await self._create_chat_completion(
                 messages=messages,
                 max_output_tokens=3000,
                 response_format={"type": "json_object"},
@@ -213,7 +284,7 @@ Format:
             content = content.strip()
 
             if not content:
-                retry = self._create_chat_completion(
+                retry = await self._create_chat_completion(
                     messages=messages,
                     max_output_tokens=5000,
                     response_format={"type": "json_object"},
@@ -229,7 +300,7 @@ Format:
                         {"role": "system", "content": "You are an expert HR professional. Respond ONLY with valid JSON."},
                         {"role": "user", "content": prompt},
                     ]
-                    fallback = self._create_chat_completion(
+                    fallback = await self._create_chat_completion(
                         messages=fallback_messages,
                         max_output_tokens=5000,
                         response_format=None,
@@ -255,123 +326,46 @@ Format:
                 )
 
             groups = result.get("groups", [])
-            if not isinstance(groups, list):
-                groups = []
-
-            # Build a lookup map for CLO validation (filtered set)
-            clo_lookup = {clo['id']: clo for clo in clo_definitions}
-
-            sanitized_groups = []
-            for g in groups:
-                if not isinstance(g, dict):
-                    continue
-
-                suggested = g.get("suggested_clos", [])
-                if not isinstance(suggested, list):
-                    suggested = []
-                
-                # Parse suggested_clos which can be array of objects or array of strings
-                suggested_clo_contexts = []
-                for item in suggested:
-                    if isinstance(item, dict):
-                        # New format: {"clo_id": "22", "curriculum_id": 9, "course_id": 9}
-                        clo_id = str(item.get("clo_id", "")).strip()
-                        if clo_id in clo_lookup:
-                            # Safely convert to int, handling None and empty strings
-                            curriculum_id_raw = item.get("curriculum_id")
-                            course_id_raw = item.get("course_id")
-                            curriculum_id = int(curriculum_id_raw) if curriculum_id_raw not in (None, '', 0) else 0
-                            course_id = int(course_id_raw) if course_id_raw not in (None, '', 0) else 0
-                            
-                            suggested_clo_contexts.append({
-                                "clo_id": clo_id,
-                                "curriculum_id": curriculum_id,
-                                "course_id": course_id
-                            })
-                    elif isinstance(item, str):
-                        # Old format: just CLO ID string
-                        clo_id = item.strip()
-                        if clo_id in clo_lookup:
-                            clo_info = clo_lookup[clo_id]
-                            # Safely convert to int, handling None and empty strings
-                            curriculum_id_str = clo_info.get("curriculum_id", '')
-                            course_id_str = clo_info.get("course_id", '')
-                            curriculum_id = int(curriculum_id_str) if curriculum_id_str else 0
-                            course_id = int(course_id_str) if course_id_str else 0
-                            
-                            suggested_clo_contexts.append({
-                                "clo_id": clo_id,
-                                "curriculum_id": curriculum_id,
-                                "course_id": course_id
-                            })
-
-                evidence = g.get("evidence", [])
-                if not isinstance(evidence, list):
-                    evidence = []
-                evidence = [str(e).strip() for e in evidence if str(e).strip()][:6]
-
-                group_id = str(g.get("group_id", "")).strip() or f"grp_{len(sanitized_groups) + 1}"
-                group_name = str(g.get("group_name", "")).strip() or group_id
-                summary = str(g.get("summary", "")).strip() or ""
-                reasoning = str(g.get("reasoning", "")).strip() or ""
-
-                sanitized_groups.append(
-                    {
-                        "group_id": group_id,
-                        "group_name": group_name,
-                        "summary": summary,
-                        "evidence": evidence,
-                        "suggested_clos": [ctx["clo_id"] for ctx in suggested_clo_contexts],
-                        "suggested_clo_contexts": suggested_clo_contexts,
-                        "reasoning": reasoning,
-                    }
-                )
-
-            return {"groups": sanitized_groups}
+            return {"groups": self._sanitize_groups(groups, clo_definitions, aliases, clo_duplicates)}
 
+        except LLMOverloaded:
+            raise
         except Exception as e:
             raise Exception(f"Error analyzing company details with OpenAI: {str(e)}")
 
-    def suggest_company_details(
-        self,
-        company_name: str,
-        brief_description: str = None,
-        partial_requirements: str = None,
-    ) -> dict:
-        """Generate company details suggestions based on company name and brief hints."""
-        
-        context = f"Company Name: {company_name}"
-        if brief_description:
-            context += f"\n\nBrief Description: {brief_description}"
-        if partial_requirements:
-            context += f"\n\nPartial Requirements (user started writing): {partial_requirements}"
-
-        prompt = f"""You are an HR expert helping someone write a job posting.
-
-Given this information about a company:
-
-{context}
-
-Task:
-Generate realistic and detailed job requirements for this company. Include:
-1) **requirements**: Technical skills, qualifications, and experience needed (3-5 bullet points)
-2) **culture**: Company culture and work environment description (2-3 sentences)
-3) **desired_traits**: Personality traits and soft skills desired (3-4 traits)
-
-Rules:
-- Write in Thai language
-- Be specific and realistic based on the company name and description
-- If partial_requirements were provided, expand and improve them
-- Make it sound professional and appealing
-- Return ONLY valid JSON (no markdown)
-
-Format:
-{{
-  "requirements": "<detailed requirements in Thai>",
-  "culture": "<culture description in Thai>",
-  "desired_traits": "<desired traits in Thai>"
-}}"""
+    async def _complete_reduce(self, prompt: str) -> dict:
+        response = await self._create_chat_completion(
+            messages=[
+                {"role": "system", "content": "You are an expert HR professional."},
+                {"role": "user", "content": prompt},
+            ],
+            max_output_tokens=1500,
+            response_format={"type": "json_object"},
+            temperature=None,
+        )
+        content = response.choices[0].message.content if response.choices else None
+        return json.loads((content or "").strip())
+
+    async def _stream_text(self, prompt: str):
+        messages = [
+            {"role": "system", "content": "You are an expert HR professional."},
+            {"role": "user", "content": prompt},
+        ]
+        stream = await self._create_chat_completion(
+            messages=messages,
+            max_output_tokens=3000,
+            response_format={"type": "json_object"},
+            temperature=None,
+            stream=True,
+        )
+        async with aclosing(stream) as chunks:
+            async for chunk in chunks:
+                self._record_usage(getattr(chunk, "usage", None))
+                if not chunk.choices:
+                    continue
+                yield chunk.choices[0].delta.content or ""
 
+    async def _complete_company_details(self, prompt: str) -> dict:
         try:
             messages = [
                 {"role": "system", "content": "You are an expert HR professional helping write job postings."},
@@ -421,7 +415,7 @@ Format:
                             return s[start : i + 1].strip()
                 return ""
 
-            response = self._create_chat_completion(
+            response = await self._create_chat_completion(
                 messages=messages,
                 max_output_tokens=1500,
                 response_format={"type": "json_object"},
@@ -436,7 +430,7 @@ Format:
             content = _clean_content(message.content)
 
             if not content:
-                retry = self._create_chat_completion(
+                retry = await self._create_chat_completion(
                     messages=messages,
                     max_output_tokens=1500,
                     response_format={"type": "json_object"},
@@ -472,7 +466,7 @@ Format:
                     },
                     {"role": "user", "content": prompt},
                 ]
-                fallback = self._create_chat_completion(
+                fallback = await self._create_chat_completion(
                     messages=fallback_messages,
                     max_output_tokens=1500,
                     response_format=None,
@@ -502,5 +496,7 @@ Format:
                 "desired_traits": str(parsed.get("desired_traits", "") or ""),
             }
 
+        except LLMOverloaded:
+            raise
         except Exception as e:
             raise Exception(f"Error suggesting company details with OpenAI: {str(e)}")
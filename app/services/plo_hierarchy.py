@@ -0,0 +1,100 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+
+class PLOHierarchy:
+    """Per-curriculum PLO trees, precomputed once per catalog.
+
+    Built from the live PLO rows (``load_plos()``): parent/child links, the
+    ancestor closure of every PLO and the level-1 PLO each one rolls up to.
+    A ``parent_plo_id`` that points at a missing or deleted PLO makes the
+    PLO a root; cycles are cut where they close.
+    """
+
+    def __init__(self, plos: List[Dict]):
+        self.plos: Dict[str, Dict] = {}
+        self._position: Dict[str, int] = {}
+        for pos, plo in enumerate(plos):
+            if plo['id'] not in self.plos:
+                self.plos[plo['id']] = plo
+                self._position[plo['id']] = pos
+
+        self.parent: Dict[str, str] = {}
+        self.children: Dict[str, List[str]] = defaultdict(list)
+        for plo_id, plo in self.plos.items():
+            parent_id = plo.get('parent_plo_id') or ''
+            if parent_id and parent_id != plo_id and parent_id in self.plos:
+                self.parent[plo_id] = parent_id
+                self.children[parent_id].append(plo_id)
+
+        # Ancestors, nearest first.
+        self.ancestors: Dict[str, Tuple[str, ...]] = {}
+        for plo_id in self.plos:
+            chain = []
+            seen = {plo_id}
+            current = self.parent.get(plo_id)
+            while current is not None and current not in seen:
+                chain.append(current)
+                seen.add(current)
+                current = self.parent.get(current)
+            self.ancestors[plo_id] = tuple(chain)
+
+        self.roots_by_curriculum: Dict[str, List[str]] = defaultdict(list)
+        for plo_id, plo in self.plos.items():
+            if plo_id not in self.parent:
+                self.roots_by_curriculum[plo['curriculum_id']].append(plo_id)
+
+        # Nearest level-1 PLO at or above each PLO; the root when there is none.
+        self.top_level: Dict[str, str] = {}
+        for plo_id in self.plos:
+            chain = (plo_id,) + self.ancestors[plo_id]
+            self.top_level[plo_id] = next(
+                (p for p in chain if self.plos[p].get('plo_level') == '1'),
+                chain[-1],
+            )
+
+    def tree(self, curriculum_id: str) -> List[Dict]:
+        """Nested ``{"plo": ..., "children": [...]}`` nodes for one curriculum."""
+        def node(plo_id: str, seen: set) -> Dict:
+            seen = seen | {plo_id}
+            return {
+                "plo": dict(self.plos[plo_id]),
+                "children": [node(c, seen) for c in self.children.get(plo_id, []) if c not in seen],
+            }
+
+        return [node(root, set()) for root in self.roots_by_curriculum.get(str(curriculum_id), [])]
+
+    def rollup(self, mappings: Iterable[Dict]) -> List[Dict]:
+        """Roll CLO->PLO mapping edges up to level-1 PLOs.
+
+        Returns one entry per level-1 PLO touched, in PLO file order, with the
+        distinct CLO IDs mapped to it or any PLO below it, the sub-PLOs that
+        were hit, and the number of mapping edges counted.
+        """
+        coverage: Dict[str, Dict] = {}
+        for m in mappings:
+            plo_id = str(m.get('plo_id') or '')
+            top_id = self.top_level.get(plo_id)
+            if top_id is None:
+                continue
+            entry = coverage.setdefault(
+                top_id,
+                {"clo_ids": {}, "sub_plo_ids": {}, "mapping_count": 0},
+            )
+            entry["mapping_count"] += 1
+            clo_id = str(m.get('clo_id') or '')
+            if clo_id:
+                entry["clo_ids"][clo_id] = None
+            if plo_id != top_id:
+                entry["sub_plo_ids"][plo_id] = None
+
+        out = []
+        for top_id in sorted(coverage, key=self._position.__getitem__):
+            entry = coverage[top_id]
+            out.append({
+                "plo": dict(self.plos[top_id]),
+                "clo_ids": list(entry["clo_ids"]),
+                "sub_plo_ids": sorted(entry["sub_plo_ids"], key=self._position.__getitem__),
+                "mapping_count": entry["mapping_count"],
+            })
+        return out
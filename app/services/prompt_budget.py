@@ -0,0 +1,140 @@
+"""Token-budgeted packing of ranked CLO lines into a prompt.
+
+Tokens are estimated locally, without a tokenizer download or API call. The
+text is split the way BPE tokenizers pre-split it (letter runs, digit groups,
+Thai runs, punctuation), and each piece is charged a typical token cost,
+rounded up. The estimate errs high, so a packed prompt stays within the budget
+on the real tokenizer.
+
+``pack_lines`` fills the budget in ranked order. If every candidate fits with
+its description cut at ``max_chars``, all are kept. Otherwise the cap is
+lowered (down to ``min_chars``) until they all fit. If they still do not fit at
+``min_chars``, the lowest-ranked candidates are dropped.
+"""
+import math
+import re
+from bisect import bisect_right
+from typing import Callable, Dict, List, Tuple
+
+# Letters per token for Latin words, digits per token (numbers are split in
+# groups of three), and Thai characters per token.
+_LATIN_CHARS_PER_TOKEN = 4
+_DIGITS_PER_TOKEN = 3
+_THAI_CHARS_PER_TOKEN = 2
+
+_PIECE_RE = re.compile(r"[A-Za-z]+|[0-9]+|[\u0E00-\u0E7F]+| +|\s+|[^\sA-Za-z0-9\u0E00-\u0E7F]")
+ELLIPSIS = "…"
+
+
+def _piece_tokens(piece: str) -> int:
+    first = piece[0]
+    if first == " ":
+        # A single space merges into the following word.
+        return 0 if len(piece) == 1 else 1
+    if first.isascii() and first.isalpha():
+        return math.ceil(len(piece) / _LATIN_CHARS_PER_TOKEN)
+    if first.isdigit():
+        return math.ceil(len(piece) / _DIGITS_PER_TOKEN)
+    if "\u0E00" <= first <= "\u0E7F":
+        return math.ceil(len(piece) / _THAI_CHARS_PER_TOKEN)
+    # Newlines and other whitespace, punctuation, other scripts: one per piece.
+    return 1
+
+
+def count_tokens(text: str) -> int:
+    """Estimated number of tokens in ``text``."""
+    return sum(_piece_tokens(m.group()) for m in _PIECE_RE.finditer(text or ""))
+
+
+def truncate(text: str, max_chars: int) -> str:
+    """``text`` stripped and cut to ``max_chars`` characters, marked with an ellipsis."""
+    text = (text or "").strip()
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + ELLIPSIS
+
+
+class _PrefixCost:
+    """Token estimate of ``truncate(text, cap)`` for any cap, from one pass over ``text``."""
+
+    def __init__(self, text: str):
+        self.text = (text or "").strip()
+        self.ends: List[int] = []
+        self.cumulative: List[int] = []
+        total = 0
+        for m in _PIECE_RE.finditer(self.text):
+            total += _piece_tokens(m.group())
+            self.ends.append(m.end())
+            self.cumulative.append(total)
+
+    def cost(self, cap: int) -> int:
+        if len(self.text) <= cap:
+            return self.cumulative[-1] if self.cumulative else 0
+        # Whole pieces before the cut, plus the cut piece and the ellipsis.
+        whole = bisect_right(self.ends, cap)
+        tokens = self.cumulative[whole - 1] if whole else 0
+        start = self.ends[whole - 1] if whole else 0
+        if cap > start:
+            tokens += count_tokens(self.text[start:cap])
+        return tokens + 1
+
+
+def pack_lines(
+    items: List[Dict],
+    budget_tokens: int,
+    render: Callable[[Dict, str], str],
+    *,
+    max_chars: int,
+    min_chars: int,
+    field: str = "description",
+) -> Tuple[List[Dict], Dict]:
+    """Ranked ``items`` that fit in ``budget_tokens`` as newline-joined ``render`` lines.
+
+    ``render(item, text)`` formats one line, where ``text`` is the (truncated)
+    ``item[field]``. Returns copies of the packed items with ``field``
+    truncated, plus stats: ``budget_tokens``, ``used_tokens``,
+    ``candidates``, ``packed``, ``truncated`` and ``desc_max_chars``.
+    """
+    min_chars = min(min_chars, max_chars)
+    # Per line: the fixed part (rendered with an empty text) and a newline.
+    fixed = [count_tokens(render(item, "")) + 1 for item in items]
+    texts = [_PrefixCost(item.get(field, "")) for item in items]
+
+    def total(cap: int) -> int:
+        return sum(f + t.cost(cap) for f, t in zip(fixed, texts))
+
+    cap = max_chars
+    if total(max_chars) > budget_tokens:
+        if total(min_chars) <= budget_tokens:
+            # Largest cap at which every candidate still fits.
+            lo, hi = min_chars, max_chars
+            while hi - lo > 1:
+                mid = (lo + hi) // 2
+                lo, hi = (mid, hi) if total(mid) <= budget_tokens else (lo, mid)
+            cap = lo
+        else:
+            cap = min_chars
+
+    packed: List[Dict] = []
+    used = 0
+    n_truncated = 0
+    for item, text in zip(items, texts):
+        line_item = dict(item)
+        line_item[field] = truncate(text.text, cap)
+        # Count the final line exactly, so the total never exceeds the budget.
+        line_tokens = count_tokens(render(line_item, line_item[field])) + 1
+        if used + line_tokens > budget_tokens:
+            break
+        used += line_tokens
+        n_truncated += len(text.text) > cap
+        packed.append(line_item)
+
+    stats = {
+        "budget_tokens": budget_tokens,
+        "used_tokens": used,
+        "candidates": len(items),
+        "packed": len(packed),
+        "truncated": n_truncated,
+        "desc_max_chars": cap,
+    }
+    return packed, stats
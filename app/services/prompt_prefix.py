@@ -0,0 +1,106 @@
+"""Prompt layout with a stable prefix, for provider-side prompt caching.
+
+OpenAI (automatically, from 1024 tokens) and Gemini (implicit caching) reuse
+the processed prefix of a prompt that starts with exactly the same bytes as a
+recent one, which lowers input latency and cost. The ``ranked`` layout has
+the company's own ranked CLO list near the start, so two requests share
+almost nothing. With ``LLM_PROMPT_LAYOUT=prefix`` the prompt is ordered from
+most to least stable:
+
+1. instructions and answer format (identical for every request);
+2. whole-curriculum CLO blocks: every CLO of each curriculum the ranking
+   points to, one line per near-duplicate cluster, in catalog order, with
+   the blocks sorted by curriculum id. A block's bytes depend only on the
+   catalog, so requests that land on the same curricula share the prefix.
+   With ``LLM_PROMPT_CURRICULA`` the blocks are those curricula instead, and
+   the whole CLO block is shared by every request;
+3. the company details, last.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.services.clo_dedup import CLODuplicates
+from app.services.prompt_budget import count_tokens, truncate
+
+PROMPT_LAYOUTS = ("ranked", "prefix")
+
+
+def check_layout(layout: str) -> str:
+    if layout not in PROMPT_LAYOUTS:
+        raise Exception(f"Unknown LLM prompt layout '{layout}', expected one of {PROMPT_LAYOUTS}")
+    return layout
+
+
+def _curriculum_sort_key(curriculum_id: str):
+    return (0, int(curriculum_id), "") if curriculum_id.isdigit() else (1, 0, curriculum_id)
+
+
+def curriculum_blocks(
+    clos: List[Dict],
+    ranked: List[Dict],
+    budget_tokens: int,
+    render: Callable[[Dict, str], str],
+    *,
+    duplicates: CLODuplicates = None,
+    max_chars: int,
+    curricula: Optional[List[str]] = None,
+) -> Tuple[List[Dict], Dict]:
+    """CLOs of the whole curricula that ``ranked`` points to, within ``budget_tokens``.
+
+    Curricula are taken by how many ``ranked`` candidates they hold (ties by
+    best rank), or in the given order if ``curricula`` is set; a curriculum
+    whose block does not fit is skipped. Returns copies of the block CLOs,
+    descriptions cut at ``max_chars``, in stable order, plus stats like
+    ``pack_lines`` with ``curricula`` added.
+    """
+    if duplicates is not None and len(duplicates) != len(clos):
+        duplicates = None
+
+    hits: Dict[str, int] = {}
+    for clo in ranked:
+        key = str(clo.get("curriculum_id") or "")
+        hits[key] = hits.get(key, 0) + 1
+    # dict order is first appearance, i.e. best rank; sorted() keeps it for ties.
+    wanted = list(dict.fromkeys(curricula)) if curricula else sorted(hits, key=lambda k: -hits[k])
+
+    positions_by_curriculum: Dict[str, List[int]] = {key: [] for key in wanted}
+    for pos, clo in enumerate(clos):
+        key = str(clo.get("curriculum_id") or "")
+        if key in positions_by_curriculum:
+            positions_by_curriculum[key].append(pos)
+
+    chosen: Dict[str, List[Dict]] = {}
+    used = 0
+    n_truncated = 0
+    for key in wanted:
+        positions = positions_by_curriculum[key]
+        if duplicates is not None:
+            # One line per cluster within the curriculum, so the block does not
+            # depend on which other curricula are chosen.
+            positions = duplicates.collapse(positions, len(positions))
+        block = []
+        block_tokens = 0
+        block_truncated = 0
+        for pos in positions:
+            clo = dict(clos[pos])
+            description = clo.get("description", "") or ""
+            clo["description"] = truncate(description, max_chars)
+            block_truncated += len(description.strip()) > max_chars
+            block_tokens += count_tokens(render(clo, clo["description"])) + 1
+            block.append(clo)
+        if used + block_tokens > budget_tokens:
+            continue
+        chosen[key] = block
+        used += block_tokens
+        n_truncated += block_truncated
+
+    packed = [clo for key in sorted(chosen, key=_curriculum_sort_key) for clo in chosen[key]]
+    stats = {
+        "budget_tokens": budget_tokens,
+        "used_tokens": used,
+        "candidates": len(ranked),
+        "packed": len(packed),
+        "truncated": n_truncated,
+        "desc_max_chars": max_chars,
+        "curricula": len(chosen),
+    }
+    return packed, stats
@@ -0,0 +1,151 @@
+"""Map-reduce prompting of the grouped analysis over shards of the CLO candidates.
+
+With ``LLM_SHARD_MODE`` set, the candidates are split into ``LLM_SHARDS``
+shards. Each shard is sent as its own, smaller grouped-analysis prompt, and
+the shards run concurrently (map). The shard groups are then merged into the
+final 3-7 groups by a short prompt that lists only group names and summaries
+(reduce). No CLO lines are repeated in it. CLO picks of merged groups are
+united on the server.
+
+Shard modes:
+
+* ``curriculum``: whole curricula per shard, balanced by candidate count, so
+  each call reasons over related CLOs.
+* ``rank``: candidates dealt round-robin in ranked order, so every shard gets
+  an equal share of the strongest matches.
+"""
+import re
+from typing import Dict, List, Optional
+
+SHARD_MODES = ("off", "curriculum", "rank")
+# Groups requested per shard; the reduce step asks for the usual 3-7.
+SHARD_GROUP_RANGE = "1-3"
+MAP_GROUP_PREFIX = "m"
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def check_shard_mode(mode: str) -> str:
+    if mode not in SHARD_MODES:
+        raise Exception(f"Unknown LLM shard mode '{mode}', expected one of {SHARD_MODES}")
+    return mode
+
+
+def shard_candidates(candidates: List[Dict], n_shards: int, mode: str) -> List[List[Dict]]:
+    """Non-empty shards of the ranked ``candidates``, each kept in rank order."""
+    n_shards = max(1, min(n_shards, len(candidates)))
+    if mode == "rank":
+        shards = [candidates[i::n_shards] for i in range(n_shards)]
+        return [shard for shard in shards if shard]
+
+    # Largest curriculum first into the currently smallest shard.
+    by_curriculum: Dict[str, List[int]] = {}
+    for pos, clo in enumerate(candidates):
+        by_curriculum.setdefault(str(clo.get("curriculum_id") or ""), []).append(pos)
+    shards_pos: List[List[int]] = [[] for _ in range(n_shards)]
+    for positions in sorted(by_curriculum.values(), key=len, reverse=True):
+        min(shards_pos, key=len).extend(positions)
+    return [[candidates[pos] for pos in sorted(positions)] for positions in shards_pos if positions]
+
+
+def reduce_prompt(company_details: str, map_groups: List[Dict]) -> str:
+    lines = "\n".join(
+        f"- {MAP_GROUP_PREFIX}{i}: {g['group_name']}: {g.get('summary', '')}"
+        for i, g in enumerate(map_groups, 1)
+    )
+    return f"""You are an HR expert analyzing company requirements.
+
+Analyze this company's details:
+
+{company_details}
+
+Several analysts each grouped a different part of the course learning outcomes (CLOs) into themes of what the company is asking for. Their groups:
+
+{lines}
+
+Task:
+1) Merge these into 3-7 final groups (themes); groups about the same theme MUST be merged.
+2) Assign every group id listed above ({MAP_GROUP_PREFIX}1, {MAP_GROUP_PREFIX}2, ...) to exactly one final group.
+3) Write group_name, summary, and reasoning in Thai.
+
+Rules:
+- Return ONLY valid JSON (no markdown).
+- members must be an array of the merged group ids, e.g. ["{MAP_GROUP_PREFIX}1", "{MAP_GROUP_PREFIX}4"].
+- group_name must be a short editable Thai title.
+- summary must be 1-2 lines in Thai.
+- reasoning must be in Thai and explain why the merged groups belong together.
+
+Format:
+{{
+  "groups": [
+    {{
+      "group_name": "<short editable title>",
+      "summary": "<1-2 lines>",
+      "members": ["{MAP_GROUP_PREFIX}1", "{MAP_GROUP_PREFIX}4"],
+      "reasoning": "<why these groups belong together>"
+    }}
+  ]
+}}"""
+
+
+def _union(lists) -> List:
+    seen = set()
+    out = []
+    for items in lists:
+        for x in items:
+            key = tuple(sorted(x.items())) if isinstance(x, dict) else x
+            if key not in seen:
+                seen.add(key)
+                out.append(x)
+    return out
+
+
+def _merged_group(members: List[Dict], group_name: str, summary: str, reasoning: str) -> Dict:
+    contexts = _union(g["suggested_clo_contexts"] for g in members)
+    return {
+        "group_name": group_name or members[0]["group_name"],
+        "summary": summary or members[0]["summary"],
+        "evidence": _union(g["evidence"] for g in members)[:6],
+        "suggested_clos": _union([[ctx["clo_id"] for ctx in contexts]]),
+        "suggested_clo_contexts": contexts,
+        "reasoning": reasoning or "\n".join(_union([g["reasoning"]] for g in members if g["reasoning"])),
+    }
+
+
+def merge_groups(map_groups: List[Dict], answer: Optional[Dict] = None) -> List[Dict]:
+    """Final groups from the sanitized shard groups and the reduce ``answer``.
+
+    Without an answer (the reduce call failed), shard groups with the same
+    name are merged. Shard groups the answer leaves out are kept as they are,
+    so no CLO pick is lost. Group ids are renumbered ``grp_1``, ``grp_2``, ...
+    """
+    by_id = {f"{MAP_GROUP_PREFIX}{i}": g for i, g in enumerate(map_groups, 1)}
+    used = set()
+    merged: List[Dict] = []
+
+    items = answer.get("groups", []) if isinstance(answer, dict) else []
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict) or not isinstance(item.get("members"), list):
+            continue
+        member_ids = [str(m).strip().lower() for m in item["members"]]
+        member_ids = [m for m in dict.fromkeys(member_ids) if m in by_id and m not in used]
+        if not member_ids:
+            continue
+        used.update(member_ids)
+        merged.append(
+            _merged_group(
+                [by_id[m] for m in member_ids],
+                str(item.get("group_name", "") or "").strip(),
+                str(item.get("summary", "") or "").strip(),
+                str(item.get("reasoning", "") or "").strip(),
+            )
+        )
+
+    by_name: Dict[str, List[Dict]] = {}
+    for map_id, g in by_id.items():
+        if map_id not in used:
+            by_name.setdefault(_SPACE_RE.sub(" ", g["group_name"]).strip().lower(), []).append(g)
+    for members in by_name.values():
+        merged.append(_merged_group(members, "", "", ""))
+
+    return [dict(group_id=f"grp_{i}", **g) for i, g in enumerate(merged, 1)]
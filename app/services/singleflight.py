@@ -0,0 +1,94 @@
+"""Coalescing of identical concurrent calls ("singleflight").
+
+While a call for a key is in flight, later callers with the same key wait for
+it and receive its result (or its exception) instead of starting their own.
+Used in front of the LLM calls, keyed by the LLM cache key, so a double-click
+or several staff analysing the same company cost one LLM call.
+
+A streamed analysis runs in its client's request rather than as a task: it
+claims the key with ``lead`` and resolves the returned future when its answer
+is complete, so identical calls meanwhile wait for it as well.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Per-key sharing of in-flight coroutine results within one event loop.
+
+    The shared call runs as its own task, so a caller that is cancelled (for
+    example a client disconnecting, or the router dropping a hedged call) does
+    not cancel it for the others. Once every caller is gone, it is cancelled
+    too, rather than go on holding an LLM slot for nobody.
+    ``calls`` counts calls started, ``coalesced`` callers that joined one.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Future] = {}
+        self._waiters: Dict[asyncio.Future, int] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._tasks
+
+    def _register(self, key: str, task: asyncio.Future) -> None:
+        self.calls += 1
+        self._tasks[key] = task
+        task.add_done_callback(lambda t: self._finished(key, t))
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        while key in self._tasks:
+            result = await self.join(key)
+            if result is not None:
+                return result
+            # Its leader gave up (see lead): run the call after all.
+        task = asyncio.ensure_future(fn())
+        self._register(key, task)
+        return await self._wait(key, task)
+
+    async def join(self, key: str) -> Optional[T]:
+        """Result of the call in flight for ``key``, or ``None`` if there is none
+        (or its leader gave up)."""
+        task = self._tasks.get(key)
+        if task is None:
+            return None
+        self.coalesced += 1
+        return await self._wait(key, task)
+
+    async def _wait(self, key: str, task: asyncio.Future):
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                # A stream's future (see lead) is resolved by its leader, not cancelled.
+                if not task.done() and isinstance(task, asyncio.Task):
+                    if self._tasks.get(key) is task:
+                        # Later callers start a new call instead of joining a cancelled one.
+                        del self._tasks[key]
+                    task.cancel()
+
+    def lead(self, key: str) -> Optional[asyncio.Future]:
+        """Claim ``key`` for a call the caller makes itself, or ``None`` if one is in flight.
+
+        The caller must resolve the returned future with the call's result or
+        exception, which the callers of ``do`` and ``join`` for ``key`` then
+        receive, or with ``None`` if it gave up, which lets them call instead.
+        """
+        if key in self._tasks:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self._register(key, future)
+        return future
+
+    def _finished(self, key: str, task: asyncio.Future) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller went away.
+            task.exception()
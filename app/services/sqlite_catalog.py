@@ -0,0 +1,330 @@
+"""SQLite storage backend for the OBE catalog.
+
+The three CSV exports are imported into one SQLite file with indexes on
+``clo_id``, ``course_id``, ``curriculum_id``, ``plo_id`` and ``deleted_at``,
+and every loader filter is pushed down into an indexed query. Unlike the
+in-memory ``OBECatalog`` the tables stay on disk (only SQLite's page cache is
+held in RAM), and several uvicorn workers can read the same file. The catalog
+version is computed at import time; the search indexes (PLO hierarchy, CLO
+index, clusters, vectors) are only built when a request first needs them.
+
+Enable with ``CATALOG_BACKEND=sqlite``; the file is (re)imported on startup
+when missing or stale, or explicitly with::
+
+    python -m app.services.sqlite_catalog
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.services.catalog import (
+    CLO_COLUMNS,
+    CLO_FILE,
+    DATA_DIR,
+    MAPPING_COLUMNS,
+    MAPPING_FILE,
+    PLO_COLUMNS,
+    PLO_FILE,
+    CatalogIndexes,
+    clo_catalog_version,
+    read_csv_rows,
+    source_info,
+    sources_match,
+)
+
+
+SCHEMA_VERSION = 2
+SQLITE_FILE = "obe_catalog.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+
+CREATE TABLE clo (
+    pos INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    course_id TEXT NOT NULL,
+    course_num INTEGER,
+    curriculum_id TEXT NOT NULL DEFAULT '',
+    no TEXT NOT NULL,
+    description TEXT NOT NULL,
+    category TEXT NOT NULL,
+    deleted_at TEXT NOT NULL,
+    is_first INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE plo (
+    pos INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    curriculum_id TEXT NOT NULL,
+    curriculum_num INTEGER,
+    name TEXT NOT NULL,
+    name_en TEXT NOT NULL,
+    detail TEXT NOT NULL,
+    plo_level TEXT NOT NULL,
+    parent_plo_id TEXT NOT NULL,
+    deleted_at TEXT NOT NULL
+);
+
+CREATE TABLE mapping (
+    pos INTEGER PRIMARY KEY,
+    id TEXT NOT NULL,
+    curriculum_id TEXT NOT NULL,
+    curriculum_num INTEGER,
+    course_id TEXT NOT NULL,
+    course_num INTEGER,
+    clo_id TEXT NOT NULL,
+    plo_id TEXT NOT NULL,
+    is_map TEXT NOT NULL
+);
+"""
+
+_INDEXES = """
+CREATE INDEX idx_clo_course ON clo (course_num);
+CREATE INDEX idx_clo_deleted ON clo (deleted_at);
+CREATE INDEX idx_plo_id ON plo (id);
+CREATE INDEX idx_plo_curriculum ON plo (curriculum_num);
+CREATE INDEX idx_plo_deleted ON plo (deleted_at);
+CREATE INDEX idx_mapping_clo ON mapping (clo_id);
+CREATE INDEX idx_mapping_context ON mapping (curriculum_num, course_num);
+CREATE INDEX idx_mapping_course ON mapping (course_num);
+CREATE INDEX idx_mapping_plo ON mapping (plo_id);
+"""
+
+# Derived columns used by load_all_clos: curriculum_id comes from the last
+# mapping row for the course, and only the first (curriculum, course, clo)
+# occurrence is kept.
+_DERIVE = """
+CREATE TEMP TABLE course_curriculum AS
+SELECT course_id, curriculum_id FROM mapping WHERE pos IN (
+    SELECT MAX(pos) FROM mapping WHERE course_id != '' AND curriculum_id != '' GROUP BY course_id
+);
+CREATE INDEX temp.idx_course_curriculum ON course_curriculum (course_id);
+
+UPDATE clo SET curriculum_id = COALESCE((
+    SELECT cc.curriculum_id FROM course_curriculum cc WHERE cc.course_id = clo.course_id
+), '');
+
+UPDATE clo SET is_first = 1 WHERE pos IN (
+    SELECT MIN(pos) FROM clo WHERE deleted_at = '' GROUP BY curriculum_id, course_id, id
+);
+
+DROP TABLE temp.course_curriculum;
+"""
+
+
+def _to_int(value: str) -> Optional[int]:
+    return int(value) if value else None
+
+
+def default_sqlite_path(data_dir: Path = DATA_DIR) -> Path:
+    return data_dir / SQLITE_FILE
+
+
+def _read_only_uri(path: Path) -> str:
+    # as_uri() percent-encodes the path, so '?', '#' and '%' in it are safe.
+    return Path(path).resolve().as_uri() + "?mode=ro"
+
+
+_ALL_CLOS_COLUMNS = ('id', 'course_id', 'curriculum_id', 'no', 'description', 'category')
+_ALL_CLOS_SQL = "SELECT {columns} FROM clo WHERE is_first = 1 ORDER BY pos".format(columns=", ".join(_ALL_CLOS_COLUMNS))
+
+
+def import_csvs(data_dir: Path = DATA_DIR, output: Optional[Path] = None) -> Path:
+    """Import the CSV exports in ``data_dir`` into a fresh SQLite file."""
+    output = output or default_sqlite_path(data_dir)
+    sources = source_info(data_dir)
+
+    # Build under a per-process temp name and rename into place, so readers
+    # (and other workers importing concurrently) only ever see a complete file.
+    tmp = output.with_name(f"{output.name}.{os.getpid()}.tmp")
+    if tmp.exists():
+        tmp.unlink()
+    conn = sqlite3.connect(tmp)
+    try:
+        conn.executescript(_SCHEMA)
+        conn.executemany(
+            "INSERT INTO clo (pos, id, course_id, course_num, no, description, category, deleted_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (pos, r['id'], r['course_id'], _to_int(r['course_id']), r['no'], r['description'], r['category'], r['deleted_at'])
+                for pos, r in enumerate(read_csv_rows(data_dir / CLO_FILE, CLO_COLUMNS))
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO plo (pos, id, curriculum_id, curriculum_num, name, name_en, detail, plo_level, parent_plo_id, deleted_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (pos, r['id'], r['curriculum_id'], _to_int(r['curriculum_id']), r['name'], r['name_en'],
+                 r['detail'], r['plo_level'], r['parent_plo_id'], r['deleted_at'])
+                for pos, r in enumerate(read_csv_rows(data_dir / PLO_FILE, PLO_COLUMNS))
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO mapping (pos, id, curriculum_id, curriculum_num, course_id, course_num, clo_id, plo_id, is_map)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (pos, r['id'], r['curriculum_id'], _to_int(r['curriculum_id']), r['course_id'],
+                 _to_int(r['course_id']), r['clo_id'], r['plo_id'], r['is_map'])
+                for pos, r in enumerate(read_csv_rows(data_dir / MAPPING_FILE, MAPPING_COLUMNS))
+            ),
+        )
+        conn.executescript(_INDEXES)
+        conn.executescript(_DERIVE)
+        # Streamed from the cursor, so the CLOs are never all in memory.
+        version = clo_catalog_version(dict(zip(_ALL_CLOS_COLUMNS, row)) for row in conn.execute(_ALL_CLOS_SQL))
+        conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?)",
+            [("schema_version", str(SCHEMA_VERSION)), ("sources", json.dumps(sources)), ("version", version)],
+        )
+        conn.commit()
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    os.replace(tmp, output)
+    return output
+
+
+def _read_meta(path: Path) -> Dict[str, str]:
+    try:
+        conn = sqlite3.connect(_read_only_uri(path), uri=True)
+        try:
+            return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return {}
+
+
+def is_fresh(path: Path, data_dir: Path = DATA_DIR) -> bool:
+    """True when ``path`` is an import of the current CSVs with this schema."""
+    if not path.exists():
+        return False
+    meta = _read_meta(path)
+    if meta.get("schema_version") != str(SCHEMA_VERSION):
+        return False
+    return sources_match(json.loads(meta.get("sources") or "{}"), data_dir)
+
+
+class SQLiteCatalog(CatalogIndexes):
+    """Catalog backend answering loader queries from a SQLite import.
+
+    Exposes the same query methods as ``OBECatalog``. Each thread gets its own
+    read-only connection; because a re-import replaces the file by rename,
+    open connections keep reading the version they opened until ``close``.
+    Search index caches go to ``cache_dir`` (the CSVs' directory), as for
+    ``OBECatalog``.
+    """
+
+    def __init__(self, path: Path, cache_dir: Optional[Path] = None):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self.version = _read_meta(self.path).get("version", "")
+        self._init_indexes(cache_dir)
+
+    @classmethod
+    def open(cls, data_dir: Path = DATA_DIR, path: Optional[Path] = None) -> "SQLiteCatalog":
+        """Open ``path``, importing the CSVs first if it is missing or stale."""
+        path = Path(path) if path else default_sqlite_path(data_dir)
+        if not is_fresh(path, data_dir):
+            import_csvs(data_dir, path)
+        return cls(path, cache_dir=data_dir)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(_read_only_uri(self.path), uri=True, check_same_thread=False)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self) -> None:
+        """Close every thread's connection (the reloader calls this on a retired catalog)."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+
+    def _query(self, columns: tuple, sql: str, params: tuple = ()) -> List[Dict]:
+        cursor = self._connection().execute(sql.format(columns=", ".join(columns)), params)
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def load_clos(self, course_id: Optional[int] = None) -> List[Dict]:
+        columns = ('id', 'course_id', 'no', 'description', 'category')
+        if course_id is None:
+            return self._query(columns, "SELECT {columns} FROM clo WHERE deleted_at = '' ORDER BY pos")
+        return self._query(
+            columns,
+            "SELECT {columns} FROM clo WHERE deleted_at = '' AND (course_num = ? OR course_num IS NULL) ORDER BY pos",
+            (course_id,),
+        )
+
+    def load_all_clos(self) -> List[Dict]:
+        return self._query(_ALL_CLOS_COLUMNS, _ALL_CLOS_SQL)
+
+    def load_clo_plo_mappings(
+        self,
+        curriculum_id: Optional[int] = None,
+        course_id: Optional[int] = None,
+        clo_ids: Optional[List[str]] = None,
+        is_map_only: bool = True
+    ) -> List[Dict]:
+        where = []
+        params = []
+        if is_map_only:
+            where.append("lower(is_map) = 'true'")
+        if curriculum_id is not None:
+            where.append("(curriculum_num = ? OR curriculum_num IS NULL)")
+            params.append(curriculum_id)
+        if course_id is not None:
+            where.append("(course_num = ? OR course_num IS NULL)")
+            params.append(course_id)
+        if clo_ids is not None:
+            where.append("clo_id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(clo_ids)))
+
+        sql = "SELECT {columns} FROM mapping"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return self._query(MAPPING_COLUMNS, sql + " ORDER BY pos", tuple(params))
+
+    def load_plos(
+        self,
+        curriculum_id: Optional[int] = None,
+        plo_ids: Optional[List[str]] = None
+    ) -> List[Dict]:
+        where = ["deleted_at = ''"]
+        params = []
+        if curriculum_id is not None:
+            where.append("(curriculum_num = ? OR curriculum_num IS NULL)")
+            params.append(curriculum_id)
+        if plo_ids is not None:
+            where.append("id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(plo_ids)))
+        return self._query(
+            tuple(col for col in PLO_COLUMNS if col != 'deleted_at'),
+            "SELECT {columns} FROM plo WHERE " + " AND ".join(where) + " ORDER BY pos",
+            tuple(params),
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Import the OBE CSV exports into a SQLite catalog.")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--output", type=Path, default=None, help="SQLite path (default: <data-dir>/obe_catalog.sqlite3)")
+    args = parser.parse_args(argv)
+
+    path = import_csvs(args.data_dir, args.output)
+    print(f"Wrote {path} ({path.stat().st_size} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""Benchmark CLO->PLO mapping and PLO lookups: full scan vs. catalog indexes.
+
+The mapping and PLO tables are replicated 1x/10x/100x (with offset ids) to
+simulate a larger national dataset. The "scan" column reproduces the old
+per-row filtering with list membership tests; "indexed" is OBECatalog.
+
+Usage:
+    python -m benchmarks.bench_catalog_lookups [--scales 1 10 100] [--repeat 5]
+"""
+import argparse
+import random
+import time
+
+from app.services.catalog import (
+    CLO_COLUMNS,
+    CLO_FILE,
+    DATA_DIR,
+    MAPPING_COLUMNS,
+    MAPPING_FILE,
+    PLO_COLUMNS,
+    PLO_FILE,
+    OBECatalog,
+    read_csv_rows,
+)
+
+
+def scale_rows(rows: list[dict], factor: int, id_columns: tuple) -> list[dict]:
+    """Replicate rows ``factor`` times, shifting the given integer id columns."""
+    if factor == 1:
+        return rows
+    span = max(int(r['id']) for r in rows) + 1
+    out = []
+    for i in range(factor):
+        offset = i * span
+        for r in rows:
+            r2 = dict(r)
+            for col in id_columns:
+                if r2[col]:
+                    r2[col] = str(int(r2[col]) + offset)
+            out.append(r2)
+    return out
+
+
+def scan_mappings(rows, curriculum_id=None, course_id=None, clo_ids=None, is_map_only=True):
+    out = []
+    for row in rows:
+        if is_map_only and row['is_map'].lower() != 'true':
+            continue
+        if curriculum_id is not None and row['curriculum_id'] and int(row['curriculum_id']) != curriculum_id:
+            continue
+        if course_id is not None and row['course_id'] and int(row['course_id']) != course_id:
+            continue
+        if clo_ids is not None and row['clo_id'] not in clo_ids:
+            continue
+        out.append(dict(row))
+    return out
+
+
+def scan_plos(rows, plo_ids):
+    return [
+        {k: v for k, v in r.items() if k != 'deleted_at'}
+        for r in rows
+        if not r['deleted_at'] and r['id'] in plo_ids
+    ]
+
+
+def best_ms(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    clo_rows = read_csv_rows(DATA_DIR / CLO_FILE, CLO_COLUMNS)
+    base_plos = read_csv_rows(DATA_DIR / PLO_FILE, PLO_COLUMNS)
+    base_mappings = read_csv_rows(DATA_DIR / MAPPING_FILE, MAPPING_COLUMNS)
+    rng = random.Random(0)
+
+    print(f"{'scale':>5} {'rows':>9} {'query':<32} {'scan ms':>10} {'indexed ms':>11} {'speedup':>8}")
+    for factor in args.scales:
+        mappings = scale_rows(base_mappings, factor, ("id", "curriculum_id", "course_id", "clo_id", "plo_id"))
+        plos = scale_rows(base_plos, factor, ("id", "curriculum_id", "parent_plo_id"))
+        catalog = OBECatalog.from_rows(clo_rows=clo_rows, plo_rows=plos, mapping_rows=mappings)
+
+        sample = rng.sample(mappings, 300)
+        clo_ids = [m['clo_id'] for m in sample]
+        plo_ids = [m['plo_id'] for m in sample[:100]]
+        ctx = sample[0]
+        curriculum_id, course_id = int(ctx['curriculum_id']), int(ctx['course_id'])
+
+        cases = [
+            (
+                "mappings(clo_ids=300)",
+                lambda: scan_mappings(mappings, clo_ids=clo_ids),
+                lambda: catalog.load_clo_plo_mappings(clo_ids=clo_ids),
+            ),
+            (
+                "mappings(curriculum, course)",
+                lambda: scan_mappings(mappings, curriculum_id=curriculum_id, course_id=course_id),
+                lambda: catalog.load_clo_plo_mappings(curriculum_id=curriculum_id, course_id=course_id),
+            ),
+            (
+                "plos(plo_ids=100)",
+                lambda: scan_plos(plos, plo_ids),
+                lambda: catalog.load_plos(plo_ids=plo_ids),
+            ),
+        ]
+        for name, scan, indexed in cases:
+            assert scan() == indexed(), name
+            scan_ms = best_ms(scan, args.repeat)
+            indexed_ms = best_ms(indexed, args.repeat)
+            print(
+                f"{factor:>4}x {len(mappings):>9} {name:<32} "
+                f"{scan_ms:>10.2f} {indexed_ms:>11.3f} {scan_ms / indexed_ms:>7.0f}x"
+            )
+        del catalog, mappings, plos
+
+
+if __name__ == "__main__":
+    main()
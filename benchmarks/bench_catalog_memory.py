@@ -0,0 +1,70 @@
+"""Memory report: bytes per row of the catalog tables, dict rows vs. columnar.
+
+"dict rows" is the previous storage (one dict of stripped strings per CSV
+row, as returned by read_csv_rows); "columnar" is the ColumnTable built
+from the same rows. Both are measured with tracemalloc as the memory still
+held after construction.
+
+Usage:
+    python -m benchmarks.bench_catalog_memory
+"""
+import gc
+import tracemalloc
+
+from app.services.catalog import (
+    CLO_COLUMNS,
+    CLO_FILE,
+    DATA_DIR,
+    MAPPING_COLUMNS,
+    MAPPING_FILE,
+    PLO_COLUMNS,
+    PLO_FILE,
+    OBECatalog,
+    read_csv_rows,
+)
+from app.services.columnar import ColumnTable
+
+
+TABLES = (
+    ("clo", CLO_FILE, CLO_COLUMNS),
+    ("plo", PLO_FILE, PLO_COLUMNS),
+    ("mapping", MAPPING_FILE, MAPPING_COLUMNS),
+)
+
+
+def held_bytes(build):
+    """Bytes still allocated after ``build()``, and its result."""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, result
+
+
+def main():
+    print(f"{'table':<8} {'rows':>7} {'columns':>7} {'dict B/row':>11} {'columnar B/row':>15} {'ratio':>6}")
+    for name, filename, columns in TABLES:
+        path = DATA_DIR / filename
+        dict_bytes, rows = held_bytes(lambda: read_csv_rows(path, columns))
+
+        def build_columnar():
+            return ColumnTable.from_rows(read_csv_rows(path, columns), columns)
+
+        columnar_bytes, table = held_bytes(build_columnar)
+        n = len(rows)
+        encodings = ", ".join(f"{col}={type(c).__name__[:-6].lower()}" for col, c in table.columns.items())
+        print(
+            f"{name:<8} {n:>7} {len(columns):>7} {dict_bytes / n:>11.1f} "
+            f"{columnar_bytes / n:>15.1f} {dict_bytes / columnar_bytes:>5.1f}x"
+        )
+        print(f"         encodings: {encodings}")
+        del rows, table
+
+    total, catalog = held_bytes(lambda: OBECatalog.from_csv(DATA_DIR))
+    print(f"\nOBECatalog total (tables + indexes): {total / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""ANN (IVF) vs. exact dense search on synthetic CLO vectors.
+
+Generates ``--rows`` unit vectors (default 1M x 128 float32) clustered
+around random topics, like the real CLO vectors. Then it compares
+``IVFIndex.search`` at several ``nprobe`` settings with exact search (full
+matrix-vector product + top-k). Queries are noisy copies of random rows.
+Recall@k is the overlap with the exact top-k.
+
+Usage:
+    python -m benchmarks.bench_clo_ann [--rows 1000000] [--nprobe 1 4 16 64 128 256] [--queries 100]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.clo_ann import IVFIndex
+from app.services.clo_index import top_k_positions
+from app.services.clo_vectors import DIMENSIONS
+
+
+def synthetic_vectors(rows: int, dims: int, topics: int, rng) -> np.ndarray:
+    centres = rng.standard_normal((topics, dims), dtype=np.float32)
+    out = np.empty((rows, dims), dtype=np.float32)
+    block = 1 << 16
+    for start in range(0, rows, block):
+        n = min(block, rows - start)
+        chunk = centres[rng.integers(0, topics, n)] + 0.8 * rng.standard_normal((n, dims), dtype=np.float32)
+        out[start:start + n] = chunk / np.linalg.norm(chunk, axis=1, keepdims=True)
+    return out
+
+
+def percentile_ms(times: list, q: float) -> float:
+    return float(np.percentile(times, q)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--dims", type=int, default=DIMENSIONS)
+    parser.add_argument("--topics", type=int, default=2000)
+    parser.add_argument("--top-k", type=int, default=300)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64, 128, 256])
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    vectors = synthetic_vectors(args.rows, args.dims, args.topics, rng)
+    print(f"generated {args.rows} x {args.dims} vectors in {time.perf_counter() - start:.1f} s")
+
+    start = time.perf_counter()
+    index = IVFIndex.build(vectors)
+    print(f"built IVF with {index.n_lists} lists in {time.perf_counter() - start:.1f} s")
+
+    queries = vectors[rng.integers(0, args.rows, args.queries)] + 0.3 * rng.standard_normal(
+        (args.queries, args.dims), dtype=np.float32
+    )
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    exact, exact_times = [], []
+    for q in queries:
+        t = time.perf_counter()
+        exact.append(set(top_k_positions(vectors @ q, args.top_k)))
+        exact_times.append(time.perf_counter() - t)
+
+    print(f"{'search':<12} {f'recall@{args.top_k}':>11} {'p50 ms':>8} {'p95 ms':>8} {'scanned':>8}")
+    print(f"{'exact':<12} {1.0:>11.3f} {percentile_ms(exact_times, 50):>8.2f} {percentile_ms(exact_times, 95):>8.2f} {1.0:>8.1%}")
+    sizes = np.diff(index.offsets)
+    for nprobe in args.nprobe:
+        times, recalls, scanned = [], [], []
+        for q, truth in zip(queries, exact):
+            t = time.perf_counter()
+            found = index.search(q, args.top_k, nprobe=nprobe)
+            times.append(time.perf_counter() - t)
+            recalls.append(len(truth.intersection(found)) / len(truth))
+            probed = np.argsort(-(index.centroids @ q), kind='stable')[:nprobe]
+            scanned.append(sizes[probed].sum() / args.rows)
+        print(
+            f"{f'ivf nprobe={nprobe}':<12} {np.mean(recalls):>11.3f} {percentile_ms(times, 50):>8.2f} "
+            f"{percentile_ms(times, 95):>8.2f} {np.mean(scanned):>8.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Retrieval quality and latency of the CLO ranking modes.
+
+There are no relevance labels for company requirements, so the CLO->PLO
+mappings stand in: each sampled PLO's text (name + detail) is used as the
+query, and the CLOs mapped to that PLO are the relevant ones. Reported per
+analyzer and mode: mean recall@k of the relevant CLO ids and the median
+query time.
+
+Usage:
+    python -m benchmarks.bench_clo_retrieval [--queries 200] [--top-k 50 300]
+"""
+import argparse
+import random
+import statistics
+import time
+from collections import defaultdict
+
+from app.services.catalog import DATA_DIR, get_catalog
+from app.services.clo_index import load_clo_index
+from app.services.clo_vectors import load_clo_vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[50, 300])
+    parser.add_argument("--analyzers", nargs="+", default=["word", "ngram"])
+    args = parser.parse_args()
+
+    catalog = get_catalog()
+    clos = catalog.load_all_clos()
+    relevant = defaultdict(set)
+    for m in catalog.load_clo_plo_mappings():
+        relevant[m['plo_id']].add(m['clo_id'])
+    plos = [p for p in catalog.load_plos() if p['id'] in relevant and (p['name'] or p['detail'])]
+    sample = random.Random(0).sample(plos, min(args.queries, len(plos)))
+    queries = [(f"{p['name']} {p['detail']}", relevant[p['id']]) for p in sample]
+
+    print(f"{len(queries)} PLO queries over {len(clos)} CLOs")
+    print(f"{'analyzer':<8} {'mode':<8} {'p50 ms':>7} " + " ".join(f"{f'recall@{k}':>11}" for k in args.top_k))
+    for analyzer in args.analyzers:
+        index = load_clo_index(clos, analyzer, cache_dir=DATA_DIR)
+        vectors = load_clo_vectors(index, cache_dir=DATA_DIR)
+        rankers = {
+            "overlap": lambda q, k: index.top_k(q, k, "overlap"),
+            "bm25": lambda q, k: index.top_k(q, k, "bm25"),
+            "dense": vectors.top_k,
+        }
+        k_max = max(args.top_k)
+        for mode, rank in rankers.items():
+            times = []
+            recalls = defaultdict(list)
+            for query, wanted in queries:
+                start = time.perf_counter()
+                top = rank(query, k_max)
+                times.append((time.perf_counter() - start) * 1000)
+                for k in args.top_k:
+                    found = {clos[pos]['id'] for pos in top[:k]}
+                    recalls[k].append(len(found & wanted) / len(wanted))
+            print(
+                f"{analyzer:<8} {mode:<8} {statistics.median(times):>7.2f} "
+                + " ".join(f"{statistics.mean(recalls[k]):>11.3f}" for k in args.top_k)
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark CLO candidate selection: full re-tokenizing scan vs. CLOIndex.
+
+"scan" reproduces the old ``_select_top_clos`` ranking (tokenize every CLO
+description, intersect with the query tokens, stable full sort); "indexed"
+is ``CLOIndex.top_k`` over the prebuilt sparse term matrix; "bm25" is the
+BM25 mode over the same matrix with precomputed weights. The CLO list is
+replicated 1x/10x to simulate a larger catalog; "ties" is the number of
+distinct scores among the selected CLOs in each mode.
+
+Usage:
+    python -m benchmarks.bench_clo_selection [--scales 1 10] [--top-k 300] [--repeat 5]
+"""
+import argparse
+import time
+
+from app.services.catalog import DATA_DIR, OBECatalog
+from app.services.clo_index import CLOIndex, tokenize
+
+
+QUERIES = {
+    "short": "Data engineer with Python and SQL",
+    "company": (
+        "Company Name: Siam Analytics\n\nRequirements: data analysis, machine learning, "
+        "statistics, communication skills, teamwork, project management, database design, "
+        "cloud computing, การวิเคราะห์ข้อมูล การสื่อสาร\n\nCulture: collaborative, learning\n\n"
+        "Desired Traits: problem solving, leadership, critical thinking"
+    ),
+}
+
+
+def scan_top_k(clos: list[dict], query_text: str, top_k: int) -> list[dict]:
+    q_tokens = tokenize(query_text)
+    scored = [(len(q_tokens & tokenize(clo.get("description", ""))), clo) for clo in clos]
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return [c for _, c in scored[:top_k]]
+
+
+def best_ms(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--top-k", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    base = OBECatalog.from_csv(DATA_DIR).load_all_clos()
+
+    print(
+        f"{'scale':>5} {'clos':>8} {'query':<8} {'build ms':>9} {'scan ms':>9} {'indexed ms':>11} "
+        f"{'speedup':>8} {'bm25 ms':>8} {'ties overlap/bm25':>18}"
+    )
+    for factor in args.scales:
+        clos = base * factor
+        start = time.perf_counter()
+        index = CLOIndex.build(clos)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        for name, query in QUERIES.items():
+            def indexed():
+                return [clos[pos] for pos in index.top_k(query, args.top_k)]
+
+            def scan():
+                return scan_top_k(clos, query, args.top_k)
+
+            assert [id(c) for c in scan()] == [id(c) for c in indexed()], name
+            scan_ms = best_ms(scan, args.repeat)
+            indexed_ms = best_ms(indexed, args.repeat)
+            bm25_ms = best_ms(lambda: index.top_k(query, args.top_k, mode="bm25"), args.repeat)
+
+            distinct = {
+                mode: len(set(index.scores(query, mode)[index.top_k(query, args.top_k, mode)].tolist()))
+                for mode in ("overlap", "bm25")
+            }
+            print(
+                f"{factor:>4}x {len(clos):>8} {name:<8} {build_ms:>9.1f} "
+                f"{scan_ms:>9.2f} {indexed_ms:>11.3f} {scan_ms / indexed_ms:>7.0f}x "
+                f"{bm25_ms:>8.3f} {distinct['overlap']:>9}/{distinct['bm25']:<8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
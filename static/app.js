@@ -186,7 +186,7 @@ document.getElementById('company-form').addEventListener('submit', async (e) =>
     submitBtn.textContent = '🔄 กำลังวิเคราะห์...';
     
     try {
-        const response = await fetch(`${API_BASE}/analyze-company-grouped`, {
+        const response = await fetch(`${API_BASE}/analyze-company-grouped/stream`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -204,9 +204,36 @@ document.getElementById('company-form').addEventListener('submit', async (e) =>
             throw new Error(error.detail || 'วิเคราะห์บริษัทไม่สำเร็จ');
         }
         
-        const data = await response.json();
+        // Show each group as soon as it arrives; the final event has the full analysis.
+        const partial = {
+            company_name: companyName,
+            requirements: requirements,
+            culture: culture || null,
+            desired_traits: desiredTraits || null,
+            groups: [],
+            clo_context: [],
+            clo_plo_mappings: [],
+            mapped_plos: []
+        };
+        let data = null;
+        await readServerSentEvents(response, (event, payload) => {
+            if (event === 'group') {
+                partial.groups.push(payload.group);
+                partial.clo_context.push(...payload.clo_context);
+                partial.clo_plo_mappings.push(...payload.clo_plo_mappings);
+                partial.mapped_plos.push(...payload.mapped_plos);
+                displayGroupedAnalysisResults(partial, partial.groups.length === 1);
+            } else if (event === 'done') {
+                data = payload;
+            } else if (event === 'error') {
+                throw new Error(payload.detail || 'วิเคราะห์บริษัทไม่สำเร็จ');
+            }
+        });
+        if (!data) {
+            throw new Error('วิเคราะห์บริษัทไม่สำเร็จ');
+        }
         currentAnalysis = data;
-        displayGroupedAnalysisResults(data);
+        displayGroupedAnalysisResults(data, false);
         
     } catch (error) {
         alert(`เกิดข้อผิดพลาด: ${error.message}`);
@@ -216,7 +243,30 @@ document.getElementById('company-form').addEventListener('submit', async (e) =>
     }
 });
 
-function displayGroupedAnalysisResults(data) {
+async function readServerSentEvents(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf('\n\n')) >= 0) {
+            const block = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            let event = 'message';
+            const dataLines = [];
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) dataLines.push(line.slice(6));
+            });
+            if (dataLines.length) onEvent(event, JSON.parse(dataLines.join('\n')));
+        }
+    }
+}
+
+function displayGroupedAnalysisResults(data, scroll = true) {
     const resultSection = document.getElementById('analysis-result');
     const companyInfo = document.getElementById('company-info');
     const aiReasoning = document.getElementById('ai-reasoning');
@@ -346,7 +396,9 @@ function displayGroupedAnalysisResults(data) {
     updateUnionSummary();
 
     resultSection.style.display = 'block';
-    resultSection.scrollIntoView({ behavior: 'smooth' });
+    if (scroll) {
+        resultSection.scrollIntoView({ behavior: 'smooth' });
+    }
 
     function updateUnionSummary() {
         if (!unionSummary) return;
@@ -8,9 +8,9 @@
     
     // Patch displayGroupedAnalysisResults
     if (typeof originalDisplayGrouped === 'function') {
-        window.displayGroupedAnalysisResults = function(data) {
+        window.displayGroupedAnalysisResults = function(data, scroll) {
             // Call original function
-            originalDisplayGrouped(data);
+            originalDisplayGrouped(data, scroll);
             
             // Apply searchable dropdowns and PLO rendering
             setTimeout(() => {
@@ -0,0 +1,127 @@
+import csv
+import random
+
+import pytest
+
+from app.config import get_settings
+from app.services import llm_service
+from app.services.catalog import CLO_FILE, MAPPING_FILE, PLO_FILE
+from app.services.openai_service import OpenAIService
+
+WORDS = (
+    "design database schemas write sql queries analyse data build web applications "
+    "communicate results reports teamwork ethics machine learning models statistics "
+    "ออกแบบ ฐานข้อมูล วิเคราะห์ ข้อมูล สื่อสาร ทำงาน เป็น ทีม จริยธรรม"
+).split()
+CURRICULA = (1, 2, 3)
+COURSES = {1: (10, 11, 12), 2: (20, 21), 3: (30, 31)}
+
+# The columns of the real exports, extra ones included, in their order.
+CLO_HEADER = ("id", "created_at", "updated_at", "no", "category", "deleted_at", "course_id", "plo_id", "description")
+PLO_HEADER = ("id", "created_at", "updated_at", "name", "name_en", "detail", "plo_level", "deleted_at", "curriculum_id", "parent_plo_id")
+MAPPING_HEADER = ("id", "curriculum_id", "curriculum_has_id", "course_id", "clo_id", "plo_id", "is_map", "created_at", "updated_at")
+
+
+def _write(path, header, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=header)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({col: row.get(col, "2024-10-18 08:52:34" if col.endswith("_at") else "") for col in header})
+
+
+def write_exports(data_dir, seed=0, n_clos=300):
+    """Synthetic OBE CSV exports in ``data_dir``, with the quirks of the real ones.
+
+    There are deleted rows, blank and padded ids, CLO rows repeated, placeholder
+    descriptions, unmapped rows (is_map false) and PLO ids reused across curricula.
+    """
+    rng = random.Random(seed)
+    courses = [(cur, course) for cur in CURRICULA for course in COURSES[cur]]
+    clos = []
+    for i in range(1, n_clos + 1):
+        _, course = rng.choice(courses)
+        words = rng.sample(WORDS, rng.randint(3, 8))
+        clos.append({
+            "id": str(i),
+            "no": str(i % 5 + 1),
+            "category": rng.choice(["", "K", "S"]),
+            "deleted_at": "2024-11-01 00:00:00" if rng.random() < 0.05 else "",
+            "course_id": "" if rng.random() < 0.02 else f" {course} " if rng.random() < 0.05 else str(course),
+            "description": "888" if rng.random() < 0.05 else " ".join(words),
+        })
+    clos += [dict(clos[i]) for i in rng.sample(range(n_clos), 10)]
+
+    plos = []
+    for i in range(1, 41):
+        level = 1 if i % 4 == 1 else 2
+        plos.append({
+            "id": str(i if i <= 30 else i - 30),
+            "name": f"{i // 4 + 1}.{i % 4}",
+            "name_en": f"PLO {i}",
+            "detail": f"detail {i}",
+            "plo_level": str(level),
+            "deleted_at": "2024-11-01 00:00:00" if i % 17 == 0 else "",
+            "curriculum_id": "" if i % 13 == 0 else str(CURRICULA[i % 3]),
+            "parent_plo_id": "" if level == 1 else str(i - (i - 1) % 4),
+        })
+
+    mappings = []
+    for i in range(1, 1201):
+        cur, course = rng.choice(courses)
+        mappings.append({
+            "id": str(i),
+            "curriculum_id": "" if rng.random() < 0.05 else str(cur),
+            "curriculum_has_id": str(cur),
+            "course_id": "" if rng.random() < 0.05 else str(course),
+            "clo_id": str(rng.randint(1, n_clos + 5)),
+            "plo_id": "" if rng.random() < 0.03 else str(rng.randint(1, 30)),
+            "is_map": rng.choice(["true", "true", "true", "TRUE", "false"]),
+        })
+
+    _write(data_dir / CLO_FILE, CLO_HEADER, clos)
+    _write(data_dir / PLO_FILE, PLO_HEADER, plos)
+    _write(data_dir / MAPPING_FILE, MAPPING_HEADER, mappings)
+    return data_dir
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    return write_exports(tmp_path)
+
+
+@pytest.fixture
+def catalog_queries():
+    """Every loader query a catalog backend must answer identically, with its results."""
+
+    def run(catalog):
+        out = {
+            "clos": catalog.load_clos(),
+            "all_clos": catalog.load_all_clos(),
+            "plos": catalog.load_plos(),
+            "mappings": catalog.load_clo_plo_mappings(),
+            "mappings_all": catalog.load_clo_plo_mappings(is_map_only=False),
+        }
+        for course in (10, 21, 99):
+            out[f"clos course={course}"] = catalog.load_clos(course_id=course)
+        for cur in (1, 2, 99):
+            out[f"plos cur={cur}"] = catalog.load_plos(curriculum_id=cur)
+            out[f"plos cur={cur} ids"] = catalog.load_plos(curriculum_id=cur, plo_ids=["1", "5", "9", "404"])
+            out[f"mappings cur={cur}"] = catalog.load_clo_plo_mappings(curriculum_id=cur)
+            for course in (10, 20, 99):
+                out[f"mappings {cur}/{course}"] = catalog.load_clo_plo_mappings(cur, course)
+                out[f"mappings {cur}/{course} clos"] = catalog.load_clo_plo_mappings(cur, course, ["1", "2", "3", "7"])
+        out["mappings clos"] = catalog.load_clo_plo_mappings(clo_ids=[str(i) for i in range(1, 60)])
+        out["mappings course only"] = catalog.load_clo_plo_mappings(course_id=20)
+        out["plos ids"] = catalog.load_plos(plo_ids=["2", "3", "404"])
+        return out
+
+    return run
+
+
+@pytest.fixture
+def openai_service(monkeypatch):
+    """OpenAIService with a dummy key; nothing in these tests reaches the API."""
+    settings = get_settings().model_copy(update={"openai_api_key": "test"})
+    monkeypatch.setattr(llm_service, "get_settings", lambda: settings)
+    return OpenAIService()
@@ -0,0 +1,126 @@
+import csv
+import random
+
+import pytest
+
+from app.services import catalog as catalog_module
+from app.services.catalog import CLO_FILE, MAPPING_FILE, PLO_FILE, OBECatalog, get_catalog, set_catalog
+from app.services.csv_loader import CSVLoaderService
+
+
+class CSVScan:
+    """The loader as it was before the catalog: one scan of a CSV per query."""
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+
+    def _rows(self, filename):
+        with open(self.data_dir / filename, encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                yield {k: (v or "").strip() for k, v in row.items()}
+
+    @staticmethod
+    def _passes(value, wanted):
+        return wanted is None or not value or int(value) == wanted
+
+    def load_clos(self, course_id=None):
+        return [
+            {k: r[k] for k in ("id", "course_id", "no", "description", "category")}
+            for r in self._rows(CLO_FILE)
+            if self._passes(r["course_id"], course_id) and not r["deleted_at"]
+        ]
+
+    def load_all_clos(self):
+        course_to_curriculum = {}
+        for r in self._rows(MAPPING_FILE):
+            if r["course_id"] and r["curriculum_id"]:
+                course_to_curriculum[r["course_id"]] = r["curriculum_id"]
+        out, seen = [], set()
+        for r in self._rows(CLO_FILE):
+            if r["deleted_at"]:
+                continue
+            curriculum_id = course_to_curriculum.get(r["course_id"], "")
+            key = (curriculum_id, r["course_id"], r["id"])
+            if key not in seen:
+                seen.add(key)
+                out.append({
+                    "id": r["id"], "course_id": r["course_id"], "curriculum_id": curriculum_id,
+                    "no": r["no"], "description": r["description"], "category": r["category"],
+                })
+        return out
+
+    def load_clo_plo_mappings(self, curriculum_id=None, course_id=None, clo_ids=None, is_map_only=True):
+        return [
+            {k: r[k] for k in ("id", "curriculum_id", "course_id", "clo_id", "plo_id", "is_map")}
+            for r in self._rows(MAPPING_FILE)
+            if (not is_map_only or r["is_map"].lower() == "true")
+            and self._passes(r["curriculum_id"], curriculum_id)
+            and self._passes(r["course_id"], course_id)
+            and (clo_ids is None or r["clo_id"] in clo_ids)
+        ]
+
+    def load_plos(self, curriculum_id=None, plo_ids=None):
+        return [
+            {k: r[k] for k in ("id", "curriculum_id", "name", "name_en", "detail", "plo_level", "parent_plo_id")}
+            for r in self._rows(PLO_FILE)
+            if self._passes(r["curriculum_id"], curriculum_id)
+            and (plo_ids is None or r["id"] in plo_ids)
+            and not r["deleted_at"]
+        ]
+
+
+@pytest.fixture
+def catalog(data_dir):
+    return OBECatalog.from_csv(data_dir)
+
+
+def test_catalog_answers_like_a_csv_scan(data_dir, catalog, catalog_queries):
+    expected = catalog_queries(CSVScan(data_dir))
+    assert expected["all_clos"] and expected["mappings cur=1"]
+    assert catalog_queries(catalog) == expected
+
+
+def test_results_are_fresh_dicts(catalog):
+    first = catalog.load_all_clos()
+    first[0]["description"] = "changed"
+    first.clear()
+    assert catalog.load_all_clos()[0]["description"] != "changed"
+
+    plos = catalog.load_plos()
+    plos[0]["name"] = "changed"
+    assert catalog.load_plos()[0]["name"] != "changed"
+
+
+def test_loader_uses_the_shared_catalog(monkeypatch, catalog):
+    monkeypatch.setattr(catalog_module, "_catalog", None)
+    set_catalog(catalog)
+    assert get_catalog() is catalog
+    assert CSVLoaderService().catalog is catalog
+    assert CSVLoaderService().load_all_clos() == catalog.load_all_clos()
+
+
+def test_version_follows_the_clos(data_dir, catalog):
+    assert OBECatalog.from_csv(data_dir).version == catalog.version
+    rows = catalog.load_all_clos()
+    with open(data_dir / CLO_FILE, "a", encoding="utf-8") as f:
+        f.write(f"9999,,,1,,,{rows[0]['course_id']},,new outcome\n")
+    assert OBECatalog.from_csv(data_dir).version != catalog.version
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_indexed_lookups_match_the_scan(data_dir, catalog, seed):
+    # Random filter combinations, so each index (clo_id, context, curriculum)
+    # and the unindexed path get picked.
+    rng = random.Random(seed)
+    scan = CSVScan(data_dir)
+    curriculum_id = rng.choice([None, 1, 2, 3, 99])
+    course_id = rng.choice([None, 10, 11, 20, 30, 99])
+    clo_ids = rng.choice([None, [], [str(rng.randint(1, 310)) for _ in range(rng.randint(1, 30))]])
+    is_map_only = rng.random() < 0.7
+    plo_ids = rng.choice([None, [], [str(rng.randint(1, 35)) for _ in range(rng.randint(1, 8))]])
+
+    assert catalog.load_clo_plo_mappings(curriculum_id, course_id, clo_ids, is_map_only) == (
+        scan.load_clo_plo_mappings(curriculum_id, course_id, clo_ids, is_map_only)
+    )
+    assert catalog.load_plos(curriculum_id, plo_ids) == scan.load_plos(curriculum_id, plo_ids)
+    assert catalog.load_clos(course_id) == scan.load_clos(course_id)
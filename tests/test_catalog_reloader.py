@@ -0,0 +1,56 @@
+import pytest
+
+from app.services import catalog as catalog_module
+from app.services.catalog import CLO_FILE, get_catalog, load_catalog, set_catalog
+from app.services.catalog_reloader import CatalogReloader
+
+
+@pytest.fixture
+def current(monkeypatch, data_dir):
+    monkeypatch.setattr(catalog_module, "_catalog", None)
+    catalog = load_catalog(data_dir)
+    set_catalog(catalog)
+    return catalog
+
+
+def _append_clo(data_dir):
+    with open(data_dir / CLO_FILE, "a", encoding="utf-8") as f:
+        f.write("9999,,,1,,,10,,reloaded outcome\n")
+
+
+def test_changed_csvs_are_swapped_in(data_dir, current):
+    reloader = CatalogReloader(settle=0, data_dir=data_dir)
+    assert not reloader.check()
+
+    held = get_catalog()
+    _append_clo(data_dir)
+    assert reloader.check()
+
+    new = get_catalog()
+    assert new is not current
+    assert any(c["description"] == "reloaded outcome" for c in new.load_all_clos())
+    # A request still holding the old catalog keeps its data.
+    assert held is current
+    assert not any(c["description"] == "reloaded outcome" for c in held.load_all_clos())
+    assert not reloader.check()
+
+
+def test_failed_rebuild_keeps_the_current_catalog(data_dir, current, monkeypatch):
+    reloader = CatalogReloader(settle=0, data_dir=data_dir)
+    _append_clo(data_dir)
+    monkeypatch.setattr("app.services.catalog_reloader.load_catalog", lambda data_dir: 1 / 0)
+    assert not reloader.check()
+    assert get_catalog() is current
+
+
+def test_replaced_catalogs_are_closed_on_stop(data_dir, current, monkeypatch):
+    closed = []
+    monkeypatch.setattr(type(current), "close", lambda self: closed.append(self))
+    reloader = CatalogReloader(settle=0, data_dir=data_dir)
+    _append_clo(data_dir)
+    assert reloader.check()
+
+    reloader.close_retired()
+    assert closed == []
+    reloader.stop()
+    assert closed == [current]
@@ -0,0 +1,37 @@
+import os
+
+from app.services.catalog import CLO_FILE, OBECatalog
+from app.services.catalog_snapshot import build_snapshot, load_snapshot
+
+
+def test_round_trip_equals_the_csv_load(data_dir, catalog_queries):
+    path = build_snapshot(data_dir)
+    snapshot = load_snapshot(path, data_dir=data_dir)
+    csv_catalog = OBECatalog.from_csv(data_dir)
+
+    assert snapshot is not None
+    assert catalog_queries(snapshot) == catalog_queries(csv_catalog)
+    assert snapshot.version == csv_catalog.version
+
+
+def test_missing_or_stale_snapshot_is_not_used(data_dir):
+    assert load_snapshot(data_dir / "missing.snapshot", data_dir=data_dir) is None
+
+    path = build_snapshot(data_dir)
+    with open(data_dir / CLO_FILE, "a", encoding="utf-8") as f:
+        f.write("9999,,,1,,,10,,new outcome\n")
+    assert load_snapshot(path, data_dir=data_dir) is None
+
+
+def test_touched_but_unchanged_csvs_keep_the_snapshot(data_dir):
+    # A fresh checkout changes mtimes; the content hash still matches.
+    path = build_snapshot(data_dir)
+    st = (data_dir / CLO_FILE).stat()
+    os.utime(data_dir / CLO_FILE, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert load_snapshot(path, data_dir=data_dir) is not None
+
+
+def test_corrupt_snapshot_is_not_used(data_dir):
+    path = build_snapshot(data_dir)
+    path.write_bytes(b"not a snapshot")
+    assert load_snapshot(path, data_dir=data_dir) is None
@@ -0,0 +1,64 @@
+import re
+
+import pytest
+
+from app.services.clo_aliases import CLOAliases, alias_line, check_encoding
+from app.services.clo_dedup import CLODuplicates
+from app.services.llm_service import LLMService
+
+CLOS = [
+    {"id": "22", "curriculum_id": "9", "course_id": "9", "description": "Design database schemas"},
+    {"id": "23", "curriculum_id": "9", "course_id": "", "description": "Write SQL queries"},
+    {"id": "22", "curriculum_id": "4", "course_id": "7", "description": "Design database schemas"},
+]
+
+
+class Service(LLMService):
+    provider = "test"
+    display_name = "Test"
+
+
+def test_every_alias_in_the_prompt_resolves_to_its_candidate():
+    aliases = CLOAliases(CLOS)
+    prompt = "\n".join(alias_line(clo, clo["description"]) for clo in aliases.clos)
+    assert prompt.splitlines()[0] == "- c1: Design database schemas"
+
+    returned = re.findall(r"^- (c\d+):", prompt, re.MULTILINE)
+    assert [aliases.resolve(alias) for alias in returned] == [
+        {"clo_id": "22", "curriculum_id": 9, "course_id": 9},
+        {"clo_id": "23", "curriculum_id": 9, "course_id": 0},
+        {"clo_id": "22", "curriculum_id": 4, "course_id": 7},
+    ]
+    # The candidates themselves are not modified.
+    assert "alias" not in CLOS[0]
+
+
+@pytest.mark.parametrize("item", [" C2 ", {"alias": "c2"}, {"clo_id": "c2"}])
+def test_accepted_alias_forms(item):
+    assert CLOAliases(CLOS).resolve(item)["clo_id"] == "23"
+
+
+@pytest.mark.parametrize("item", ["c0", "c4", "22", "x1", "", None, {"clo_id": "22"}, 7])
+def test_unknown_aliases_resolve_to_nothing(item):
+    assert CLOAliases(CLOS).resolve(item) is None
+
+
+def test_alias_answer_sanitizes_like_the_full_answer():
+    aliases = CLOAliases(CLOS)
+    duplicates = CLODuplicates.build(CLOS, threshold=0)
+    full = [{"group_id": "g", "suggested_clos": [
+        {"clo_id": "22", "curriculum_id": 4, "course_id": 7},
+        {"clo_id": "23", "curriculum_id": 9, "course_id": 0},
+    ]}]
+    aliased = [{"group_id": "g", "suggested_clos": ["c3", "c2", "c9"]}]
+
+    service = Service()
+    assert service._sanitize_groups(aliased, CLOS, aliases, duplicates) == (
+        service._sanitize_groups(full, CLOS, None, duplicates)
+    )
+
+
+def test_unknown_encoding_is_rejected():
+    assert check_encoding("alias") == "alias"
+    with pytest.raises(Exception, match="Unknown CLO prompt encoding"):
+        check_encoding("short")
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from app.services.clo_ann import IVFIndex
+from app.services.clo_index import top_k_positions
+from benchmarks.bench_clo_ann import synthetic_vectors
+
+ROWS, DIMS, K = 5000, 32, 50
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(0)
+    vectors = synthetic_vectors(ROWS, DIMS, 50, rng)
+    queries = vectors[rng.integers(0, ROWS, 20)] + 0.3 * rng.standard_normal((20, DIMS), dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return vectors, IVFIndex.build(vectors), queries
+
+
+def test_recall_against_exact_search(data):
+    vectors, index, queries = data
+    recalls = []
+    for q in queries:
+        exact = set(top_k_positions(vectors @ q, K))
+        recalls.append(len(exact.intersection(index.search(q, K, nprobe=index.n_lists // 4))) / K)
+    assert np.mean(recalls) >= 0.9
+
+
+def test_probing_every_list_is_exact(data):
+    vectors, index, queries = data
+    for q in queries:
+        assert index.search(q, K, nprobe=index.n_lists) == top_k_positions(vectors @ q, K)
+
+
+def test_few_probed_vectors_still_fill_k(data):
+    _, index, queries = data
+    assert len(index.search(queries[0], 1000, nprobe=1)) == 1000
+
+
+def test_zero_query_is_catalog_order(data):
+    vectors, index, _ = data
+    assert index.search(np.zeros(DIMS, dtype=np.float32), K) == top_k_positions(np.zeros(ROWS), K)
+
+
+def test_save_and_load(data, tmp_path):
+    vectors, index, queries = data
+    path = tmp_path / "ivf.npz"
+    index.save(path, "v1")
+
+    assert IVFIndex.load(path, "v2", vectors) is None
+    loaded = IVFIndex.load(path, "v1", vectors)
+    assert loaded.search(queries[0], K, nprobe=4) == index.search(queries[0], K, nprobe=4)
@@ -0,0 +1,68 @@
+import pytest
+
+from app.services.clo_dedup import CLODuplicates, load_clo_duplicates
+from app.services.llm_service import LLMService
+
+SQL = "Design relational database schemas and write SQL queries"
+CLOS = [
+    {"id": "1", "curriculum_id": "1", "course_id": "1", "description": SQL},
+    {"id": "2", "curriculum_id": "1", "course_id": "2", "description": SQL + "."},
+    {"id": "3", "curriculum_id": "2", "course_id": "3", "description": SQL},
+    {"id": "4", "curriculum_id": "2", "course_id": "4", "description": "Communicate results in written reports"},
+    {"id": "5", "curriculum_id": "2", "course_id": "5", "description": "888"},
+    {"id": "6", "curriculum_id": "2", "course_id": "6", "description": "888"},
+]
+
+
+class Service(LLMService):
+    provider = "test"
+    display_name = "Test"
+
+
+def ctx(clo_id, curriculum_id, course_id):
+    return {"clo_id": clo_id, "curriculum_id": curriculum_id, "course_id": course_id}
+
+
+def test_default_setting_leaves_picks_unchanged(tmp_path):
+    # CLO_DEDUP_THRESHOLD defaults to 0: no clusters, no expansion.
+    duplicates = load_clo_duplicates(CLOS, cache_dir=tmp_path)
+    assert duplicates.n_clusters == len(CLOS)
+    picks = [ctx("1", 999, 1), ctx("4", 2, 4)]
+    assert duplicates.expand_contexts(picks) == picks
+
+
+def test_default_setting_end_to_end_through_sanitize():
+    duplicates = load_clo_duplicates(CLOS)
+    answer = [{"group_id": "grp_1", "suggested_clos": [{"clo_id": "1", "curriculum_id": 999, "course_id": 1}]}]
+    group = Service()._sanitize_groups(answer, CLOS, None, duplicates)[0]
+    assert group["suggested_clos"] == ["1"]
+    assert group["suggested_clo_contexts"] == [ctx("1", 999, 1)]
+
+
+def test_clusters_and_placeholders():
+    duplicates = CLODuplicates.build(CLOS, threshold=0.8)
+    assert duplicates.labels.tolist() == [0, 0, 0, 3, 4, 5]
+    assert duplicates.collapse(range(len(CLOS))) == [0, 3, 4, 5]
+
+
+def test_expansion_adds_only_the_other_members():
+    duplicates = CLODuplicates.build(CLOS, threshold=0.8)
+    assert duplicates.expand_contexts([ctx("2", 1, 2)], limit=10) == [ctx("2", 1, 2), ctx("1", 1, 1), ctx("3", 2, 3)]
+    assert duplicates.expand_contexts([ctx("1", 1, 1)], limit=1) == [ctx("1", 1, 1), ctx("2", 1, 2)]
+    assert duplicates.expand_contexts([ctx("4", 2, 4)], limit=10) == [ctx("4", 2, 4)]
+    assert duplicates.expand_contexts([ctx("1", 1, 1)], limit=0) == [ctx("1", 1, 1)]
+
+
+def test_pick_in_a_wrong_context_is_not_added_again():
+    duplicates = CLODuplicates.build(CLOS, threshold=0.8)
+    expanded = duplicates.expand_contexts([ctx("1", 999, 1)], limit=10)
+    assert expanded == [ctx("1", 999, 1), ctx("2", 1, 2), ctx("3", 2, 3)]
+    assert [c["clo_id"] for c in expanded].count("1") == 1
+
+
+@pytest.mark.parametrize("threshold", [0.0, 0.8])
+def test_saved_clusters_keep_their_threshold(tmp_path, threshold):
+    first = load_clo_duplicates(CLOS, threshold=threshold, cache_dir=tmp_path)
+    again = load_clo_duplicates(CLOS, threshold=threshold, cache_dir=tmp_path)
+    assert again.labels.tolist() == first.labels.tolist()
+    assert again.threshold == threshold
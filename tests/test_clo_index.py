@@ -0,0 +1,147 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from app.services.catalog import OBECatalog
+from app.services.clo_index import (
+    CLOIndex,
+    index_cache_path,
+    load_clo_index,
+    ngram_tokens,
+    tokenize,
+    tokens,
+    top_k_positions,
+)
+
+
+@pytest.fixture
+def clos(data_dir):
+    return OBECatalog.from_csv(data_dir).load_all_clos()
+
+
+def queries(clos, seed, n=20):
+    """Random mixes of words from the descriptions, plus queries matching nothing."""
+    words = sorted({w for clo in clos for w in clo["description"].split()})
+    rng = random.Random(seed)
+    return [" ".join(rng.sample(words, rng.randint(1, 6))) for _ in range(n)] + ["", "nothing matches this"]
+
+
+def overlap_ranking(clos, query, k):
+    """What _select_top_clos did before the index: score every CLO, stable sort."""
+    q = tokenize(query)
+    scored = sorted(range(len(clos)), key=lambda pos: -len(q & tokenize(clos[pos]["description"])))
+    return scored[:k]
+
+
+@pytest.mark.parametrize("k", [1, 10, 300, 10_000])
+def test_overlap_top_k_matches_a_full_scan(clos, k):
+    index = CLOIndex.build(clos)
+    for query in queries(clos, k):
+        assert index.top_k(query, k) == overlap_ranking(clos, query, k)
+
+
+def test_select_top_clos_is_the_same_with_and_without_the_index(clos, openai_service):
+    index = CLOIndex.build(clos)
+    for query in queries(clos, 0):
+        with_index = openai_service._select_top_clos(clos, query, top_k=50, index=index)
+        scan = openai_service._select_top_clos(clos, query, top_k=50)
+        assert with_index == scan
+
+
+def test_top_k_positions():
+    scores = [1.0, 3.0, 3.0, 0.0, 2.0, 3.0]
+    assert top_k_positions(np.array(scores), 3) == [1, 2, 5]
+    assert top_k_positions(np.array(scores), 4) == [1, 2, 5, 4]
+    assert top_k_positions(np.array(scores), 10) == [1, 2, 5, 4, 0, 3]
+    assert top_k_positions(np.array(scores), 0) == []
+
+
+def test_cached_index_is_reused_until_the_descriptions_change(clos, tmp_path):
+    built = load_clo_index(clos, "word", cache_dir=tmp_path)
+    assert index_cache_path(tmp_path, "word").exists()
+    loaded = load_clo_index(clos, "word", cache_dir=tmp_path)
+    assert loaded.term_ids == built.term_ids
+    assert loaded.top_k("design sql", 20) == built.top_k("design sql", 20)
+
+    changed = [dict(c) for c in clos]
+    changed[0]["description"] = "quantum chemistry"
+    assert load_clo_index(changed, "word", cache_dir=tmp_path).top_k("quantum", 1) == [0]
+
+
+def bm25_reference(clos, query, k1=1.2, b=0.75):
+    """Okapi BM25 of every description, term by term in plain Python."""
+    docs = [tokens(clo["description"]) for clo in clos]
+    n = len(docs)
+    avg_len = sum(map(len, docs)) / n
+    out = []
+    for doc in docs:
+        score = 0.0
+        for term in set(tokens(query)):
+            tf = doc.count(term)
+            if not tf:
+                continue
+            df = sum(term in d for d in docs)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / avg_len))
+        out.append(score)
+    return out
+
+
+def test_bm25_scores_match_the_formula(clos):
+    index = CLOIndex.build(clos)
+    for query in queries(clos, 1, n=5):
+        expected = bm25_reference(clos, query)
+        assert index.scores(query, "bm25") == pytest.approx(expected, rel=1e-5, abs=1e-6)
+        assert index.top_k(query, 30, mode="bm25") == top_k_positions(np.array(index.scores(query, "bm25")), 30)
+
+
+def test_bm25_weighs_rare_terms_higher():
+    clos = [
+        {"description": "sql sql data data data"},
+        {"description": "sql"},
+        {"description": "data data data data data data data data"},
+        {"description": "data"},
+    ]
+    index = CLOIndex.build(clos)
+    # The rarer term counts for more (1 over 3, same length); overlap only
+    # counts terms.
+    scores = index.scores("sql data", "bm25")
+    assert scores[1] > scores[3]
+    assert index.top_k("sql data", 2, mode="bm25") == [0, 1]
+    assert index.scores("sql data", "overlap").tolist() == [2, 1, 1, 1]
+
+
+def test_unknown_mode_is_rejected(clos):
+    with pytest.raises(ValueError):
+        CLOIndex.build(clos).scores("sql", "tfidf")
+
+
+def test_ngram_tokens():
+    assert ngram_tokens("SQL ข้อมูล x") == ["sql", "ข้อ", "้อม", "อมู", "มูล"]
+    assert ngram_tokens("ทีม") == ["ทีม"]
+    assert ngram_tokens("") == []
+
+
+def test_ngram_analyzer_matches_thai_inside_longer_clauses():
+    clos = [
+        {"description": "ออกแบบฐานข้อมูลเชิงสัมพันธ์"},
+        {"description": "การสื่อสารในทีม"},
+        {"description": "database design"},
+    ]
+    # Thai has no spaces: the word analyzer sees each clause as one term.
+    assert CLOIndex.build(clos, "word").scores("ฐานข้อมูล").tolist() == [0, 0, 0]
+    ngram = CLOIndex.build(clos, "ngram")
+    assert ngram.top_k("ฐานข้อมูล", 1) == [0]
+    assert ngram.top_k("สื่อสาร", 1) == [1]
+    assert ngram.top_k("database", 1) == [2]
+
+
+def test_each_analyzer_has_its_own_cache(clos, tmp_path):
+    word = load_clo_index(clos, "word", cache_dir=tmp_path)
+    ngram = load_clo_index(clos, "ngram", cache_dir=tmp_path)
+    assert index_cache_path(tmp_path, "word") != index_cache_path(tmp_path, "ngram")
+    assert load_clo_index(clos, "ngram", cache_dir=tmp_path).term_ids == ngram.term_ids
+    assert load_clo_index(clos, "word", cache_dir=tmp_path).term_ids == word.term_ids
+    assert ngram.term_ids != word.term_ids
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from app.services.catalog import OBECatalog
+from app.services.clo_index import load_clo_index, top_k_positions
+from app.services.clo_vectors import CLOVectors, load_clo_vectors
+
+
+@pytest.fixture
+def index(data_dir):
+    return load_clo_index(OBECatalog.from_csv(data_dir).load_all_clos(), "word", cache_dir=data_dir)
+
+
+def test_vectors_are_unit_length_and_rank_exactly(index):
+    vectors = CLOVectors.build(index)
+    norms = np.linalg.norm(vectors.docs, axis=1)
+    assert np.allclose(norms[norms > 0], 1.0, atol=1e-5)
+
+    for query in ("design database sql", "ออกแบบ ฐานข้อมูล", "teamwork ethics reports"):
+        scores = vectors.scores(query)
+        assert vectors.top_k(query, 25) == top_k_positions(scores, 25)
+        assert scores.max() <= 1.0 + 1e-5
+
+
+def test_own_description_ranks_near_the_top(index, data_dir):
+    clos = OBECatalog.from_csv(data_dir).load_all_clos()
+    vectors = CLOVectors.build(index)
+    hits = 0
+    sample = range(0, len(clos), 15)
+    for pos in sample:
+        if clos[pos]["description"] != "888":
+            hits += pos in vectors.top_k(clos[pos]["description"], 10)
+    assert hits >= 0.8 * sum(clos[pos]["description"] != "888" for pos in sample)
+
+
+def test_unknown_terms_embed_to_zero(index):
+    vectors = CLOVectors.build(index)
+    assert not vectors.embed("zzz qqq").any()
+    assert vectors.top_k("zzz qqq", 5) == [0, 1, 2, 3, 4]
+
+
+def test_saved_vectors_are_memory_mapped_and_rank_the_same(index, data_dir):
+    built = load_clo_vectors(index, cache_dir=data_dir, ann_min_rows=0)
+    loaded = CLOVectors.load(index, data_dir)
+    assert isinstance(loaded.docs, np.memmap)
+    assert loaded.top_k("sql queries", 20) == built.top_k("sql queries", 20)
+
+    other = load_clo_index([{"description": "something else"}], "word")
+    other.fingerprint = "another catalog"
+    assert CLOVectors.load(other, data_dir) is None
+
+
+def test_ann_is_attached_for_large_catalogs(index, data_dir):
+    vectors = load_clo_vectors(index, cache_dir=data_dir, ann_min_rows=1, nprobe=10_000)
+    assert vectors.ann is not None
+    exact = CLOVectors.build(index)
+    assert vectors.top_k("design database sql", 20) == exact.top_k("design database sql", 20)
@@ -0,0 +1,46 @@
+import random
+import sys
+
+import pytest
+
+from app.services.columnar import CategoricalColumn, ColumnTable, IntColumn, StringColumn, encode_column
+
+
+@pytest.mark.parametrize("values, kind", [
+    ([str(i) for i in range(1000)], IntColumn),
+    ([str(i) if i % 7 else "" for i in range(1000)], IntColumn),
+    (["true", "false", "TRUE", ""] * 50, CategoricalColumn),
+    ([f"description {i}" for i in range(1000)], StringColumn),
+    # Text that parses as an integer but would not print back the same.
+    ([str(i) for i in range(999)] + ["007"], StringColumn),
+    ([str(i) for i in range(999)] + ["-1"], StringColumn),
+    ([str(i) for i in range(999)] + [" 5"], StringColumn),
+])
+def test_every_encoding_round_trips(values, kind):
+    column = encode_column(values, {})
+    assert isinstance(column, kind)
+    assert column.take(range(len(values))) == values
+    assert [column[i] for i in range(len(values))] == values
+
+
+def test_table_records_and_int_values():
+    rng = random.Random(0)
+    names = ("id", "course_id", "is_map", "description")
+    rows = [
+        {
+            "id": str(i),
+            "course_id": "" if i % 11 == 0 else str(rng.randint(1, 5000)),
+            "is_map": rng.choice(["true", "false"]),
+            "description": rng.choice(["ออกแบบฐานข้อมูล", "write SQL", "888"]) + str(i % 3),
+        }
+        for i in range(1, 2001)
+    ]
+    table = ColumnTable.from_rows(rows, names)
+    positions = sorted(rng.sample(range(len(rows)), 50))
+
+    assert table.records(names, positions) == [rows[p] for p in positions]
+    assert table.records(names, range(len(rows))) == rows
+    assert list(table.int_values("course_id")) == [int(r["course_id"]) if r["course_id"] else -1 for r in rows]
+    # Much smaller than the row dicts it replaces.
+    dict_bytes = sum(sys.getsizeof(r) + sum(sys.getsizeof(v) for v in r.values()) for r in rows)
+    assert table.nbytes() < dict_bytes / 2
@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+from app.services.catalog import OBECatalog
+from app.services.csv_loader import CSVLoaderService
+
+CURRICULA = (1, 2, 3)
+COURSES = {1: (10, 11), 2: (20, 21), 3: (30,)}
+
+
+def _row(**values):
+    return {k: str(v) if v is not None else "" for k, v in values.items()}
+
+
+@pytest.fixture(scope="module")
+def loader(tmp_path_factory):
+    """A small catalog with blank, unmapped and cross-curriculum rows mixed in."""
+    rng = random.Random(0)
+    courses = [(cur, course) for cur in CURRICULA for course in COURSES[cur]]
+    clo_rows, plo_rows, mapping_rows = [], [], []
+    for i in range(60):
+        _, course = courses[i % len(courses)]
+        clo_rows.append(_row(id=i, course_id=course, no=i % 5 + 1, description=f"CLO {i}", category="", deleted_at=None))
+    for i in range(30):
+        # PLO ids repeat across curricula, and some PLOs have no curriculum.
+        curriculum = "" if i % 10 == 9 else CURRICULA[i % len(CURRICULA)]
+        plo_rows.append(_row(
+            id=i % 12, curriculum_id=curriculum, name=f"PLO{i}", name_en=f"PLO {i}",
+            detail="", plo_level=1, parent_plo_id=None, deleted_at=None,
+        ))
+    for i in range(400):
+        cur, course = rng.choice(courses)
+        mapping_rows.append(_row(
+            id=i,
+            curriculum_id="" if rng.random() < 0.1 else cur,
+            course_id="" if rng.random() < 0.1 else course,
+            clo_id=rng.randrange(70),
+            plo_id="" if rng.random() < 0.05 else rng.randrange(12),
+            is_map="true" if rng.random() < 0.8 else "false",
+        ))
+    catalog = OBECatalog.from_rows(clo_rows, plo_rows, mapping_rows, cache_dir=tmp_path_factory.mktemp("catalog"))
+    return CSVLoaderService(catalog)
+
+
+def _baseline(loader, contexts):
+    """What get_plos_for_clo_contexts did before batching: one lookup per context group."""
+    groups = {}
+    for ctx in contexts:
+        groups.setdefault((ctx["curriculum_id"], ctx["course_id"]), []).append(ctx["clo_id"])
+    plos, seen, mapping_ids = [], set(), set()
+    for (curriculum_id, course_id), clo_ids in groups.items():
+        for m in loader.load_clo_plo_mappings(curriculum_id, course_id, clo_ids, is_map_only=True):
+            mapping_ids.add(m["id"])
+        for plo in loader.get_plos_for_clos(clo_ids, curriculum_id, course_id):
+            key = (plo["id"], plo["curriculum_id"])
+            if key not in seen:
+                seen.add(key)
+                plos.append(plo)
+    return plos, mapping_ids
+
+
+def _contexts(rng, n):
+    contexts = []
+    for _ in range(n):
+        curriculum_id = rng.choice(CURRICULA + (None,))
+        course_id = rng.choice(COURSES.get(curriculum_id, (10, 21, 30)) + (None,))
+        contexts.append({"clo_id": str(rng.randrange(75)), "curriculum_id": curriculum_id, "course_id": course_id})
+    return contexts
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_resolve_matches_per_group_lookups(loader, seed):
+    rng = random.Random(seed)
+    contexts = _contexts(rng, rng.randrange(1, 40))
+    plos, mapping_ids = _baseline(loader, contexts)
+
+    resolved = loader.resolve_clo_contexts(contexts)
+
+    assert resolved["plos"] == plos
+    assert loader.get_plos_for_clo_contexts(contexts) == plos
+    assert [m["id"] for m in resolved["mappings"]] == sorted(mapping_ids, key=int)
+
+
+def test_none_context_matches_any_curriculum_and_course(loader):
+    clo_id = loader.load_clo_plo_mappings(is_map_only=True)[0]["clo_id"]
+    contexts = [{"clo_id": clo_id, "curriculum_id": None, "course_id": None}]
+    plos, _ = _baseline(loader, contexts)
+
+    assert plos
+    assert loader.resolve_clo_contexts(contexts)["plos"] == plos
+
+
+def test_no_contexts(loader):
+    assert loader.resolve_clo_contexts([]) == {"plos": [], "mappings": []}
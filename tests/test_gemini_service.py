@@ -0,0 +1,98 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.gemini_service import GeminiService, _StreamReader
+
+
+class FakeResponse:
+    """A streamed response whose reads block like gRPC reads until more is sent."""
+
+    def __init__(self, texts, then_wait=True, error=None):
+        self.texts = list(texts)
+        self.then_wait = then_wait
+        self.error = error
+        self.read_cancelled = False
+
+    async def __aiter__(self):
+        for text in self.texts:
+            yield SimpleNamespace(text=text, usage_metadata=SimpleNamespace(
+                prompt_token_count=10, cached_content_token_count=0, candidates_token_count=len(text),
+            ))
+        if self.error is not None:
+            raise self.error
+        if self.then_wait:
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                self.read_cancelled = True
+                raise
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = GeminiService()
+    service.response = None
+
+    async def generate_content_async(prompt, **kwargs):
+        return service.response
+
+    monkeypatch.setattr(service.model, "generate_content_async", generate_content_async)
+    return service
+
+
+def test_complete_stream(service):
+    service.response = FakeResponse(['{"groups": ', "[]}"], then_wait=False)
+
+    async def run():
+        return [text async for text in service._stream_text("prompt")]
+
+    assert asyncio.run(run()) == ['{"groups": ', "[]}"]
+    assert service.scheduler.active == 0
+    assert service.usage.stats()["calls"] == 1
+
+
+def test_closing_early_cancels_the_upstream_read(service):
+    service.response = FakeResponse(['{"groups": [', '{"group_id": "grp_1"}'])
+
+    async def run():
+        stream = service._stream_text("prompt")
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(run()) == '{"groups": ['
+    assert service.response.read_cancelled
+    assert service.scheduler.active == 0
+
+
+def test_cancelled_consumer_cancels_the_upstream_read(service):
+    service.response = FakeResponse(['{"groups": ['])
+
+    async def run():
+        async def consume():
+            async for _ in service._stream_text("prompt"):
+                pass
+
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.wait({task})
+
+    asyncio.run(run())
+    assert service.response.read_cancelled
+    assert service.scheduler.active == 0
+
+
+def test_upstream_errors_reach_the_reader():
+    async def run():
+        reader = _StreamReader(FakeResponse(["a"], error=RuntimeError("reset")))
+        chunks = []
+        with pytest.raises(RuntimeError, match="reset"):
+            async for chunk in reader:
+                chunks.append(chunk.text)
+        await reader.aclose()
+        return chunks
+
+    assert asyncio.run(run()) == ["a"]
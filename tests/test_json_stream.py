@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+from app.services.json_stream import GroupsStream
+
+ANSWER = {
+    "groups": [
+        {"group_id": "grp_1", "group_name": "Data {and} [brackets]", "suggested_clos": ["1", "2"]},
+        {"group_id": "grp_2", "group_name": 'Quotes \\" and \\\\ escapes', "suggested_clos": []},
+        {"group_id": "grp_3", "group_name": "ข้อมูล", "suggested_clos": ["3"], "nested": {"groups": [1]}},
+    ]
+}
+
+
+def _feed(text, size):
+    stream = GroupsStream()
+    groups = []
+    for i in range(0, len(text), size):
+        groups.extend(stream.feed(text[i:i + size]))
+    return stream, groups
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, 10_000])
+def test_any_chunking_matches_full_parse(size):
+    text = json.dumps(ANSWER, ensure_ascii=False, indent=2)
+    stream, groups = _feed(text, size)
+
+    assert groups == ANSWER["groups"]
+    assert stream.done
+    assert stream.groups == 3
+    assert stream.text == text
+
+
+def test_fences_and_preamble_are_skipped():
+    text = "Here is the analysis:\n```json\n" + json.dumps(ANSWER) + "\n```\nDone."
+    stream, groups = _feed(text, 5)
+
+    assert groups == ANSWER["groups"]
+    assert stream.done
+
+
+def test_bare_array():
+    _, groups = _feed(json.dumps(ANSWER["groups"]), 4)
+    assert groups == ANSWER["groups"]
+
+
+def test_raw_newline_inside_string():
+    text = '{"groups": [{"group_id": "grp_1", "group_name": "line one\nline two"}]}'
+    _, groups = _feed(text, 3)
+    assert groups == [{"group_id": "grp_1", "group_name": "line one\nline two"}]
+
+
+def test_other_arrays_are_not_groups():
+    text = '{"notes": [{"a": 1}], "groups": [{"group_id": "grp_1"}]}'
+    _, groups = _feed(text, 2)
+    assert groups == [{"group_id": "grp_1"}]
+
+
+def test_truncated_answer_keeps_complete_groups():
+    text = json.dumps(ANSWER)
+    cut = text.index('{"group_id": "grp_3"') + 10
+    stream, groups = _feed(text[:cut], 6)
+
+    assert groups == ANSWER["groups"][:2]
+    assert not stream.done
+
+
+def test_unparseable_group_is_skipped():
+    text = '{"groups": [{"group_id": grp_1}, {"group_id": "grp_2"}]}'
+    stream, groups = _feed(text, 4)
+
+    assert groups == [{"group_id": "grp_2"}]
+    assert stream.done
+
+
+def test_nothing_after_done():
+    stream = GroupsStream()
+    assert stream.feed('{"groups": []}') == []
+    assert stream.done
+    assert stream.feed('{"groups": [{"group_id": "x"}]}') == []
@@ -0,0 +1,69 @@
+import pytest
+
+from app.services import llm_cache
+from app.services.llm_cache import LLMCache, cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache, "time", clock)
+    return clock
+
+
+def key(prompt="Analyse Acme", **overrides):
+    fields = {"provider": "openai", "model": "gpt", "catalog_version": "v1", "kind": "grouped", "prompt": prompt}
+    return cache_key(**{**fields, **overrides})
+
+
+def test_key_ignores_whitespace_but_not_content():
+    assert key("Analyse  Acme\n") == key(" Analyse Acme")
+    assert key("Analyse Acme") != key("Analyse Acme Ltd")
+    for field in ("provider", "model", "catalog_version", "kind"):
+        assert key(**{field: "other"}) != key()
+
+
+def test_answers_survive_a_new_cache_on_the_same_file(tmp_path, clock):
+    path = tmp_path / "cache.sqlite3"
+    answer = {"groups": [{"group_name": "ข้อมูล", "suggested_clos": ["1"]}]}
+    LLMCache(path, max_entries=10, ttl=60).put(key(), answer)
+
+    cache = LLMCache(path, max_entries=10, ttl=60)
+    assert cache.get(key()) == answer
+    assert cache.get(key("other")) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = LLMCache(tmp_path / "cache.sqlite3", max_entries=10, ttl=60)
+    cache.put(key(), {"groups": []})
+    clock.now += 60
+    assert cache.get(key()) is not None
+    clock.now += 1
+    assert cache.get(key()) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_read_entries_are_evicted(tmp_path, clock):
+    cache = LLMCache(tmp_path / "cache.sqlite3", max_entries=2, ttl=0)
+    for name in ("a", "b"):
+        clock.now += 1
+        cache.put(key(name), {"name": name})
+    clock.now += 1
+    cache.get(key("a"))
+    clock.now += 1
+    cache.put(key("c"), {"name": "c"})
+
+    assert cache.get(key("b")) is None
+    assert cache.get(key("a")) == {"name": "a"}
+    assert cache.get(key("c")) == {"name": "c"}
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
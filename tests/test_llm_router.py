@@ -0,0 +1,325 @@
+import asyncio
+import json
+from contextlib import aclosing
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import get_settings
+from app.services import llm_router, llm_service
+from app.services.clo_dedup import CLODuplicates
+from app.services.llm_cache import LLMCache
+from app.services.llm_router import CircuitBreaker, LLMRouter
+from app.services.llm_scheduler import LLMOverloaded
+from app.services.llm_service import LLMService
+from app.services.llm_usage import LLMUsage
+from app.services.singleflight import SingleFlight
+
+GROUP = {"group_id": "grp_1", "group_name": "Data", "suggested_clos": ["1"]}
+
+
+@pytest.fixture
+def router_settings(monkeypatch):
+    """Router settings with ``overrides``; no backoff or hedging unless asked."""
+
+    def make(**overrides):
+        values = {"llm_retry_backoff": 0.0, "llm_hedge_quantile": 0.0, **overrides}
+        settings = get_settings().model_copy(update=values)
+        monkeypatch.setattr(llm_router, "get_settings", lambda: settings)
+        return settings
+
+    return make
+
+
+class FakeService:
+    """Answers (or fails) every call the same way, counting the calls."""
+
+    def __init__(self, name, answer=None, error=None, delay=0.0):
+        self.usage = LLMUsage(name)
+        self.scheduler = SimpleNamespace(stats=lambda: {"provider": name})
+        self.answer = answer if answer is not None else {"groups": [GROUP]}
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+
+    async def suggest_grouped_clos_for_company(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.answer
+
+    async def stream_grouped_clos_for_company(self, **kwargs):
+        answer = await self.suggest_grouped_clos_for_company(**kwargs)
+        for group in answer["groups"]:
+            yield {"group": group}
+        yield {"prompt_stats": None}
+
+
+class SharedService(FakeService):
+    """A slow call behind SingleFlight, like the real services."""
+
+    def __init__(self, name, delay=10.0):
+        super().__init__(name, delay=delay)
+        self._inflight = SingleFlight()
+        self.cancelled = False
+
+    async def suggest_grouped_clos_for_company(self, **kwargs):
+        return await self._inflight.do("key", self._call)
+
+    async def _call(self):
+        try:
+            return await super().suggest_grouped_clos_for_company()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+class StubService(LLMService):
+    """LLMService with a fixed prepared request and a counted fake LLM call."""
+
+    provider = "stub"
+    display_name = "Stub"
+
+    def __init__(self, groups):
+        super().__init__()
+        self.model_name = "stub-1"
+        self.groups = groups
+        self.calls = 0
+
+    def _prepare_grouped(self, company_name, requirements, culture=None, desired_traits=None):
+        return {
+            "prompt": company_name,
+            "company_details": company_name,
+            "clo_definitions": [],
+            "aliases": None,
+            "clo_duplicates": CLODuplicates.build([], threshold=0),
+            "prompt_stats": None,
+            "shards": [],
+            "key": self._cache_key("grouped", company_name, "v1"),
+        }
+
+    async def _complete_grouped(self, prompt, clo_definitions, aliases, clo_duplicates):
+        self.calls += 1
+        return {"groups": list(self.groups)}
+
+    async def _stream_text(self, prompt):
+        self.calls += 1
+        yield json.dumps({"groups": list(self.groups)})
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = LLMCache(tmp_path / "llm_cache.sqlite3", max_entries=100, ttl=3600)
+    monkeypatch.setattr(llm_service, "get_llm_cache", lambda: cache)
+    return cache
+
+
+def grouped(router, **kwargs):
+    return asyncio.run(router.suggest_grouped_clos_for_company(company_name="Acme", requirements="SQL", **kwargs))
+
+
+async def consume_like_the_endpoint(router):
+    """Read the stream as the SSE endpoint does: stop inside aclosing at the last event."""
+    items = []
+    async with aclosing(router.stream_grouped_clos_for_company(company_name="Acme", requirements="SQL")) as stream:
+        async for item in stream:
+            items.append(item)
+            if "group" not in item:
+                return items
+
+
+def test_breaker_opens_after_consecutive_failures_and_allows_one_trial():
+    breaker = CircuitBreaker(failures=2, cooldown=60)
+    breaker.failure()
+    assert breaker.state == "closed"
+    breaker.failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    breaker.open_until = 0.0
+    assert breaker.state == "half_open"
+    assert breaker.begin()
+    assert not breaker.begin()
+    breaker.success()
+    assert breaker.state == "closed"
+    assert breaker.begin() and breaker.begin()
+
+
+def test_breaker_with_zero_failures_is_disabled():
+    breaker = CircuitBreaker(failures=0, cooldown=60)
+    for _ in range(3):
+        breaker.failure()
+    assert breaker.state == "closed"
+    # No trial-call limit either: concurrent calls all start.
+    assert all(breaker.begin() for _ in range(5))
+
+
+def test_router_with_zero_breaker_failures_keeps_calling(router_settings):
+    router_settings(llm_breaker_failures=0, llm_retries=0)
+    service = FakeService("openai", error=Exception("down"))
+    router = LLMRouter([("openai", service)])
+    for _ in range(3):
+        with pytest.raises(Exception, match="down"):
+            grouped(router)
+    assert service.calls == 3
+    assert router.stats()[0]["breaker"] == "closed"
+
+
+def test_empty_groups_are_an_answer_not_a_failure(router_settings):
+    router_settings(llm_retries=2)
+    service = FakeService("openai", answer={"groups": []})
+    router = LLMRouter([("openai", service)])
+    assert grouped(router) == {"groups": []}
+    assert service.calls == 1
+    stats = router.stats()[0]
+    assert stats["failures"] == 0 and stats["breaker"] == "closed"
+
+
+def test_failover_to_the_fallback_provider(router_settings):
+    router_settings(llm_retries=1, llm_breaker_failures=1)
+    primary = FakeService("openai", error=Exception("boom"))
+    fallback = FakeService("gemini")
+    router = LLMRouter([("openai", primary), ("gemini", fallback)])
+    assert grouped(router) == {"groups": [GROUP]}
+    assert (primary.calls, fallback.calls) == (1, 1)
+    assert [s["breaker"] for s in router.stats()] == ["open", "closed"]
+
+
+def test_overloaded_provider_fails_over_without_breaker_failure(router_settings):
+    router_settings(llm_retries=1, llm_breaker_failures=1)
+    primary = FakeService("openai", error=LLMOverloaded("full", retry_after=3))
+    fallback = FakeService("gemini")
+    router = LLMRouter([("openai", primary), ("gemini", fallback)])
+    assert grouped(router) == {"groups": [GROUP]}
+    assert router.stats()[0]["breaker"] == "closed"
+
+    fallback.error = LLMOverloaded("full too", retry_after=5)
+    with pytest.raises(LLMOverloaded):
+        grouped(router)
+
+
+def test_hedge_winner_cancels_the_slow_shared_call(router_settings):
+    router_settings(llm_retries=0, llm_hedge_quantile=0.95, llm_hedge_delay=0.01)
+    slow = SharedService("openai")
+    fast = FakeService("gemini")
+    router = LLMRouter([("openai", slow), ("gemini", fast)])
+
+    async def run():
+        assert await router.suggest_grouped_clos_for_company(company_name="Acme", requirements="SQL") == {"groups": [GROUP]}
+        await asyncio.sleep(0.01)
+        # Checked inside the loop: asyncio.run cancels leftover tasks on exit.
+        assert slow.cancelled
+        assert not slow._inflight.in_flight("key")
+
+    asyncio.run(run())
+    assert router.stats()[1]["hedge_wins"] == 1
+
+
+def test_latency_budget_cancels_the_shared_call(router_settings):
+    router_settings(llm_retries=0, llm_latency_budget=0.05)
+    slow = SharedService("openai")
+    router = LLMRouter([("openai", slow)])
+
+    async def run():
+        with pytest.raises(Exception, match="latency budget"):
+            await router.suggest_grouped_clos_for_company(company_name="Acme", requirements="SQL")
+        await asyncio.sleep(0.01)
+        assert slow.cancelled
+
+    asyncio.run(run())
+
+
+def test_empty_answers_are_not_cached(router_settings, cache):
+    router_settings(llm_retries=0)
+    service = StubService(groups=[])
+    router = LLMRouter([("stub", service)])
+    assert grouped(router)["groups"] == []
+    assert grouped(router)["groups"] == []
+    assert service.calls == 2
+    assert cache.stats()["entries"] == 0
+    assert router.stats()[0]["failures"] == 0
+
+
+def test_stored_empty_answer_counts_as_a_miss(router_settings, cache):
+    router_settings(llm_retries=0)
+    service = StubService(groups=[GROUP])
+    cache.put(service._prepare_grouped("Acme", "SQL")["key"], {"groups": []})
+    router = LLMRouter([("stub", service)])
+    assert grouped(router)["groups"] == [GROUP]
+    assert service.calls == 1
+
+
+def test_cache_hits_leave_the_breaker_alone(router_settings, cache):
+    router_settings(llm_retries=0, llm_breaker_failures=5)
+    service = StubService(groups=[GROUP])
+    router = LLMRouter([("stub", service)])
+    assert not grouped(router).get("cached")
+    provider = router.providers[0]
+    provider.breaker.failures = 3
+
+    result = grouped(router)
+    assert result["cached"] and result["groups"] == [GROUP]
+    assert service.calls == 1
+    # Neither reset by a "success" nor a latency sample.
+    assert provider.breaker.failures == 3
+    assert len(provider.latencies["grouped"]) == 1
+
+    async def stream():
+        return [item async for item in router.stream_grouped_clos_for_company(company_name="Acme", requirements="SQL")]
+
+    assert asyncio.run(stream())[-1]["cached"]
+    assert provider.breaker.failures == 3
+
+
+def test_completed_stream_closes_the_breaker(router_settings):
+    router_settings(llm_breaker_failures=1)
+    service = FakeService("openai", error=Exception("down"))
+    router = LLMRouter([("openai", service)])
+    with pytest.raises(Exception, match="down"):
+        asyncio.run(consume_like_the_endpoint(router))
+    provider = router.providers[0]
+    assert provider.breaker.state == "open"
+
+    provider.breaker.open_until = 0.0
+    service.error = None
+    assert asyncio.run(consume_like_the_endpoint(router)) == [{"group": GROUP}, {"prompt_stats": None}]
+    assert provider.breaker.state == "closed"
+    assert provider.breaker.failures == 0
+    assert len(provider.latencies["grouped"]) == 1
+
+    async def concurrent():
+        return await asyncio.gather(consume_like_the_endpoint(router), consume_like_the_endpoint(router))
+
+    assert all(items[-1] == {"prompt_stats": None} for items in asyncio.run(concurrent()))
+
+
+def test_stream_closed_before_its_end_gives_no_verdict(router_settings):
+    router_settings(llm_breaker_failures=1)
+    router = LLMRouter([("openai", FakeService("openai"))])
+    provider = router.providers[0]
+    provider.breaker.failures = 1
+
+    async def first_group_only():
+        async with aclosing(router.stream_grouped_clos_for_company(company_name="Acme", requirements="SQL")) as stream:
+            async for item in stream:
+                return item
+
+    assert asyncio.run(first_group_only()) == {"group": GROUP}
+    # The half-open trial is released, neither closed nor re-opened.
+    assert provider.breaker.state == "half_open"
+    assert provider.breaker.allow()
+    assert "grouped" not in provider.latencies
+
+
+def test_cached_stream_read_like_the_endpoint_leaves_the_breaker_alone(router_settings, cache):
+    router_settings(llm_breaker_failures=5)
+    service = StubService(groups=[GROUP])
+    router = LLMRouter([("stub", service)])
+    asyncio.run(consume_like_the_endpoint(router))
+    provider = router.providers[0]
+    provider.breaker.failures = 3
+
+    assert asyncio.run(consume_like_the_endpoint(router))[-1]["cached"]
+    assert service.calls == 1
+    assert provider.breaker.failures == 3
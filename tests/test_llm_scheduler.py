@@ -0,0 +1,169 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.llm_scheduler import LLMOverloaded, LLMScheduler, TokenBucket, retry_after_header
+
+
+def _scheduler(**overrides):
+    values = {"llm_max_concurrency": 2, "llm_queue_size": 2, "llm_queue_timeout": 1.0, "llm_rpm": 0, "llm_tpm": 0}
+    return LLMScheduler("test", SimpleNamespace(**{**values, **overrides}))
+
+
+async def _idle():
+    # Let every ready task run up to its next wait.
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_concurrency_cap_and_fifo_queue():
+    async def run():
+        scheduler = _scheduler()
+        order = []
+
+        async def call(name):
+            async with scheduler.slot(10):
+                order.append(name)
+                await asyncio.sleep(0.05)
+
+        tasks = [asyncio.ensure_future(call(name)) for name in "abcd"]
+        await _idle()
+        assert scheduler.active == 2
+        assert scheduler.stats()["queued"] == 2
+        await asyncio.gather(*tasks)
+        return scheduler, order
+
+    scheduler, order = asyncio.run(run())
+    assert order == list("abcd")
+    assert scheduler.active == 0
+    assert scheduler.stats()["admitted"] == 4
+    assert scheduler.stats()["max_queued"] == 2
+
+
+def test_full_queue_is_rejected_at_once():
+    async def run():
+        scheduler = _scheduler(llm_max_concurrency=1, llm_queue_size=1)
+        await scheduler.acquire(10)
+        waiting = asyncio.ensure_future(scheduler.acquire(10))
+        await _idle()
+        with pytest.raises(LLMOverloaded) as e:
+            await scheduler.acquire(10)
+        scheduler.release()
+        await waiting
+        scheduler.release()
+        return scheduler, e.value
+
+    scheduler, error = asyncio.run(run())
+    assert scheduler.rejected_full == 1
+    assert error.retry_after == 1.0
+    assert retry_after_header(error) == {"Retry-After": "1"}
+
+
+def test_queue_timeout():
+    async def run():
+        scheduler = _scheduler(llm_max_concurrency=1, llm_queue_timeout=0.05)
+        await scheduler.acquire(10)
+        start = time.monotonic()
+        with pytest.raises(LLMOverloaded):
+            await scheduler.acquire(10)
+        return scheduler, time.monotonic() - start
+
+    scheduler, waited = asyncio.run(run())
+    assert 0.04 <= waited < 0.5
+    assert scheduler.rejected_deadline == 1
+    assert scheduler.stats()["queued"] == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        scheduler = _scheduler(llm_max_concurrency=1)
+        await scheduler.acquire(10)
+        waiting = asyncio.ensure_future(scheduler.acquire(10))
+        await _idle()
+        waiting.cancel()
+        await _idle()
+        queued = scheduler.stats()["queued"]
+        scheduler.release()
+        await scheduler.acquire(10)
+        return queued
+
+    assert asyncio.run(run()) == 0
+
+
+def test_rate_limit_that_cannot_be_met_in_time_is_rejected_early():
+    async def run():
+        scheduler = _scheduler(llm_rpm=60, llm_queue_timeout=0.5)
+        for _ in range(60):
+            scheduler.requests.take(1)
+        start = time.monotonic()
+        with pytest.raises(LLMOverloaded) as e:
+            await scheduler.acquire(10)
+        return time.monotonic() - start, e.value
+
+    waited, error = asyncio.run(run())
+    # One request a second: nothing within 0.5s, so no point in waiting for it.
+    assert waited < 0.1
+    assert error.retry_after == pytest.approx(1.0, abs=0.05)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(600)
+    assert bucket.wait_time(100) == 0.0
+    bucket.take(600)
+    assert bucket.wait_time(10) == pytest.approx(1.0, abs=0.05)
+    # A request bigger than a minute's worth waits for a full bucket, not forever.
+    assert bucket.wait_time(10_000) == pytest.approx(60.0, abs=0.1)
+    assert bucket.available() <= 1
+
+
+class Upstream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.chunks:
+            raise StopAsyncIteration
+        return self.chunks.pop(0)
+
+    async def aclose(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize("read", [1, 3])
+def test_hold_stream_releases_and_closes(read):
+    async def run():
+        scheduler = _scheduler()
+        upstream = Upstream(["a", "b", "c"])
+        await scheduler.acquire(10)
+        stream = scheduler.hold_stream(upstream)
+        got = [await stream.__anext__() for _ in range(read)]
+        await stream.aclose()
+        return scheduler, upstream, got
+
+    scheduler, upstream, got = asyncio.run(run())
+    assert len(got) == read
+    assert scheduler.active == 0
+    assert upstream.closed
+
+
+def test_hold_stream_without_aclose_warns(caplog):
+    async def run():
+        scheduler = _scheduler()
+        await scheduler.acquire(10)
+        chunks = [chunk async for chunk in scheduler.hold_stream(_Plain(["a"]))]
+        return scheduler, chunks
+
+    scheduler, chunks = asyncio.run(run())
+    assert chunks == ["a"]
+    assert scheduler.active == 0
+    assert "has no aclose()" in caplog.text
+
+
+class _Plain(Upstream):
+    aclose = None
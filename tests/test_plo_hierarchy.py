@@ -0,0 +1,61 @@
+from app.services.catalog import OBECatalog
+from app.services.plo_hierarchy import PLOHierarchy
+
+
+def plo(plo_id, parent="", level="2", curriculum="1"):
+    return {"id": plo_id, "curriculum_id": curriculum, "name": plo_id, "plo_level": level, "parent_plo_id": parent}
+
+
+PLOS = [
+    plo("1", level="1"),
+    plo("2", parent="1"),
+    plo("3", parent="2", level="3"),
+    plo("4", level="1"),
+    plo("5", parent="4"),
+    plo("6", parent="404"),            # parent missing: a root
+    plo("7", parent="8"),              # 7 <-> 8 cycle
+    plo("8", parent="7"),
+    plo("9", level="1", curriculum="2"),
+]
+
+
+def test_ancestors_and_top_level():
+    h = PLOHierarchy(PLOS)
+    assert h.ancestors["3"] == ("2", "1")
+    assert h.ancestors["1"] == ()
+    assert h.top_level == {"1": "1", "2": "1", "3": "1", "4": "4", "5": "4", "6": "6", "7": "8", "8": "7", "9": "9"}
+    assert h.roots_by_curriculum["1"] == ["1", "4", "6"]
+
+
+def test_tree():
+    tree = PLOHierarchy(PLOS).tree("1")
+    assert [node["plo"]["id"] for node in tree] == ["1", "4", "6"]
+    assert tree[0]["children"][0]["plo"]["id"] == "2"
+    assert tree[0]["children"][0]["children"][0]["plo"]["id"] == "3"
+    assert PLOHierarchy(PLOS).tree(2)[0]["plo"]["id"] == "9"
+
+
+def test_rollup_matches_walking_up_each_edge():
+    h = PLOHierarchy(PLOS)
+    mappings = [
+        {"clo_id": "c1", "plo_id": "3"},
+        {"clo_id": "c2", "plo_id": "2"},
+        {"clo_id": "c1", "plo_id": "1"},
+        {"clo_id": "c3", "plo_id": "5"},
+        {"clo_id": "c4", "plo_id": "404"},
+        {"clo_id": "c5", "plo_id": ""},
+    ]
+    assert h.rollup(mappings) == [
+        {"plo": PLOS[0], "clo_ids": ["c1", "c2"], "sub_plo_ids": ["2", "3"], "mapping_count": 3},
+        {"plo": PLOS[3], "clo_ids": ["c3"], "sub_plo_ids": ["5"], "mapping_count": 1},
+    ]
+
+
+def test_catalog_hierarchy_covers_every_live_plo(data_dir):
+    catalog = OBECatalog.from_csv(data_dir)
+    h = catalog.plo_hierarchy
+    for plo_id, ancestors in h.ancestors.items():
+        chain = [plo_id, *ancestors]
+        # Each step is the parent link, and the top is on the chain.
+        assert all(h.parent[a] == b for a, b in zip(chain, chain[1:]))
+        assert h.top_level[plo_id] in chain
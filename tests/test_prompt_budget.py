@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from app.services.prompt_budget import ELLIPSIS, _PrefixCost, count_tokens, pack_lines, truncate
+
+WORDS = "design database sql queries 2024 ออกแบบฐานข้อมูล วิเคราะห์ , ( ) - teamwork".split()
+
+
+def render(item, text):
+    return f"- [{item['id']}] {text}"
+
+
+def items(seed, n=40):
+    rng = random.Random(seed)
+    return [
+        {"id": str(i), "description": " ".join(rng.choices(WORDS, k=rng.randint(0, 40)))}
+        for i in range(n)
+    ]
+
+
+def prompt_tokens(packed):
+    return count_tokens("".join(render(item, item["description"]) + "\n" for item in packed))
+
+
+def test_count_tokens_errs_high_on_known_pieces():
+    assert count_tokens("") == 0
+    assert count_tokens("design") == 2
+    assert count_tokens("sql 12345") == 1 + 2
+    assert count_tokens("ข้อมูล") == 3
+
+
+def test_truncate_marks_the_cut():
+    assert truncate("  short  ", 10) == "short"
+    assert truncate("design database", 7) == "design" + ELLIPSIS
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_prefix_cost_matches_counting_the_cut_text(seed):
+    text = items(seed, 1)[0]["description"]
+    cost = _PrefixCost(text)
+    for cap in range(0, len(text) + 2):
+        assert cost.cost(cap) == count_tokens(truncate(text, cap))
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("budget", [0, 30, 200, 800, 100_000])
+def test_packed_lines_fit_the_budget(seed, budget):
+    ranked = items(seed)
+    packed, stats = pack_lines(ranked, budget, render, max_chars=120, min_chars=30)
+    assert prompt_tokens(packed) <= budget
+    assert stats["used_tokens"] <= budget
+    assert stats["packed"] == len(packed)
+    # Ranked order is kept and only the tail is dropped.
+    assert [item["id"] for item in packed] == [item["id"] for item in ranked[: len(packed)]]
+    for item, original in zip(packed, ranked):
+        assert item["description"] == truncate(original["description"], stats["desc_max_chars"])
+
+
+def test_everything_fits_untruncated_with_room():
+    ranked = items(0)
+    packed, stats = pack_lines(ranked, 100_000, render, max_chars=10_000, min_chars=30)
+    assert packed == [{**item, "description": item["description"].strip()} for item in ranked]
+    assert stats["truncated"] == 0 and stats["desc_max_chars"] == 10_000
+
+
+def test_cap_is_lowered_before_candidates_are_dropped():
+    ranked = items(1)
+    full = pack_lines(ranked, 100_000, render, max_chars=10_000, min_chars=30)[1]["used_tokens"]
+    packed, stats = pack_lines(ranked, full * 2 // 3, render, max_chars=10_000, min_chars=30)
+    assert len(packed) == len(ranked)
+    assert 30 <= stats["desc_max_chars"] < 10_000
+    assert stats["truncated"] > 0
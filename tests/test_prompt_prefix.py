@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from app.config import get_settings
+from app.services import catalog as catalog_module
+from app.services import llm_service
+from app.services.catalog import OBECatalog, set_catalog
+from app.services.clo_dedup import CLODuplicates
+from app.services.openai_service import OpenAIService
+from app.services.prompt_budget import count_tokens
+from app.services.prompt_prefix import check_layout, curriculum_blocks
+
+CLOS = [
+    {"id": str(i), "curriculum_id": cur, "course_id": "1", "description": f"outcome {i} " * (i % 3 + 1)}
+    for i, cur in enumerate(["2", "10", "2", "1", "10", "2", "3", "1"])
+]
+
+
+def render(clo, text):
+    return f"- {clo['id']}: {text}"
+
+
+def ranked(*ids):
+    return [CLOS[int(i)] for i in ids]
+
+
+def test_blocks_depend_only_on_the_chosen_curricula():
+    first, _ = curriculum_blocks(CLOS, ranked(0, 4, 2), 10_000, render, max_chars=100)
+    second, _ = curriculum_blocks(CLOS, ranked(4, 1, 5), 10_000, render, max_chars=100)
+    assert first == second
+    # Whole curricula, sorted by numeric id, in catalog order within each.
+    assert [clo["id"] for clo in first] == ["0", "2", "5", "1", "4"]
+
+
+def test_blocks_that_do_not_fit_are_skipped():
+    block_tokens = sum(count_tokens(render(clo, clo["description"])) + 1 for clo in ranked(3, 7))
+    packed, stats = curriculum_blocks(CLOS, ranked(0, 2, 3), block_tokens, render, max_chars=100)
+    # Curriculum 2 holds more ranked candidates but does not fit; curriculum 1 does.
+    assert [clo["id"] for clo in packed] == ["3", "7"]
+    assert stats["curricula"] == 1 and stats["used_tokens"] == block_tokens
+
+
+def test_fixed_curricula_and_one_line_per_duplicate_cluster():
+    clos = CLOS + [dict(CLOS[0], id="8"), dict(CLOS[3], id="9", curriculum_id="2")]
+    duplicates = CLODuplicates.build(clos, threshold=0.99)
+    packed, _ = curriculum_blocks(
+        clos, ranked(6), 10_000, render, duplicates=duplicates, max_chars=100, curricula=["2", "1"]
+    )
+    assert [clo["id"] for clo in packed] == ["3", "7", "0", "2", "5", "9"]
+
+
+def test_unknown_layout_is_rejected():
+    with pytest.raises(Exception, match="Unknown LLM prompt layout"):
+        check_layout("shuffled")
+
+
+@pytest.fixture
+def prefix_service(monkeypatch, data_dir):
+    monkeypatch.setattr(catalog_module, "_catalog", None)
+    set_catalog(OBECatalog.from_csv(data_dir))
+
+    def make(**overrides):
+        values = {"openai_api_key": "test", "llm_prompt_layout": "prefix", "llm_shard_mode": "off", **overrides}
+        settings = get_settings().model_copy(update=values)
+        monkeypatch.setattr(llm_service, "get_settings", lambda: settings)
+        return OpenAIService()
+
+    return make
+
+
+def test_prompts_of_different_companies_share_the_clo_prefix(prefix_service):
+    service = prefix_service(llm_prompt_curricula="1,2")
+    data = service._prepare_grouped("Acme", "SQL database design")["prompt"]
+    web = service._prepare_grouped("Globex", "teamwork ethics reports")["prompt"]
+    shared = os.path.commonprefix([data, web])
+    assert shared.endswith("Company Name: ")
+    assert data.index("CLO_ID=") < data.index("Company Name: Acme")
+
+
+def test_ranked_layout_puts_the_company_first(prefix_service):
+    service = prefix_service(llm_prompt_layout="ranked")
+    data = service._prepare_grouped("Acme", "SQL database design")["prompt"]
+    web = service._prepare_grouped("Globex", "teamwork ethics reports")["prompt"]
+    assert len(os.path.commonprefix([data, web])) < data.index("Company Name: Acme")
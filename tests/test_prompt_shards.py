@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from app.services.prompt_shards import check_shard_mode, merge_groups, reduce_prompt, shard_candidates
+
+
+def candidates(seed, n=50):
+    rng = random.Random(seed)
+    return [{"id": str(i), "curriculum_id": str(rng.choice([1, 1, 1, 2, 2, 3, 4]))} for i in range(n)]
+
+
+def group(name, *clo_ids, evidence=()):
+    contexts = [{"clo_id": c, "curriculum_id": 1, "course_id": 1} for c in clo_ids]
+    return {
+        "group_id": "x",
+        "group_name": name,
+        "summary": f"{name} summary",
+        "evidence": list(evidence),
+        "suggested_clos": list(clo_ids),
+        "suggested_clo_contexts": contexts,
+        "reasoning": f"{name} reasoning",
+    }
+
+
+@pytest.mark.parametrize("mode", ["curriculum", "rank"])
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("n_shards", [1, 2, 3, 8, 100])
+def test_shards_partition_the_candidates_in_rank_order(mode, seed, n_shards):
+    ranked = candidates(seed)
+    shards = shard_candidates(ranked, n_shards, mode)
+    assert 1 <= len(shards) <= n_shards and all(shards)
+    assert sorted(int(clo["id"]) for shard in shards for clo in shard) == list(range(len(ranked)))
+    for shard in shards:
+        assert [int(clo["id"]) for clo in shard] == sorted(int(clo["id"]) for clo in shard)
+
+
+def test_curriculum_shards_keep_curricula_whole():
+    shards = shard_candidates(candidates(0), 3, "curriculum")
+    curricula = [{clo["curriculum_id"] for clo in shard} for shard in shards]
+    for i, first in enumerate(curricula):
+        for second in curricula[i + 1:]:
+            assert not first & second
+
+
+def test_rank_shards_share_the_top_matches():
+    shards = shard_candidates(candidates(0), 3, "rank")
+    assert [shard[0]["id"] for shard in shards] == ["0", "1", "2"]
+
+
+def test_reduce_prompt_lists_names_not_clos():
+    prompt = reduce_prompt("Company Name: Acme", [group("Data", "1"), group("Web", "2")])
+    assert "- m1: Data: Data summary" in prompt and "- m2: Web: Web summary" in prompt
+    assert "CLO_ID" not in prompt
+
+
+def test_merge_follows_the_answer_and_keeps_every_pick():
+    shard_groups = [group("Data", "1", "2"), group("SQL", "2", "3"), group("Web", "4"), group("Ethics", "5")]
+    answer = {"groups": [
+        {"group_name": "ข้อมูล", "summary": "s", "members": ["M1", "m2", "m1", "m9"], "reasoning": "r"},
+        {"group_name": "again", "members": ["m2"]},
+        {"group_name": "broken", "members": "m3"},
+    ]}
+    merged = merge_groups(shard_groups, answer)
+
+    assert [g["group_id"] for g in merged] == ["grp_1", "grp_2", "grp_3"]
+    assert merged[0]["group_name"] == "ข้อมูล"
+    assert merged[0]["suggested_clos"] == ["1", "2", "3"]
+    assert len(merged[0]["suggested_clo_contexts"]) == 3
+    # Groups the answer left out (or named badly) are kept as they were.
+    assert [(g["group_name"], g["suggested_clos"]) for g in merged[1:]] == [("Web", ["4"]), ("Ethics", ["5"])]
+
+
+def test_without_an_answer_groups_of_the_same_name_merge():
+    merged = merge_groups([group("Data", "1"), group("Web", "2"), group(" data ", "3", evidence=["e"])])
+    assert [(g["group_name"], g["suggested_clos"]) for g in merged] == [("Data", ["1", "3"]), ("Web", ["2"])]
+    assert merged[0]["evidence"] == ["e"]
+    assert merged[0]["reasoning"] == "Data reasoning\n data  reasoning"
+
+
+def test_unknown_shard_mode_is_rejected():
+    with pytest.raises(Exception, match="Unknown LLM shard mode"):
+        check_shard_mode("random")
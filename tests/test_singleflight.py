@@ -0,0 +1,88 @@
+import asyncio
+
+from app.services.singleflight import SingleFlight
+
+
+def test_identical_calls_share_one_result():
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"groups": []}
+
+    async def run():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("k", fn) for _ in range(5)))
+        return flight, results
+
+    flight, results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert (flight.calls, flight.coalesced) == (1, 4)
+    assert not flight.in_flight("k")
+
+
+def test_errors_are_shared():
+    async def fn():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def run():
+        flight = SingleFlight()
+        return await asyncio.gather(flight.do("k", fn), flight.do("k", fn), return_exceptions=True)
+
+    assert [type(r) for r in asyncio.run(run())] == [ValueError, ValueError]
+
+
+def test_call_survives_one_caller_and_is_cancelled_with_the_last():
+    cancelled = []
+
+    async def fn():
+        try:
+            await asyncio.sleep(0.05)
+            return "done"
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def run():
+        flight = SingleFlight()
+        a = asyncio.ensure_future(flight.do("k", fn))
+        b = asyncio.ensure_future(flight.do("k", fn))
+        await asyncio.sleep(0.01)
+        a.cancel()
+        result = await b
+
+        c = asyncio.ensure_future(flight.do("k", fn))
+        await asyncio.sleep(0.01)
+        c.cancel()
+        await asyncio.sleep(0.01)
+        return flight, result
+
+    flight, result = asyncio.run(run())
+    assert result == "done"
+    assert cancelled == [1]
+    assert not flight.in_flight("k")
+
+
+def test_lead():
+    async def run():
+        flight = SingleFlight()
+        future = flight.lead("k")
+        assert flight.lead("k") is None
+        joined = asyncio.ensure_future(flight.join("k"))
+        fallback = asyncio.ensure_future(flight.do("k", _answer))
+        await asyncio.sleep(0)
+        # The leader gives up: joiners get None, ``do`` makes the call itself.
+        future.set_result(None)
+        return await joined, await fallback
+
+    async def _answer():
+        return "own call"
+
+    assert asyncio.run(run()) == (None, "own call")
+
+
+def test_join_without_flight():
+    assert asyncio.run(SingleFlight().join("k")) is None
@@ -0,0 +1,47 @@
+import threading
+
+from app.services.catalog import CLO_FILE, OBECatalog
+from app.services.sqlite_catalog import SQLiteCatalog, is_fresh
+
+
+def test_sqlite_matches_the_memory_backend(data_dir, catalog_queries):
+    sqlite = SQLiteCatalog.open(data_dir, path=data_dir / "catalog.sqlite3")
+    try:
+        # The search indexes wait for their first use.
+        assert sqlite._indexes == {}
+        memory = OBECatalog.from_csv(data_dir)
+        assert catalog_queries(sqlite) == catalog_queries(memory)
+        assert sqlite.version == memory.version
+    finally:
+        sqlite.close()
+
+
+def test_stale_import_is_redone(data_dir):
+    path = data_dir / "catalog.sqlite3"
+    SQLiteCatalog.open(data_dir, path=path).close()
+    assert is_fresh(path, data_dir)
+
+    with open(data_dir / CLO_FILE, "a", encoding="utf-8") as f:
+        f.write("9999,,,1,,,10,,new outcome\n")
+    assert not is_fresh(path, data_dir)
+    sqlite = SQLiteCatalog.open(data_dir, path=path)
+    try:
+        assert sqlite.load_all_clos()[-1]["description"] == "new outcome"
+    finally:
+        sqlite.close()
+
+
+def test_each_thread_gets_its_own_connection(data_dir):
+    sqlite = SQLiteCatalog.open(data_dir, path=data_dir / "catalog.sqlite3")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(len(sqlite.load_plos()))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    try:
+        assert len(set(results)) == 1 and results[0] > 0
+        assert len(sqlite._connections) == 4
+    finally:
+        sqlite.close()
+    assert sqlite._connections == []